@@ -1,11 +1,51 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""
+@Remark: 字典/系统配置调度
+两级缓存: 每个进程保存一份数据, 共享缓存中只保存版本号;
+数据变更时(信号)更新版本号, 各进程读取时发现版本变化再重新加载,
+redis模式下加载结果同时写入共享缓存, 其他进程直接复用, 不再重复查库;
+未配置共享缓存(默认LocMemCache)时版本号无法在进程间共享, 改为按数据表的记录数/最后修改时间生成版本号(DB版本);
+租户模式下按租户首次访问时加载, 进程内最多保留 DISPATCH_MAX_TENANTS 个租户
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
 from django.conf import settings
 from django.db import connection
+from django.db.models import Count, Max, Q
 from django.core.cache import cache
+from dvadmin.utils.cache_backend import is_shared_cache
 from dvadmin.utils.validator import CustomValidationError
 
+logger = logging.getLogger(__name__)
+
 dispatch_db_type = getattr(settings, 'DISPATCH_DB_TYPE', 'memory')  # redis
+# 进程内检查版本号的最小间隔(秒), 其他进程的修改最多延迟该时间生效
+version_check_interval = getattr(settings, 'DISPATCH_VERSION_CHECK_INTERVAL', 1)
+# 租户模式下每个进程最多保留的租户数据份数, 超过后淘汰最久未使用的租户
+max_resident_schemas = getattr(settings, 'DISPATCH_MAX_TENANTS', 64)
+
+DISPATCH_VERSION_KEY = "dispatch_version_{name}_{schema}"
+DISPATCH_DATA_KEY = "dispatch_data_{name}_{schema}"
+DISPATCH_LOCK_KEY = "dispatch_lock_{name}_{schema}"
+DISPATCH_LOCK_TIMEOUT = 10
+DEFAULT_SCHEMA = "default"
+# 前端一次请求多个字典/配置时的分隔符
+KEY_SEPARATOR = "|"
+
+
+def content_hash(data):
+    """
+    计算数据的内容摘要, 用作ETag
+    """
+    content = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
 
 
 def is_tenants_mode():
@@ -16,36 +56,301 @@ def is_tenants_mode():
     return hasattr(connection, "tenant") and connection.tenant.schema_name
 
 
+def get_schema_name(schema_name=None):
+    """
+    获取缓存所属的schema, 非租户模式统一为 default
+    """
+    if schema_name:
+        return schema_name
+    if is_tenants_mode():
+        return connection.tenant.schema_name
+    return DEFAULT_SCHEMA
+
+
+class DispatchStore:
+    """
+    字典/系统配置的两级缓存
+    :param name: 缓存名称
+    :param builder: 从数据库加载全部数据的函数
+    :param fingerprint: 从数据库生成版本号的函数, 未配置共享缓存时使用
+    """
+
+    def __init__(self, name, builder, max_schemas=None, fingerprint=None):
+        self.name = name
+        self.builder = builder
+        self.fingerprint = fingerprint
+        self.max_schemas = max_schemas or max_resident_schemas
+        # 按租户首次访问时加载, 按最近使用顺序排列
+        self._local = OrderedDict()
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key(self, template, schema):
+        return template.format(name=self.name, schema=schema)
+
+    def _get_lock(self, schema):
+        lock = self._locks.get(schema)
+        if lock is None:
+            with self._lock:
+                lock = self._locks.setdefault(schema, threading.Lock())
+        return lock
+
+    def use_db_version(self):
+        return self.fingerprint is not None and not is_shared_cache()
+
+    def get_version(self, schema):
+        if self.use_db_version():
+            return self._in_schema(schema, self.fingerprint)
+        key = self._key(DISPATCH_VERSION_KEY, schema)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid4().hex, timeout=None)
+            version = cache.get(key)
+        return version
+
+    def get(self, schema_name=None):
+        """
+        获取数据, 版本号未变化时直接返回进程内数据
+        """
+        schema = get_schema_name(schema_name)
+        entry = self._local.get(schema)
+        now = time.monotonic()
+        if entry is not None:
+            self._touch(schema)
+            if now - entry["checked"] < version_check_interval:
+                return entry["data"]
+        version = self.get_version(schema)
+        if entry is not None and entry["version"] == version:
+            entry["checked"] = now
+            return entry["data"]
+        # 同一进程内并发未命中时只加载一次
+        with self._get_lock(schema):
+            entry = self._local.get(schema)
+            if entry is not None and entry["version"] == version:
+                return entry["data"]
+            data = self._load(schema, version)
+            self._store(schema, version, data)
+            return data
+
+    def _touch(self, schema):
+        try:
+            self._local.move_to_end(schema)
+        except KeyError:
+            pass
+
+    def _store(self, schema, version, data):
+        with self._lock:
+            self._local[schema] = {"version": version, "data": data, "checked": time.monotonic()}
+            self._local.move_to_end(schema)
+            while len(self._local) > self.max_schemas:
+                evicted, _ = self._local.popitem(last=False)
+                self._locks.pop(evicted, None)
+
+    def evict(self, schema_name=None):
+        """
+        释放某个租户在当前进程中的数据, 下次访问时重新加载
+        """
+        schema = get_schema_name(schema_name)
+        with self._lock:
+            self._local.pop(schema, None)
+            self._locks.pop(schema, None)
+
+    def resident_schemas(self):
+        """
+        当前进程中已加载的租户
+        """
+        with self._lock:
+            return list(self._local.keys())
+
+    def _load(self, schema, version):
+        if dispatch_db_type != 'redis':
+            return self._build(schema)
+        data_key = self._key(DISPATCH_DATA_KEY, schema)
+        shared = cache.get(data_key)
+        if shared and shared[0] == version:
+            return shared[1]
+        # 多个进程同时未命中时只有一个进程查库, 其余等待共享缓存
+        lock_key = self._key(DISPATCH_LOCK_KEY, schema)
+        if cache.add(lock_key, 1, timeout=DISPATCH_LOCK_TIMEOUT):
+            try:
+                data = self._build(schema)
+                cache.set(data_key, (version, data), timeout=None)
+                return data
+            finally:
+                cache.delete(lock_key)
+        deadline = time.monotonic() + DISPATCH_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            shared = cache.get(data_key)
+            if shared and shared[0] == version:
+                return shared[1]
+        return self._build(schema)
+
+    def _build(self, schema):
+        return self._in_schema(schema, self.builder)
+
+    @staticmethod
+    def _in_schema(schema, func):
+        if schema == DEFAULT_SCHEMA or schema == getattr(getattr(connection, "tenant", None), "schema_name", None):
+            return func()
+        from django_tenants.utils import schema_context
+
+        with schema_context(schema):
+            return func()
+
+    def refresh(self, schema_name=None):
+        """
+        数据变更后更新版本号, 所有进程在下次读取时重新加载
+        """
+        schema = get_schema_name(schema_name)
+        if not self.use_db_version():
+            cache.set(self._key(DISPATCH_VERSION_KEY, schema), uuid4().hex, timeout=None)
+        # DB版本由数据本身决定, 其他进程在下次检查版本号时重新加载
+        with self._lock:
+            self._local.pop(schema, None)
+
+    def patch(self, patcher, schema_name=None):
+        """
+        增量更新: 进程内数据为最新版本时, 在其基础上生成新数据并更新版本号, 否则整体失效
+        :param patcher: 参数为当前数据, 返回新数据(不能修改原数据)
+        """
+        schema = get_schema_name(schema_name)
+        if self.use_db_version():
+            # 增量结果无法通过DB版本共享, 整体失效
+            return self.refresh(schema)
+        with self._get_lock(schema):
+            entry = self._local.get(schema)
+            if entry is None or entry["version"] != self.get_version(schema):
+                return self.refresh(schema)
+            try:
+                data = patcher(entry["data"])
+            except Exception as e:
+                return self.refresh(schema)
+            version = uuid4().hex
+            cache.set(self._key(DISPATCH_VERSION_KEY, schema), version, timeout=None)
+            if dispatch_db_type == 'redis':
+                cache.set(self._key(DISPATCH_DATA_KEY, schema), (version, data), timeout=None)
+            self._store(schema, version, data)
+
+    def load(self, schema_name=None):
+        """
+        预加载数据
+        """
+        return self.get(schema_name)
+
+
 # ================================================= #
 # ******************** 初始化 ******************** #
 # ================================================= #
-def _get_all_dictionary():
+DICTIONARY_FIELDS = ("id", "parent_id", "label", "value", "type", "color", "is_value")
+
+
+def _dictionary_queryset():
     from dvadmin.system.models import Dictionary
 
-    queryset = Dictionary.objects.filter(status=True, is_value=False)
-    data = []
-    for instance in queryset:
-        data.append(
-            {
-                "id": instance.id,
-                "value": instance.value,
-                "children": list(
-                    Dictionary.objects.filter(parent=instance.id)
-                    .filter(status=1)
-                    .values("label", "value", "type", "color")
-                ),
-            }
-        )
-    return {ele.get("value"): ele for ele in data}
+    return Dictionary.objects.filter(status=True).order_by("sort", "id").values(*DICTIONARY_FIELDS)
+
+
+def _build_dictionary(rows):
+    """
+    根据字典记录构建快照
+    :param rows: 已按排序的字典记录
+    :return: {
+        "config": {字典编号: {"id", "value", "children"}},
+        "labels": {字典编号: {value: label}},
+        "items": {字典编号: {value: 字典项}},
+        "keys": {字典id: 字典编号},
+        "owners": {字典项id: 字典编号},
+    }
+    """
+    entries = {}
+    for row in rows:
+        if not row["is_value"]:
+            entries[row["id"]] = {"id": row["id"], "value": row["value"], "children": []}
+    owners = {}
+    for row in rows:
+        entry = entries.get(row["parent_id"])
+        if entry is not None:
+            entry["children"].append(
+                {"label": row["label"], "value": row["value"], "type": row["type"], "color": row["color"]}
+            )
+            owners[row["id"]] = entry
+    # 字典编号重复时以最后一个为准
+    config = {entry["value"]: entry for entry in entries.values()}
+    snapshot = {
+        "config": config,
+        "labels": {},
+        "items": {},
+        "etags": {},
+        "keys": {entry["id"]: key for key, entry in config.items()},
+        "owners": {item_id: entry["value"] for item_id, entry in owners.items() if config[entry["value"]] is entry},
+    }
+    for key in config:
+        _build_dictionary_maps(snapshot, key)
+    snapshot["etag"] = content_hash(list(config.values()))
+    return snapshot
+
+
+def _build_dictionary_maps(snapshot, key):
+    labels, items = {}, {}
+    for item in snapshot["config"][key]["children"]:
+        # 与逐个比较时一致, 重复的value以第一个为准
+        labels.setdefault(str(item["value"]), item["label"])
+        items.setdefault(str(item["value"]), item)
+    snapshot["labels"][key] = labels
+    snapshot["items"][key] = items
+    snapshot["etags"][key] = content_hash(snapshot["config"][key]["children"])
+
+
+def _get_all_dictionary():
+    return _build_dictionary(list(_dictionary_queryset()))
+
+
+def _patch_dictionary(snapshot, instance):
+    """
+    只重新加载字典项所属的字典(变更前后所属的字典), 返回新的快照
+    """
+    keys = {snapshot["owners"].get(instance.id), snapshot["keys"].get(instance.parent_id)} - {None}
+    if not keys:
+        return snapshot
+    rows = list(_dictionary_queryset().filter(
+        Q(is_value=False, value__in=keys) | Q(parent__is_value=False, parent__value__in=keys)
+    ))
+    partial = _build_dictionary(rows)
+    config = {}
+    for key, entry in snapshot["config"].items():
+        if key not in keys:
+            config[key] = entry
+        elif key in partial["config"]:
+            config[key] = partial["config"][key]
+    for key, entry in partial["config"].items():
+        config.setdefault(key, entry)
+    return {
+        "config": config,
+        "etag": content_hash(list(config.values())),
+        "etags": {**{k: v for k, v in snapshot["etags"].items() if k not in keys}, **partial["etags"]},
+        "labels": {**{k: v for k, v in snapshot["labels"].items() if k not in keys}, **partial["labels"]},
+        "items": {**{k: v for k, v in snapshot["items"].items() if k not in keys}, **partial["items"]},
+        "keys": {**{k: v for k, v in snapshot["keys"].items() if v not in keys}, **partial["keys"]},
+        "owners": {**{k: v for k, v in snapshot["owners"].items() if v not in keys}, **partial["owners"]},
+    }
 
 
 def _get_all_system_config():
+    """
+    :return: {
+        "config": {"父级key.子级key": 值},
+        "public": 前端可见的配置(不含后端专用配置),
+        "etag": 前端可见配置的内容摘要,
+    }
+    """
     data = {}
+    backend_keys = set()
     from dvadmin.system.models import SystemConfig
 
     system_config_obj = (
         SystemConfig.objects.filter(parent_id__isnull=False)
-        .values("parent__key", "key", "value", "form_item_type")
+        .values("parent__key", "key", "value", "form_item_type", "status")
         .order_by("sort")
     )
     for system_config in system_config_obj:
@@ -62,27 +367,55 @@ def _get_all_system_config():
                 })
             new_value.sort(key=lambda s: s["key"])
             value = new_value
-        data[f"{system_config.get('parent__key')}.{system_config.get('key')}"] = value
-    return data
+        key = f"{system_config.get('parent__key')}.{system_config.get('key')}"
+        data[key] = value
+        if not system_config.get("status"):
+            backend_keys.add(key)
+    public = {key: value for key, value in data.items() if key not in backend_keys}
+    return {"config": data, "public": public, "etag": content_hash(public)}
+
+
+def _table_fingerprint(model_name):
+    """
+    按数据表的记录数/最大id/最后修改时间生成版本号, 增删改都会使其变化
+    """
+    def fingerprint():
+        from dvadmin.system import models
+
+        row = getattr(models, model_name).objects.aggregate(
+            count=Count("id"), max_id=Max("id"), updated=Max("update_datetime"))
+        return f"{row['count']}-{row['max_id']}-{row['updated']}"
+
+    return fingerprint
+
+
+dictionary_store = DispatchStore("dictionary", _get_all_dictionary, fingerprint=_table_fingerprint("Dictionary"))
+system_config_store = DispatchStore("system_config", _get_all_system_config,
+                                    fingerprint=_table_fingerprint("SystemConfig"))
+
+
+def check_version_backend():
+    """
+    启动时检查版本号的共享方式
+    """
+    if is_shared_cache():
+        return
+    for store in (dictionary_store, system_config_store):
+        if store.use_db_version():
+            logger.warning(f"未配置共享缓存(CACHES), [{store.name}] 使用数据库生成版本号, "
+                           f"其他进程的修改最多延迟 {version_check_interval} 秒生效")
+        else:
+            logger.error(f"未配置共享缓存(CACHES)且 [{store.name}] 无数据库版本号, 其他进程的修改不会生效")
 
 
 def init_dictionary():
     """
     初始化字典配置
+    租户模式下只加载当前schema, 其他租户在首次访问时加载
     :return:
     """
     try:
-        if dispatch_db_type == 'redis':
-            cache.set(f"init_dictionary", _get_all_dictionary())
-            return
-        if is_tenants_mode():
-            from django_tenants.utils import tenant_context, get_tenant_model
-
-            for tenant in get_tenant_model().objects.filter():
-                with tenant_context(tenant):
-                    settings.DICTIONARY_CONFIG[connection.tenant.schema_name] = _get_all_dictionary()
-        else:
-            settings.DICTIONARY_CONFIG = _get_all_dictionary()
+        dictionary_store.load()
     except Exception as e:
         print("请先进行数据库迁移!")
     return
@@ -91,83 +424,60 @@ def init_dictionary():
 def init_system_config():
     """
     初始化系统配置
+    租户模式下只加载当前schema, 其他租户在首次访问时加载
     :param name:
     :return:
     """
     try:
-        if dispatch_db_type == 'redis':
-            cache.set(f"init_system_config", _get_all_system_config())
-            return
-        if is_tenants_mode():
-            from django_tenants.utils import tenant_context, get_tenant_model
-
-            for tenant in get_tenant_model().objects.filter():
-                with tenant_context(tenant):
-                    settings.SYSTEM_CONFIG[connection.tenant.schema_name] = _get_all_system_config()
-        else:
-            settings.SYSTEM_CONFIG = _get_all_system_config()
+        system_config_store.load()
     except Exception as e:
         print("请先进行数据库迁移!")
     return
 
 
-def refresh_dictionary():
+def evict_tenant(schema_name):
     """
-    刷新字典配置
-    :return:
+    释放租户在当前进程中的字典及系统配置(如租户被删除或停用时)
+    :param schema_name: 租户schema_name值
     """
-    if dispatch_db_type == 'redis':
-        cache.set(f"init_dictionary", _get_all_dictionary())
-        return
-    if is_tenants_mode():
-        from django_tenants.utils import tenant_context, get_tenant_model
-
-        for tenant in get_tenant_model().objects.filter():
-            with tenant_context(tenant):
-                settings.DICTIONARY_CONFIG[connection.tenant.schema_name] = _get_all_dictionary()
-    else:
-        settings.DICTIONARY_CONFIG = _get_all_dictionary()
+    dictionary_store.evict(schema_name)
+    system_config_store.evict(schema_name)
 
 
-def refresh_system_config():
+def refresh_dictionary(schema_name=None, instance=None):
     """
-    刷新系统配置
+    刷新字典配置(当前租户)
+    :param instance: 变更的字典项, 传入时只刷新其所属的字典
     :return:
     """
-    if dispatch_db_type == 'redis':
-        cache.set(f"init_system_config", _get_all_system_config())
+    if instance is not None and instance.is_value and instance.id not in _get_dictionary_snapshot(schema_name)["keys"]:
+        dictionary_store.patch(lambda snapshot: _patch_dictionary(snapshot, instance), schema_name)
         return
-    if is_tenants_mode():
-        from django_tenants.utils import tenant_context, get_tenant_model
+    dictionary_store.refresh(schema_name)
+
 
-        for tenant in get_tenant_model().objects.filter():
-            with tenant_context(tenant):
-                settings.SYSTEM_CONFIG[connection.tenant.schema_name] = _get_all_system_config()
-    else:
-        settings.SYSTEM_CONFIG = _get_all_system_config()
+def refresh_system_config(schema_name=None):
+    """
+    刷新系统配置(当前租户)
+    :return:
+    """
+    system_config_store.refresh(schema_name)
 
 
 # ================================================= #
 # ******************** 字典管理 ******************** #
 # ================================================= #
+def _get_dictionary_snapshot(schema_name=None):
+    return dictionary_store.get(schema_name) or _build_dictionary([])
+
+
 def get_dictionary_config(schema_name=None):
     """
     获取字典所有配置
     :param schema_name: 对应字典配置的租户schema_name值
     :return:
     """
-    if dispatch_db_type == 'redis':
-        init_dictionary_data = cache.get(f"init_dictionary")
-        if not init_dictionary_data:
-            refresh_dictionary()
-        return cache.get(f"init_dictionary") or {}
-    if not settings.DICTIONARY_CONFIG:
-        refresh_dictionary()
-    if is_tenants_mode():
-        dictionary_config = settings.DICTIONARY_CONFIG[schema_name or connection.tenant.schema_name]
-    else:
-        dictionary_config = settings.DICTIONARY_CONFIG
-    return dictionary_config or {}
+    return _get_dictionary_snapshot(schema_name)["config"]
 
 
 def get_dictionary_values(key, schema_name=None):
@@ -177,16 +487,38 @@ def get_dictionary_values(key, schema_name=None):
     :param schema_name: 对应字典配置的租户schema_name值
     :return:
     """
-    if dispatch_db_type == 'redis':
-        dictionary_config = cache.get(f"init_dictionary")
-        if not dictionary_config:
-            refresh_dictionary()
-            dictionary_config = cache.get(f"init_dictionary")
-        return dictionary_config.get(key)
     dictionary_config = get_dictionary_config(schema_name)
     return dictionary_config.get(key)
 
 
+def get_frontend_dictionary(keys, schema_name=None):
+    """
+    获取前端使用的字典数据
+    :param keys: 字典编号列表, ["all"]返回全部字典
+    :param schema_name: 对应字典配置的租户schema_name值
+    :return: (数据, ETag) 单个字典返回字典项列表, 多个字典返回 {字典编号: 字典项列表}
+    """
+    snapshot = _get_dictionary_snapshot(schema_name)
+    if keys == ["all"]:
+        return list(snapshot["config"].values()), snapshot["etag"]
+    if len(keys) == 1:
+        entry = snapshot["config"].get(keys[0])
+        return (entry["children"] if entry else []), snapshot["etags"].get(keys[0], content_hash([]))
+    data = {key: snapshot["config"][key]["children"] if key in snapshot["config"] else [] for key in keys}
+    return data, content_hash([snapshot["etags"].get(key) for key in keys])
+
+
+def get_dictionary_item(key, name, schema_name=None):
+    """
+    获取字典项
+    :param key: 字典管理中的key值(字典编号)
+    :param name: 对应字典配置的value值
+    :param schema_name: 对应字典配置的租户schema_name值
+    :return: {"label", "value", "type", "color"}, 不存在时返回None
+    """
+    return _get_dictionary_snapshot(schema_name)["items"].get(key, {}).get(str(name))
+
+
 def get_dictionary_label(key, name, schema_name=None):
     """
     获取获取字典label值
@@ -195,11 +527,7 @@ def get_dictionary_label(key, name, schema_name=None):
     :param schema_name: 对应字典配置的租户schema_name值
     :return:
     """
-    res = get_dictionary_values(key, schema_name) or []
-    for ele in res.get('children'):
-        if ele.get("value") == str(name):
-            return ele.get("label")
-    return ""
+    return _get_dictionary_snapshot(schema_name)["labels"].get(key, {}).get(str(name)) or ""
 
 
 # ================================================= #
@@ -213,18 +541,25 @@ def get_system_config(schema_name=None):
     :param schema_name: 对应字典配置的租户schema_name值
     :return:
     """
-    if dispatch_db_type == 'redis':
-        init_dictionary_data = cache.get(f"init_system_config")
-        if not init_dictionary_data:
-            refresh_system_config()
-        return cache.get(f"init_system_config") or {}
-    if not settings.SYSTEM_CONFIG:
-        refresh_system_config()
-    if is_tenants_mode():
-        dictionary_config = settings.SYSTEM_CONFIG[schema_name or connection.tenant.schema_name]
-    else:
-        dictionary_config = settings.SYSTEM_CONFIG
-    return dictionary_config or {}
+    snapshot = system_config_store.get(schema_name)
+    return snapshot["config"] if snapshot else {}
+
+
+def get_frontend_system_config(prefixes=None, schema_name=None):
+    """
+    获取前端可见的系统配置(不含后端专用配置)
+    :param prefixes: 配置key前缀列表, 为空时返回全部
+    :param schema_name: 对应系统配置的租户schema_name值
+    :return: (配置, ETag)
+    """
+    snapshot = system_config_store.get(schema_name) or {"public": {}, "etag": content_hash({})}
+    prefixes = [prefix for prefix in prefixes or [] if prefix]
+    if not prefixes:
+        return snapshot["public"], snapshot["etag"]
+    data = {}
+    for prefix in prefixes:
+        data.update({key: value for key, value in snapshot["public"].items() if key.startswith(prefix)})
+    return data, content_hash([snapshot["etag"], prefixes])
 
 
 def get_system_config_values(key, schema_name=None):
@@ -234,12 +569,6 @@ def get_system_config_values(key, schema_name=None):
     :param schema_name: 对应系统配置的租户schema_name值
     :return:
     """
-    if dispatch_db_type == 'redis':
-        system_config = cache.get(f"init_system_config")
-        if not system_config:
-            refresh_system_config()
-            system_config = cache.get(f"init_system_config")
-        return system_config.get(key)
     system_config = get_system_config(schema_name)
     return system_config.get(key)
 
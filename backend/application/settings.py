@@ -64,6 +64,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "dvadmin.utils.middleware.HealthCheckMiddleware",
+    "dvadmin.utils.metrics.MetricsMiddleware",
+    "dvadmin.utils.query_inspector.QueryInspectorMiddleware",
+    "dvadmin.utils.slow_query.SlowQueryMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -290,12 +293,12 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": (
         # 'django_filters.rest_framework.DjangoFilterBackend',
         "dvadmin.utils.filters.CustomDjangoFilterBackend",
-        "rest_framework.filters.SearchFilter",
+        "dvadmin.utils.search.FullTextSearchFilter",
         "rest_framework.filters.OrderingFilter",
     ),
     "DEFAULT_PAGINATION_CLASS": "dvadmin.utils.pagination.CustomPagination",  # 自定义分页
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "dvadmin.utils.authentication.CustomJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
@@ -371,6 +374,45 @@ DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 API_LOG_ENABLE = True
 # API_LOG_METHODS = 'ALL' # ['POST', 'DELETE']
 API_LOG_METHODS = ["POST", "UPDATE", "DELETE", "PUT"]  # ['POST', 'DELETE']
+# 操作日志异步批量写入: 每批条数/最长等待秒数/队列上限(超过后丢弃)
+API_LOG_ASYNC = locals().get("API_LOG_ASYNC", True)
+API_LOG_BATCH_SIZE = 200
+API_LOG_FLUSH_INTERVAL = 1.0
+API_LOG_QUEUE_SIZE = 10000
+# 接口指标(/api/metrics): 多进程部署时配置共享目录以合并各进程数据, METRICS_TOKEN 供Prometheus抓取时使用
+METRICS_ENABLE = locals().get("METRICS_ENABLE", True)
+METRICS_MULTIPROC_DIR = locals().get("METRICS_MULTIPROC_DIR", None)
+METRICS_TOKEN = locals().get("METRICS_TOKEN", None)
+# SQL检查(开发/测试): 检测N+1查询及视图 max_queries 上限, 严格模式下直接抛出异常
+QUERY_INSPECTOR_ENABLE = locals().get("QUERY_INSPECTOR_ENABLE", False)
+QUERY_INSPECTOR_STRICT = locals().get("QUERY_INSPECTOR_STRICT", False)
+# 慢查询记录(/api/system/slow_query/): 超过阈值(毫秒)的SQL保存在进程内环形缓冲区, 执行计划由后台线程获取
+# SLOW_QUERY_EXPLAIN_ANALYZE=True 时会再次实际执行语句, 建议只在排查问题时开启
+SLOW_QUERY_ENABLE = locals().get("SLOW_QUERY_ENABLE", True)
+SLOW_QUERY_THRESHOLD_MS = locals().get("SLOW_QUERY_THRESHOLD_MS", 500)
+SLOW_QUERY_BUFFER_SIZE = locals().get("SLOW_QUERY_BUFFER_SIZE", 200)
+SLOW_QUERY_EXPLAIN = locals().get("SLOW_QUERY_EXPLAIN", True)
+SLOW_QUERY_EXPLAIN_ANALYZE = locals().get("SLOW_QUERY_EXPLAIN_ANALYZE", False)
+# 分页总条数统计策略: exact 精确统计 / cached 按查询条件缓存(秒) / estimated 超过阈值时返回估算值
+PAGINATION_COUNT_STRATEGY = locals().get("PAGINATION_COUNT_STRATEGY", "exact")
+PAGINATION_COUNT_CACHE_TIMEOUT = locals().get("PAGINATION_COUNT_CACHE_TIMEOUT", 60)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = locals().get("PAGINATION_COUNT_ESTIMATE_THRESHOLD", 100000)
+# 全文索引字段, 视图设置 search_backend = "fulltext" 后生效, 索引通过 python manage.py build_search_index 创建
+SEARCH_INDEXES = locals().get("SEARCH_INDEXES", {
+    "workorder.WorkOrder": ["workorder_no", "problem_description"],
+    "merchant.Merchant": ["name", "address", "manager"],
+    "system.OperationLog": ["request_modular", "request_path", "request_msg"],
+    "system.MessageCenter": ["title", "content"],
+})
+# 权限缓存(接口权限/数据权限/列权限/认证用户): None 表示配置了共享缓存(CACHES为redis等)时启用, 进程内缓存(默认LocMemCache)下关闭;
+# 单进程部署可设置为 True; PERMISSION_LOCAL_CACHE_TTL 为进程内权限数据的最长保留秒数
+PERMISSION_CACHE_ENABLE = locals().get("PERMISSION_CACHE_ENABLE", None)
+PERMISSION_LOCAL_CACHE_TTL = locals().get("PERMISSION_LOCAL_CACHE_TTL", 60)
+# 日志保留天数, 超过后由 python manage.py archive_logs 归档到 LOG_ARCHIVE_DIR 并删除(None表示不清理)
+LOG_RETENTION_DAYS = locals().get("LOG_RETENTION_DAYS", {"OperationLog": 180, "LoginLog": 365})
+LOG_ARCHIVE_DIR = locals().get("LOG_ARCHIVE_DIR", os.path.join(BASE_DIR, "logs", "archive"))
+# 日志列表未指定时间范围时默认查询的天数(None表示不限制), 生效时列表接口返回 recent_days
+LOG_QUERY_DEFAULT_DAYS = locals().get("LOG_QUERY_DEFAULT_DAYS", None)
 API_MODEL_MAP = {
     "/token/": "登录模块",
     "/api/login/": "登录模块",
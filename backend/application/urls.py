@@ -33,6 +33,7 @@ from dvadmin.system.views.login import (
     LogoutView,
     LoginTokenView
 )
+from dvadmin.system.views.metrics import MetricsView
 from dvadmin.system.views.system_config import InitSettingsViewSet
 from dvadmin.utils.swagger import CustomOpenAPISchemaGenerator
 
@@ -110,6 +111,7 @@ urlpatterns = (
             path("api/captcha/", CaptchaView.as_view()),
             path("api/init/dictionary/", InitDictionaryViewSet.as_view()),
             path("api/init/settings/", InitSettingsViewSet.as_view()),
+            path("api/metrics", MetricsView.as_view()),
             path("apiLogin/", ApiLogin.as_view()),
 
             # 仅用于开发，上线需关闭
@@ -33,12 +33,35 @@ CELERY_BROKER_DB = 3
 REDIS_PASSWORD = 'DVADMIN3'
 REDIS_HOST = '127.0.0.1'
 REDIS_URL = f'redis://:{REDIS_PASSWORD or ""}@{REDIS_HOST}:6379'
+# 多进程部署时建议使用redis作为缓存, 权限/字典/系统配置的版本号才能在各进程间共享
+# CACHES = {
+#     "default": {
+#         "BACKEND": "django.core.cache.backends.redis.RedisCache",
+#         "LOCATION": f"{REDIS_URL}/{REDIS_DB}",
+#     }
+# }
+# 未配置共享缓存时权限缓存默认关闭, 单进程部署可强制开启
+# PERMISSION_CACHE_ENABLE = True
+# 字典/系统配置存储方式: memory(各进程查库加载) / redis(加载结果放入共享缓存)
+# DISPATCH_DB_TYPE = 'memory'
+# 租户模式下每个进程最多保留的租户字典/系统配置份数
+# DISPATCH_MAX_TENANTS = 64
 # ================================================= #
 # ****************** 功能 启停  ******************* #
 # ================================================= #
 DEBUG = True
 # 启动登录详细概略获取(通过调用api获取ip详细地址。如果是内网，关闭即可)
 ENABLE_LOGIN_ANALYSIS_LOG = True
+# 离线IP数据库路径(python manage.py build_ip_database 生成), 存在时优先使用, 不再调用在线接口
+# IP_DATABASE_PATH = os.path.join(BASE_DIR, 'conf', 'ip_database.dat')
+# 只使用离线IP数据库, 未命中时也不调用在线接口(内网部署建议开启)
+IP_ANALYSIS_OFFLINE = False
+# 登录日志由后台线程异步批量写入
+LOGIN_LOG_ASYNC = True
+# 开发/测试时检测N+1查询及接口查询次数上限(max_queries)
+# QUERY_INSPECTOR_ENABLE = DEBUG
+# 慢查询阈值(毫秒), 超过后记录SQL及执行计划, 超级管理员可在 /api/system/slow_query/ 查看
+SLOW_QUERY_THRESHOLD_MS = 500
 # 登录接口 /api/token/ 是否需要验证码认证，用于测试，正式环境建议取消
 LOGIN_NO_CAPTCHA_AUTH = True
 # ================================================= #
@@ -8,3 +8,15 @@ class SystemConfig(AppConfig):
     def ready(self):
         # 注册信号
         import dvadmin.system.signals  # 确保路径正确
+        # 未配置共享缓存时权限缓存无法在多进程间失效
+        from dvadmin.utils.permission_cache import check_permission_cache
+        check_permission_cache()
+        # 未配置共享缓存时字典/系统配置改用数据库版本号
+        from application.dispatch import check_version_backend
+        check_version_backend()
+        # 构建模型注册表, 避免每次请求反射遍历所有模型
+        from dvadmin.utils.models import build_model_registry
+        build_model_registry()
+        # 注册全文索引(SEARCH_INDEXES)
+        from dvadmin.utils.search import register_search_indexes
+        register_search_indexes()
@@ -0,0 +1,34 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from dvadmin.utils.log_store import archive_expired_logs, get_archive_dir, get_log_models
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    归档过期日志: python manage.py archive_logs
+    按 LOG_RETENTION_DAYS 将过期的操作日志/登录日志写入 LOG_ARCHIVE_DIR 下的 jsonl.gz 文件后删除
+    例如：
+    全部归档：python manage.py archive_logs
+    只归档操作日志并指定保留天数： python manage.py archive_logs OperationLog --days 90
+    只统计不归档： python manage.py archive_logs --dry-run
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", type=str)
+        parser.add_argument("--days", type=int, default=None)
+        parser.add_argument("--dry-run", action="store_true", default=False)
+
+    def handle(self, *args, **options):
+        names = options.get("models")
+        for model in get_log_models():
+            if names and model.__name__ not in names:
+                continue
+            count = archive_expired_logs(model, days=options.get("days"), dry_run=options.get("dry_run"))
+            if options.get("dry_run"):
+                print(f"[{model.__name__}]待归档{count}条")
+            else:
+                print(f"[{model.__name__}]归档完成, 共{count}条, 目录: {get_archive_dir()}")
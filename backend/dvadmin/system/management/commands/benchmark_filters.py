@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from dvadmin.utils.filters import CustomDjangoFilterBackend
+
+DEFAULT_VIEWSETS = [
+    "dvadmin.system.views.user.UserViewSet",
+    "dvadmin.system.views.operation_log.OperationLogViewSet",
+    "dvadmin.system.views.login_log.LoginLogViewSet",
+    "plugins.workorder.views.workorder.WorkOrderViewSet",
+]
+
+
+class Command(BaseCommand):
+    """
+    列表过滤性能对比: python manage.py benchmark_filters
+    对比每次请求重新生成FilterSet类(优化前)与缓存FilterSet类(优化后)时, 过滤条件构建的吞吐量(不访问数据库)
+    例如：
+    默认视图集：python manage.py benchmark_filters
+    指定视图集及查询参数： python manage.py benchmark_filters plugins.workorder.views.workorder.WorkOrderViewSet --query "status=1&hazard_level=2"
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("viewsets", nargs="*", type=str)
+        parser.add_argument("--query", type=str, default="name=test&status=1")
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def run(self, viewset_class, query, iterations, cached):
+        backend_class = type("BenchmarkFilterBackend", (CustomDjangoFilterBackend,), {"cache_filterset_class": cached})
+        request = Request(APIRequestFactory().get("/", query))
+        view = viewset_class(request=request, action="list", format_kwarg=None, kwargs={})
+        queryset = viewset_class.queryset.all()
+        # 预热
+        backend_class().filter_queryset(request, queryset, view)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            backend_class().filter_queryset(request, queryset, view)
+        return iterations / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        iterations = options.get("iterations")
+        query = options.get("query")
+        for path in options.get("viewsets") or DEFAULT_VIEWSETS:
+            try:
+                viewset_class = import_string(path)
+            except ImportError as e:
+                raise CommandError(f"无法导入视图集 {path}: {e}")
+            before = self.run(viewset_class, query, iterations, cached=False)
+            after = self.run(viewset_class, query, iterations, cached=True)
+            print(f"[{viewset_class.__name__}] 优化前 {before:.0f} 次/秒, 优化后 {after:.0f} 次/秒, "
+                  f"提升 {after / before:.1f} 倍")
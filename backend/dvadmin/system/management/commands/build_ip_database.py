@@ -0,0 +1,37 @@
+import csv
+import logging
+
+from django.core.management.base import BaseCommand
+
+from dvadmin.utils.ip_location import IP_FIELDS, build_ip_database, get_ip_database_path, reload_ip_database
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    生成离线IP数据库: python manage.py build_ip_database ip.csv
+    csv每行格式: 起始IP,结束IP,continent,country,province,city,district,isp,area_code,country_english,country_code,longitude,latitude
+    例如：
+    python manage.py build_ip_database ip.csv
+    指定输出路径： python manage.py build_ip_database ip.csv --output /data/ip_database.dat
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", type=str)
+        parser.add_argument("--output", type=str, default=None)
+        parser.add_argument("--encoding", type=str, default="utf-8")
+
+    def handle(self, *args, **options):
+        output = options.get("output") or get_ip_database_path()
+
+        def rows():
+            with open(options["source"], encoding=options["encoding"], newline="") as f:
+                for line in csv.reader(f):
+                    if len(line) < 2 or line[0].startswith("#"):
+                        continue
+                    yield line[0].strip(), line[1].strip(), dict(zip(IP_FIELDS, (value.strip() for value in line[2:])))
+
+        count = build_ip_database(rows(), output)
+        reload_ip_database()
+        print(f"IP数据库生成完成, 共{count}条IP段: {output}")
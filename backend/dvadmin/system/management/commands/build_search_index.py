@@ -0,0 +1,31 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from dvadmin.utils.search import search_indexes
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    创建全文索引: python manage.py build_search_index
+    按 SEARCH_INDEXES 创建PostgreSQL三元组索引或SQLite FTS5表, 批量导入/update等未触发信号的写入后需加 --rebuild 重建
+    例如：
+    全部创建：python manage.py build_search_index
+    重建工单索引： python manage.py build_search_index WorkOrder --rebuild
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", type=str)
+        parser.add_argument("--rebuild", action="store_true", default=False)
+
+    def handle(self, *args, **options):
+        names = options.get("models")
+        for model, index in search_indexes.items():
+            if names and model.__name__ not in names:
+                continue
+            if index.build(rebuild=options.get("rebuild")):
+                print(f"[{model.__name__}]全文索引已就绪: {', '.join(index.fields)}")
+            else:
+                print(f"[{model.__name__}]当前数据库不支持全文索引, 搜索使用icontains")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from dvadmin.utils.index_advisor import render_suggestions, suggest_indexes
+
+
+class Command(BaseCommand):
+    """
+    索引建议: python manage.py index_advisor
+    根据视图集的过滤/排序/数据权限配置, 列出数据库中缺少的组合索引,
+    输出加入模型 Meta.indexes 的 models.Index 条目(部署时随迁移生成), 以及可直接在数据库执行的SQL
+    例如：
+    查看建议：python manage.py index_advisor
+    """
+
+    def handle(self, *args, **options):
+        suggestions = suggest_indexes()
+        if not suggestions:
+            print("已有索引覆盖全部常用查询条件")
+            return
+        for suggestion in suggestions:
+            print(f"[{suggestion.describe()}] {', '.join(suggestion.reasons)}")
+        print()
+        print(render_suggestions(suggestions))
@@ -3,6 +3,7 @@ import logging
 from django.core.management.base import BaseCommand
 
 from application import settings
+from dvadmin.utils.tree_index import rebuild_all_tree_index
 
 logger = logging.getLogger(__name__)
 
@@ -53,4 +54,6 @@ main(reset={reset})
                     )
                 except ModuleNotFoundError:
                     pass
+        # 初始化数据可能不按层级顺序写入, 统一重建树形索引
+        rebuild_all_tree_index()
         print("初始化数据完成！")
@@ -19,6 +19,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'application.settings')
 django.setup()
 from application.settings import BASE_DIR
 from dvadmin.system.models import Area
+from dvadmin.utils.tree_index import rebuild_tree_index
 
 area_code_list = []
 
@@ -52,6 +53,8 @@ def main():
     area_list(code_list)
     if Area.objects.count() == 0:
         Area.objects.bulk_create([Area(**ele) for ele in area_code_list])
+        # bulk_create 不触发信号, 需要重建地区树形索引
+        rebuild_tree_index(Area)
     else:
         for ele in area_code_list:
             code = ele.pop("code")
@@ -0,0 +1,34 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from dvadmin.utils.log_store import convert_to_partitioned, ensure_partitions, get_log_models, is_postgresql
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    日志表按月分区(仅PostgreSQL): python manage.py partition_logs
+    例如：
+    创建后续月份分区(建议每天定时执行)：python manage.py partition_logs
+    将现有日志表转换为分区表(一次性, 会锁表)： python manage.py partition_logs --convert
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true", default=False)
+        parser.add_argument("--months-ahead", type=int, default=2)
+
+    def handle(self, *args, **options):
+        if not is_postgresql():
+            print("当前数据库不支持按月分区, 请使用 archive_logs 按保留天数清理日志")
+            return
+        months_ahead = options.get("months_ahead")
+        for model in get_log_models():
+            if options.get("convert") and convert_to_partitioned(model, months_ahead=months_ahead):
+                print(f"[{model.__name__}]已转换为按月分区表")
+            partitions = ensure_partitions(model, months_ahead=months_ahead)
+            if partitions:
+                print(f"[{model.__name__}]分区已就绪: {', '.join(partitions)}")
+            else:
+                print(f"[{model.__name__}]不是分区表, 可使用 --convert 转换")
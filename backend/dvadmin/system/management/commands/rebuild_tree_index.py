@@ -0,0 +1,29 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from dvadmin.utils.tree_index import TREE_REGISTRY, rebuild_tree_index
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    重建树形索引: python manage.py rebuild_tree_index
+    例如：
+    全部重建：python manage.py rebuild_tree_index
+    只重建某个model的： python manage.py rebuild_tree_index system.Dept
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("labels", nargs="*", type=str)
+
+    def handle(self, *args, **options):
+        labels = options.get("labels") or list(TREE_REGISTRY.keys())
+        for label in labels:
+            config = TREE_REGISTRY.get(label)
+            if config is None:
+                print(f"[{label}]未注册树形索引, 可选: {', '.join(TREE_REGISTRY.keys())}")
+                continue
+            count = rebuild_tree_index(config.model)
+            print(f"[{label}]树形索引重建完成, 共{count}条关系")
@@ -6,9 +6,12 @@ from pathlib import PurePosixPath
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from application import dispatch
+from dvadmin.utils import tree_index
 from dvadmin.utils.models import CoreModel, table_prefix, get_custom_app_models
 
+# 不参与列权限配置的内部模型
+exclude_models = ['TreeIndex']
+
 
 class Role(CoreModel):
     name = models.CharField(max_length=64, verbose_name="角色名称", help_text="角色名称")
@@ -40,8 +43,10 @@ class CustomUserManager(UserManager):
 class Users(CoreModel, AbstractUser):
     username = models.CharField(max_length=150, unique=True, db_index=True, verbose_name="用户账号",
                                 help_text="用户账号")
-    email = models.EmailField(max_length=255, verbose_name="邮箱", null=True, blank=True, help_text="邮箱")
-    mobile = models.CharField(max_length=255, verbose_name="电话", null=True, blank=True, help_text="电话")
+    email = models.EmailField(max_length=255, verbose_name="邮箱", null=True, blank=True, db_index=True,
+                              help_text="邮箱")
+    mobile = models.CharField(max_length=255, verbose_name="电话", null=True, blank=True, db_index=True,
+                              help_text="电话")
     avatar = models.CharField(max_length=255, verbose_name="头像", null=True, blank=True, help_text="头像")
     name = models.CharField(max_length=40, verbose_name="姓名", help_text="姓名")
     GENDER_CHOICES = (
@@ -145,28 +150,20 @@ class Dept(CoreModel):
         """
         获取某个用户的递归所有部门名称
         """
-        dept_name_all = cls._recursion(obj, "parent", "name")
-        dept_name_all.reverse()
-        return "/".join(dept_name_all)
+        if obj is None:
+            return ""
+        return tree_index.get_path_name(cls, obj.pk)
 
     @classmethod
     def recursion_all_dept(cls, dept_id: int, dept_all_list=None, dept_list=None):
         """
-        递归获取部门的所有下级部门
+        获取部门的所有下级部门(含自身), 通过树形索引一次查询获得
         :param dept_id: 需要获取的id
-        :param dept_all_list: 所有列表
-        :param dept_list: 递归list
+        :param dept_all_list: 已废弃, 保留以兼容旧调用
+        :param dept_list: 已废弃, 保留以兼容旧调用
         :return:
         """
-        if not dept_all_list:
-            dept_all_list = Dept.objects.values("id", "parent")
-        if dept_list is None:
-            dept_list = [dept_id]
-        for ele in dept_all_list:
-            if ele.get("parent") == dept_id:
-                dept_list.append(ele.get("id"))
-                cls.recursion_all_dept(ele.get("id"), dept_all_list, dept_list)
-        return list(set(dept_list))
+        return tree_index.get_descendant_ids(cls, dept_id)
 
     class Meta:
         db_table = table_prefix + "system_dept"
@@ -209,23 +206,14 @@ class Menu(CoreModel):
     @classmethod
     def get_all_parent(cls, id: int, all_list=None, nodes=None):
         """
-        递归获取给定ID的所有层级
+        获取给定ID的所有层级(从根节点到自身), 通过树形索引一次查询获得
         :param id: 参数ID
-        :param all_list: 所有列表
-        :param nodes: 递归列表
+        :param all_list: 已废弃, 保留以兼容旧调用
+        :param nodes: 已废弃, 保留以兼容旧调用
         :return: nodes
         """
-        if not all_list:
-            all_list = Menu.objects.values("id", "name", "parent")
-        if nodes is None:
-            nodes = []
-        for ele in all_list:
-            if ele.get("id") == id:
-                parent_id = ele.get("parent")
-                if parent_id is not None:
-                    cls.get_all_parent(parent_id, all_list, nodes)
-                nodes.append(ele)
-        return nodes
+        return list(tree_index.get_ancestor_queryset(cls, id).values("id", "name", "parent"))
+
     class Meta:
         db_table = table_prefix + "system_menu"
         verbose_name = "菜单表"
@@ -385,15 +373,6 @@ class Dictionary(CoreModel):
         verbose_name_plural = verbose_name
         ordering = ("sort",)
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        super().save(force_insert, force_update, using, update_fields)
-        dispatch.refresh_dictionary()  # 有更新则刷新字典配置
-
-    def delete(self, using=None, keep_parents=False):
-        res = super().delete(using, keep_parents)
-        dispatch.refresh_dictionary()
-        return res
-
 
 class OperationLog(CoreModel):
     request_modular = models.CharField(max_length=64, verbose_name="请求模块", null=True, blank=True,
@@ -419,6 +398,7 @@ class OperationLog(CoreModel):
         verbose_name = "操作日志"
         verbose_name_plural = verbose_name
         ordering = ("-create_datetime",)
+        indexes = [models.Index(fields=["create_datetime", "creator"], name="operation_log_create_creator")]
 
 
 def media_file_name(instance, filename):
@@ -568,15 +548,6 @@ class SystemConfig(CoreModel):
     def __str__(self):
         return f"{self.title}"
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        super().save(force_insert, force_update, using, update_fields)
-        dispatch.refresh_system_config()  # 有更新则刷新系统配置
-
-    def delete(self, using=None, keep_parents=False):
-        res = super().delete(using, keep_parents)
-        dispatch.refresh_system_config()
-        return res
-
 
 class LoginLog(CoreModel):
     LOGIN_TYPE_CHOICES = ((1, "普通登录"), (2, "微信扫码登录"),)
@@ -605,6 +576,7 @@ class LoginLog(CoreModel):
         verbose_name = "登录日志"
         verbose_name_plural = verbose_name
         ordering = ("-create_datetime",)
+        indexes = [models.Index(fields=["create_datetime", "creator"], name="login_log_create_creator")]
 
 
 class MessageCenter(CoreModel):
@@ -645,6 +617,23 @@ def media_file_name_downloadcenter(instance:'DownloadCenter', filename):
     return PurePosixPath("files", "dlct", h[:1], h[1:2], basename + '-' + str(time()).replace('.', '') + ext.lower())
 
 
+class TreeIndex(models.Model):
+    """
+    树形结构闭包表, 记录每个节点与其所有祖先节点的关系, 由 dvadmin.utils.tree_index 维护
+    """
+    tree = models.CharField(max_length=64, verbose_name="树名称", help_text="树名称")
+    ancestor = models.BigIntegerField(verbose_name="祖先节点", help_text="祖先节点")
+    descendant = models.BigIntegerField(verbose_name="后代节点", help_text="后代节点")
+    depth = models.IntegerField(default=0, verbose_name="层级距离", help_text="层级距离")
+
+    class Meta:
+        db_table = table_prefix + "system_tree_index"
+        verbose_name = "树形索引表"
+        verbose_name_plural = verbose_name
+        unique_together = (("tree", "ancestor", "descendant"),)
+        indexes = [models.Index(fields=["tree", "descendant", "depth"])]
+
+
 class DownloadCenter(CoreModel):
     TASK_STATUS_CHOICES = [
         (0, '任务已创建'),
@@ -1,9 +1,14 @@
 import time
 
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import Signal, receiver
 from django.core.cache import cache
-from dvadmin.system.models import MessageCenterTargetUser
+from application import dispatch
+from dvadmin.system.models import MessageCenterTargetUser, ApiWhiteList, MenuButton, RoleMenuButtonPermission, Role, \
+    Users, Dept, Menu, Dictionary, Area, MenuField, FieldPermission, SystemConfig
+from dvadmin.utils.authentication import clear_auth_user_cache
+from dvadmin.utils.permission_cache import refresh_permission_version, clear_user_role_ids
+from dvadmin.utils.tree_index import register_tree
 
 # 初始化信号
 pre_init_complete = Signal()
@@ -17,6 +22,12 @@ post_tenants_all_init_complete = Signal()
 # 租户创建完成信号
 tenants_create_complete = Signal()
 
+# 注册树形索引, 节点保存/移动/删除时自动维护
+register_tree(Dept, "parent")
+register_tree(Menu, "parent")
+register_tree(Dictionary, "parent")
+register_tree(Area, "pcode")
+
 # 全局变量用于标记最后修改时间
 last_db_change_time = time.time()
 
@@ -25,3 +36,55 @@ last_db_change_time = time.time()
 @receiver(post_delete, sender=MessageCenterTargetUser)
 def update_last_change_time(sender, **kwargs):
     cache.set('last_db_change_time', time.time(), timeout=None)  # 设置永不超时的键值对
+
+
+@receiver(post_save, sender=ApiWhiteList)
+@receiver(post_delete, sender=ApiWhiteList)
+@receiver(post_save, sender=MenuButton)
+@receiver(post_delete, sender=MenuButton)
+@receiver(post_save, sender=RoleMenuButtonPermission)
+@receiver(post_delete, sender=RoleMenuButtonPermission)
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=Dept)
+@receiver(post_delete, sender=Dept)
+@receiver(post_save, sender=MenuField)
+@receiver(post_delete, sender=MenuField)
+@receiver(post_save, sender=FieldPermission)
+@receiver(post_delete, sender=FieldPermission)
+def refresh_permission_matrix(sender, **kwargs):
+    """接口权限/数据权限/列权限相关数据变更时刷新权限矩阵"""
+    refresh_permission_version()
+
+
+@receiver(m2m_changed, sender=Users.role.through)
+def refresh_user_roles(sender, instance, action, reverse, **kwargs):
+    """用户与角色关系变更时清除用户角色缓存"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # 从角色侧变更时影响多个用户, 直接刷新权限矩阵版本
+        refresh_permission_version()
+    else:
+        clear_user_role_ids(instance.pk)
+
+
+@receiver(post_save, sender=Users)
+@receiver(post_delete, sender=Users)
+def refresh_auth_user(sender, instance, **kwargs):
+    """用户信息变更时清除认证缓存"""
+    clear_auth_user_cache(instance.pk)
+
+
+@receiver(post_save, sender=Dictionary)
+@receiver(post_delete, sender=Dictionary)
+def refresh_dictionary(sender, instance, **kwargs):
+    """字典变更时刷新字典配置(所有进程), 字典项变更时只刷新所属字典"""
+    dispatch.refresh_dictionary(instance=instance)
+
+
+@receiver(post_save, sender=SystemConfig)
+@receiver(post_delete, sender=SystemConfig)
+def refresh_system_config(sender, **kwargs):
+    """系统配置变更时刷新系统配置(所有进程)"""
+    dispatch.refresh_system_config()
@@ -0,0 +1,63 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from dvadmin.system.models import OperationLog
+from dvadmin.utils.pagination import CURSOR_MODE, decode_cursor, encode_cursor, paginate
+
+
+class CursorPaginationTest(TestCase):
+    """
+    游标分页: 同一毫秒内的多行按游标翻页时不跳过也不重复
+    """
+
+    def setUp(self):
+        base = timezone.now().replace(microsecond=0)
+        for index in range(7):
+            log = OperationLog.objects.create(request_path=f"/api/test/{index}/")
+            # 全部落在同一毫秒内, 只有微秒不同
+            OperationLog.objects.filter(id=log.id).update(
+                create_datetime=base + datetime.timedelta(microseconds=index * 100))
+
+    def get_page(self, cursor=None):
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        request = Request(APIRequestFactory().get("/api/system/operation_log/", params))
+        rows, info = paginate(request, OperationLog.objects.order_by("-create_datetime"), mode=CURSOR_MODE)
+        return [row.id for row in rows], info
+
+    def test_cursor_keeps_microseconds(self):
+        value = timezone.now().replace(microsecond=123456)
+        values, reverse = decode_cursor(encode_cursor([value, 1]))
+        field = OperationLog._meta.get_field("create_datetime")
+        self.assertEqual(field.to_python(values[0]), value)
+        self.assertFalse(reverse)
+
+    def test_pages_through_rows_in_same_millisecond(self):
+        expected = list(OperationLog.objects.order_by("-create_datetime", "-id").values_list("id", flat=True))
+        ids, info = self.get_page()
+        self.assertEqual(info["page"], 1)
+        while info["next"]:
+            self.assertIsNone(info["total"])
+            self.assertTrue(info["total_estimated"])
+            page_ids, info = self.get_page(info["next"])
+            self.assertIsNone(info["page"])
+            ids.extend(page_ids)
+        self.assertEqual(ids, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        first, info = self.get_page()
+        second, info = self.get_page(info["next"])
+        previous, _ = self.get_page(info["previous"])
+        self.assertEqual(previous, first)
+
+    def test_invalid_cursor_value(self):
+        cursor = encode_cursor(["not-a-datetime", "x"])
+        request = Request(APIRequestFactory().get("/api/system/operation_log/", {"cursor": cursor}))
+        with self.assertRaises(ValidationError):
+            paginate(request, OperationLog.objects.order_by("-create_datetime"), mode=CURSOR_MODE)
@@ -0,0 +1,53 @@
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from dvadmin.system.models import Dept, Menu, MenuButton, Users
+from dvadmin.system.views.dept import DeptViewSet
+from dvadmin.system.views.menu import MenuViewSet
+from dvadmin.utils.query_inspector import assert_max_queries, assert_no_n_plus_one
+
+
+class QueryBudgetTest(TestCase):
+    """
+    列表接口的SQL次数不随条数增长, 且不超过视图声明的 max_queries
+    """
+
+    def setUp(self):
+        self.admin = Users.objects.create(username="budget_admin", name="管理员", is_superuser=True)
+        root = Dept.objects.create(name="总部", key="budget_root")
+        for index in range(6):
+            # 每行的修改人不同, 逐行查询时参数不同会被识别为N+1
+            modifier = Users.objects.create(username=f"budget_modifier_{index}", name=f"修改人{index}")
+            dept = Dept.objects.create(name=f"部门{index}", key=f"budget_dept_{index}", parent=root,
+                                       modifier=str(modifier.id))
+            Dept.objects.create(name=f"子部门{index}", key=f"budget_child_{index}", parent=dept)
+            Users.objects.create(username=f"budget_member_{index}", name=f"成员{index}", dept=dept)
+            menu = Menu.objects.create(name=f"菜单{index}", modifier=str(modifier.id))
+            Menu.objects.create(name=f"子菜单{index}", parent=menu)
+            for action in ("Create", "Update"):
+                MenuButton.objects.create(menu=menu, name=action, value=f"budget:{index}:{action}",
+                                          api=f"/api/budget/{index}/")
+
+    def request_list(self, viewset, path):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, user=self.admin)
+        view = viewset.as_view({"get": "list"})
+        with assert_no_n_plus_one(), assert_max_queries(viewset.max_queries["list"]):
+            response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data["data"]
+
+    def test_dept_list(self):
+        data = self.request_list(DeptViewSet, "/api/system/dept/")
+        dept = next(item for item in data if item["name"] == "部门0")
+        self.assertEqual(dept["modifier_name"], "修改人0")
+        self.assertEqual(dept["dept_user_count"], 1)
+        self.assertEqual(dept["has_children"], 1)
+        self.assertTrue(dept["hasChild"])
+
+    def test_menu_list(self):
+        data = self.request_list(MenuViewSet, "/api/system/menu/")
+        menu = next(item for item in data if item["name"] == "菜单0")
+        self.assertEqual(menu["modifier_name"], "修改人0")
+        self.assertTrue(menu["hasChild"])
+        self.assertEqual([item["name"] for item in menu["menuPermission"]], ["Update", "Create"])
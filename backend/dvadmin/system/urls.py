@@ -15,6 +15,7 @@ from dvadmin.system.views.operation_log import OperationLogViewSet
 from dvadmin.system.views.role import RoleViewSet
 from dvadmin.system.views.role_menu import RoleMenuPermissionViewSet
 from dvadmin.system.views.role_menu_button_permission import RoleMenuButtonPermissionViewSet
+from dvadmin.system.views.slow_query import SlowQueryView
 from dvadmin.system.views.system_config import SystemConfigViewSet
 from dvadmin.system.views.user import UserViewSet
 from dvadmin.system.views.menu_field import MenuFieldViewSet
@@ -50,6 +51,7 @@ urlpatterns = [
     # path('login_log/', LoginLogViewSet.as_view({'get': 'list'})),
     # path('login_log/<int:pk>/', LoginLogViewSet.as_view({'get': 'retrieve'})),
     # path('dept_lazy_tree/', DeptViewSet.as_view({'get': 'dept_lazy_tree'})),
+    path('slow_query/', SlowQueryView.as_view()),
     path('clause/privacy.html', PrivacyView.as_view()),
     path('clause/terms_service.html', TermsServiceView.as_view()),
 ]
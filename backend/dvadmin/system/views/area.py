@@ -6,6 +6,7 @@ from rest_framework import serializers
 from dvadmin.system.models import Area
 from dvadmin.utils.field_permission import FieldPermissionMixin
 from dvadmin.utils.json_response import SuccessResponse
+from dvadmin.utils.models import count_subquery
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
 
@@ -19,13 +20,21 @@ class AreaSerializer(CustomModelSerializer):
     pcode_info = serializers.SerializerMethodField()
 
     def get_pcode_info(self, instance):
+        if Area.pcode.is_cached(instance):
+            # 列表查询时已连表查询上级地区(AreaViewSet.list)
+            pcode = instance.pcode
+            return [{"name": pcode.name, "code": pcode.code}] if pcode is not None else []
         pcode = Area.objects.filter(code=instance.pcode_id).values("name", "code")
         return pcode
 
     def get_pcode_count(self, instance: Area):
+        if hasattr(instance, "child_count"):
+            return instance.child_count
         return Area.objects.filter(pcode=instance).count()
 
     def get_hasChild(self, instance):
+        if hasattr(instance, "child_count"):
+            return instance.child_count > 0
         hasChild = Area.objects.filter(pcode=instance.code)
         if hasChild:
             return True
@@ -73,6 +82,7 @@ class AreaViewSet(CustomModelViewSet, FieldPermissionMixin):
     create_serializer_class = AreaCreateUpdateSerializer
     update_serializer_class = AreaCreateUpdateSerializer
     extra_filter_class = []
+    max_queries = {"list": 10}
 
     def list(self, request, *args, **kwargs):
         self.request.query_params._mutable = True
@@ -89,6 +99,8 @@ class AreaViewSet(CustomModelViewSet, FieldPermissionMixin):
                 queryset = self.queryset.filter(enable=True, pcode=pcode)
             else:
                 queryset = self.queryset.filter(enable=True, level=1)
+        queryset = queryset.select_related("pcode").annotate(
+            child_count=count_subquery(Area.objects.all(), "pcode", outer_field="code"))
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True, request=request)
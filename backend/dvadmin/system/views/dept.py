@@ -12,7 +12,9 @@ from rest_framework.permissions import IsAuthenticated
 from dvadmin.system.models import Dept, RoleMenuButtonPermission, Users
 from dvadmin.utils.filters import DataLevelPermissionsFilter
 from dvadmin.utils.json_response import DetailResponse, SuccessResponse, ErrorResponse
+from dvadmin.utils.models import count_subquery
 from dvadmin.utils.serializers import CustomModelSerializer
+from dvadmin.utils.tree_index import descendant_ids_queryset
 from dvadmin.utils.viewset import CustomModelViewSet
 
 
@@ -28,9 +30,14 @@ class DeptSerializer(CustomModelSerializer):
     dept_user_count = serializers.SerializerMethodField()
 
     def get_dept_user_count(self, obj: Dept):
+        # 列表查询时已通过子查询统计(DeptViewSet.list)
+        if hasattr(obj, "user_count"):
+            return obj.user_count
         return Users.objects.filter(dept=obj).count()
 
     def get_hasChild(self, instance):
+        if hasattr(instance, "child_count"):
+            return instance.child_count > 0
         hasChild = Dept.objects.filter(parent=instance.id)
         if hasChild:
             return True
@@ -42,6 +49,8 @@ class DeptSerializer(CustomModelSerializer):
         return "禁用"
 
     def get_has_children(self, obj: Dept):
+        if hasattr(obj, "child_count"):
+            return obj.child_count
         return Dept.objects.filter(parent_id=obj.id).count()
 
     class Meta:
@@ -99,6 +108,7 @@ class DeptViewSet(CustomModelViewSet):
     filter_fields = ['name', 'id', 'parent']
     search_fields = []
     # extra_filter_class = []
+    max_queries = {"list": 10}
     import_serializer_class = DeptImportSerializer
     import_field_dict = {
         "name": "部门名称",
@@ -120,7 +130,10 @@ class DeptViewSet(CustomModelViewSet):
             queryset = self.queryset.filter(status=True, parent=parent)
         else:
             queryset = self.queryset.filter(status=True)
-        queryset = self.filter_queryset(queryset)
+        queryset = self.filter_queryset(queryset).annotate(
+            child_count=count_subquery(Dept.objects.all(), "parent"),
+            user_count=count_subquery(Users.objects.all(), "dept"),
+        )
         serializer = DeptSerializer(queryset, many=True, request=request)
         data = serializer.data
         return SuccessResponse(data=data)
@@ -164,24 +177,14 @@ class DeptViewSet(CustomModelViewSet):
     @action(methods=['GET'], detail=False, permission_classes=[])
     def dept_info(self, request):
         """部门信息"""
-        def inner(did, li):
-            sub = Dept.objects.filter(parent_id=did)
-            if not sub.exists():
-                return li
-            for i in sub:
-                li.append(i.pk)
-                inner(i, li)
-            return li
         dept_id = request.query_params.get('dept_id')
         show_all = request.query_params.get('show_all')
         if dept_id is None:
             return ErrorResponse(msg="部门不存在")
         if not show_all:
             show_all = 0
-        if int(show_all):  # 递归当前部门下的所有部门，查询用户
-            all_did = [dept_id]
-            inner(dept_id, all_did)
-            users = Users.objects.filter(dept_id__in=all_did)
+        if int(show_all):  # 当前部门及所有下级部门的用户, 通过树形索引子查询一次获得
+            users = Users.objects.filter(dept_id__in=descendant_ids_queryset(Dept, dept_id))
         else:
             if dept_id != '':
                 users = Users.objects.filter(dept_id=dept_id)
@@ -202,11 +205,9 @@ class DeptViewSet(CustomModelViewSet):
             'sub_dept_map': []
         }
         for dept in sub_dept:
-            all_did = [dept.pk]
-            inner(dept.pk, all_did)
             sub_data = {
                 'name': dept.name,
-                'count': Users.objects.filter(dept_id__in=all_did).count()
+                'count': Users.objects.filter(dept_id__in=descendant_ids_queryset(Dept, dept.pk)).count()
             }
             data['sub_dept_map'].append(sub_data)
         return SuccessResponse(data)
@@ -11,7 +11,7 @@ from rest_framework.views import APIView
 
 from application import dispatch
 from dvadmin.system.models import Dictionary
-from dvadmin.utils.json_response import SuccessResponse
+from dvadmin.utils.json_response import SuccessResponse, conditional_response
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
 
@@ -95,13 +95,8 @@ class InitDictionaryViewSet(APIView):
     def get(self, request):
         dictionary_key = self.request.query_params.get('dictionary_key')
         if dictionary_key:
-            if dictionary_key == 'all':
-                data = [ele for ele in dispatch.get_dictionary_config().values()]
-                if not data:
-                    dispatch.refresh_dictionary()
-                    data = [ele for ele in dispatch.get_dictionary_config().values()]
-            else:
-                data = self.queryset.filter(parent__value=dictionary_key, status=True).values('label', 'value', 'type',
-                                                                                              'color')
-            return SuccessResponse(data=data, msg="获取成功")
+            # 多个字典编号以 | 分隔, 一次返回 {字典编号: 字典项列表}
+            keys = [key for key in dictionary_key.split(dispatch.KEY_SEPARATOR) if key]
+            data, etag = dispatch.get_frontend_dictionary(keys)
+            return conditional_response(request, etag, lambda: SuccessResponse(data=data, msg="获取成功"))
         return SuccessResponse(data=[], msg="获取成功")
@@ -10,6 +10,7 @@ from rest_framework.decorators import action
 from application import dispatch
 from dvadmin.system.models import FileList
 from dvadmin.utils.json_response import DetailResponse, SuccessResponse
+from dvadmin.utils.pagination import paginate
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
 
@@ -107,15 +108,21 @@ class FileViewSet(CustomModelViewSet):
     serializer_class = FileSerializer
     filter_class = FileFilter
     permission_classes = []
+    GET_ALL_MAX_SIZE = 1000
 
     @action(methods=['GET'], detail=False)
     def get_all(self, request):
-        data1 = self.get_serializer(self.get_queryset(), many=True).data
+        # 文件选择器按列表使用, 返回格式不变, 通过page/limit分页, 每页最多 GET_ALL_MAX_SIZE 条
+        rows, _ = paginate(request, self.get_queryset(), page_size=self.GET_ALL_MAX_SIZE,
+                           max_page_size=self.GET_ALL_MAX_SIZE)
+        data1 = self.get_serializer(rows, many=True).data
         data2 = []
         if dispatch.is_tenants_mode():
             from django_tenants.utils import schema_context
             with schema_context('public'):
-                data2 = self.get_serializer(FileList.objects.all(), many=True).data
+                rows, _ = paginate(request, FileList.objects.all(), page_size=self.GET_ALL_MAX_SIZE,
+                                   max_page_size=self.GET_ALL_MAX_SIZE)
+                data2 = self.get_serializer(rows, many=True).data
         return DetailResponse(data=data2+data1)
 
     def list(self, request, *args, **kwargs):
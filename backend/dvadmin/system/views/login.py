@@ -5,7 +5,6 @@ from captcha.views import CaptchaStore, captcha_image
 from django.contrib import auth
 from django.contrib.auth import login
 from django.contrib.auth.hashers import check_password, make_password
-from django.db.models import Q
 from django.shortcuts import redirect
 from django.utils.translation import gettext_lazy as _
 from drf_yasg import openapi
@@ -20,6 +19,7 @@ from django.conf import settings
 from application import dispatch
 from dvadmin.system.models import Users
 from dvadmin.utils.json_response import ErrorResponse, DetailResponse
+from dvadmin.utils.login_identity import resolve_login_user
 from dvadmin.utils.request_util import save_login_log
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.validator import CustomValidationError
@@ -147,10 +147,10 @@ class LoginSerializer(TokenObtainPairSerializer):
         #         else:
         #             self.image_code and self.image_code.delete()
         #             raise CustomValidationError("图片验证码错误")
+        request = self.context.get("request")
         try:
-            user = Users.objects.get(
-                Q(username=attrs['username']) | Q(email=attrs['username']) | Q(mobile=attrs['username']))
-            print("用户信息:", user.username, user.password)
+            # 按账号格式只查询 用户名/邮箱/手机号 中的一个索引字段
+            user = resolve_login_user(attrs['username'], request=request)
         except Users.DoesNotExist:
             raise CustomValidationError("您登录的账号不存在")
         except Users.MultipleObjectsReturned:
@@ -176,12 +176,9 @@ class LoginSerializer(TokenObtainPairSerializer):
             role = getattr(self.user, 'role', None)
             if role:
                 data['role_info'] = role.values('id', 'name', 'key')
-            request = self.context.get("request")
             request.user = self.user
-            # 记录登录日志
+            # 记录登录日志(登录时间与错误次数已由认证后端一次更新)
             save_login_log(request=request)
-            user.login_error_count = 0
-            user.save()
             return {"code": 2000, "msg": "请求成功", "data": data}
         except Exception as e:
             # 注释掉登录错误次数检查和锁定功能
@@ -8,6 +8,7 @@
 """
 from dvadmin.system.models import LoginLog
 from dvadmin.utils.field_permission import FieldPermissionMixin
+from dvadmin.utils.log_store import limit_to_recent
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
 
@@ -34,4 +35,12 @@ class LoginLogViewSet(CustomModelViewSet, FieldPermissionMixin):
     """
     queryset = LoginLog.objects.all()
     serializer_class = LoginLogSerializer
+    count_strategy = "estimated"
     # extra_filter_class = []
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # 未指定时间范围时只查询最近的日志
+            queryset = limit_to_recent(queryset, self.request)
+        return queryset
@@ -6,12 +6,15 @@
 @Created on: 2021/6/1 001 22:38
 @Remark: 菜单模块
 """
+from django.db.models import Prefetch
 from rest_framework import serializers
 from rest_framework.decorators import action
 
-from dvadmin.system.models import Menu, RoleMenuPermission
+from dvadmin.system.models import Menu, MenuButton, RoleMenuPermission
 from dvadmin.system.views.menu_button import MenuButtonSerializer
+from dvadmin.utils.authentication import get_auth_context
 from dvadmin.utils.json_response import SuccessResponse, ErrorResponse
+from dvadmin.utils.models import count_subquery
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
 
@@ -24,7 +27,12 @@ class MenuSerializer(CustomModelSerializer):
     hasChild = serializers.SerializerMethodField()
 
     def get_menuPermission(self, instance):
-        queryset = instance.menuPermission.order_by('-name').values('id', 'name', 'value')
+        if "menuPermission" in getattr(instance, "_prefetched_objects_cache", {}):
+            # 列表查询时已预取(MenuViewSet.list), 排序与下方查询一致
+            queryset = [{"id": item.id, "name": item.name, "value": item.value}
+                        for item in instance.menuPermission.all()]
+        else:
+            queryset = instance.menuPermission.order_by('-name').values('id', 'name', 'value')
         # MenuButtonSerializer(instance.menuPermission.all(), many=True)
         if queryset:
             return queryset
@@ -32,6 +40,8 @@ class MenuSerializer(CustomModelSerializer):
             return None
 
     def get_hasChild(self, instance):
+        if hasattr(instance, "child_count"):
+            return instance.child_count > 0
         hasChild = Menu.objects.filter(parent=instance.id)
         if hasChild:
             return True
@@ -91,6 +101,7 @@ class MenuViewSet(CustomModelViewSet):
     update_serializer_class = MenuCreateSerializer
     search_fields = ['name', 'status']
     filter_fields = ['parent', 'name', 'status', 'is_link', 'visible', 'cache', 'is_catalog']
+    max_queries = {"list": 10}
 
     def list(self, request):
         """懒加载"""
@@ -110,7 +121,9 @@ class MenuViewSet(CustomModelViewSet):
                 queryset = self.queryset.filter()
         else:
             queryset = self.queryset.filter(parent__isnull=True)
-        queryset = self.filter_queryset(queryset)
+        queryset = self.filter_queryset(queryset).prefetch_related(
+            Prefetch("menuPermission", queryset=MenuButton.objects.order_by("-name"))
+        ).annotate(child_count=count_subquery(Menu.objects.all(), "parent"))
         serializer = MenuSerializer(queryset, many=True, request=request)
         data = serializer.data
         return SuccessResponse(data=data)
@@ -122,7 +135,7 @@ class MenuViewSet(CustomModelViewSet):
         if user.is_superuser:
             queryset = self.queryset.filter(status=1).order_by("sort")
         else:
-            role_list = user.role.values_list('id', flat=True)
+            role_list = get_auth_context(request).role_ids
             menu_list = RoleMenuPermission.objects.filter(role__in=role_list).values_list('menu_id', flat=True)
             queryset = Menu.objects.filter(id__in=menu_list).order_by("sort")
         serializer = WebRouterSerializer(queryset, many=True, request=request)
@@ -135,7 +148,7 @@ class MenuViewSet(CustomModelViewSet):
         user = request.user
         queryset = self.queryset.all()
         if not user.is_superuser:
-            role_list = user.role.values_list('id', flat=True)
+            role_list = get_auth_context(request).role_ids
             menu_list = RoleMenuPermission.objects.filter(role__in=role_list).values_list('menu_id')
             queryset = Menu.objects.filter(id__in=menu_list)
         serializer = WebRouterSerializer(queryset, many=True, request=request)
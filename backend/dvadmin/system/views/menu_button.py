@@ -11,6 +11,7 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
 from dvadmin.system.models import MenuButton, RoleMenuButtonPermission, Menu
+from dvadmin.utils.authentication import get_auth_context
 from dvadmin.utils.json_response import DetailResponse, SuccessResponse
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
@@ -80,7 +81,7 @@ class MenuButtonViewSet(CustomModelViewSet):
         if is_superuser:
             queryset = MenuButton.objects.values_list('value',flat=True)
         else:
-            role_id = request.user.role.values_list('id', flat=True)
+            role_id = get_auth_context(request).role_ids
             queryset = RoleMenuButtonPermission.objects.filter(role__in=role_id).values_list('menu_button__value',flat=True).distinct()
         return DetailResponse(data=queryset)
 
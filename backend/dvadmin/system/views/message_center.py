@@ -3,6 +3,7 @@ import json
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.db.models import OuterRef, Subquery
 from django_restql.fields import DynamicSerializerMethodField
 from rest_framework import serializers
 from rest_framework.decorators import action, permission_classes
@@ -88,6 +89,9 @@ class MessageCenterTargetUserListSerializer(CustomModelSerializer):
     is_read = serializers.SerializerMethodField()
 
     def get_is_read(self, instance):
+        # 接收消息列表已通过子查询读取当前用户的已读状态(get_self_receive)
+        if hasattr(instance, "self_is_read"):
+            return bool(instance.self_is_read)
         user_id = self.request.user.id
         message_center_id = instance.id
         queryset = MessageCenterTargetUser.objects.filter(messagecenter__id=message_center_id, users_id=user_id).first()
@@ -188,6 +192,9 @@ class MessageCenterViewSet(CustomModelViewSet):
     serializer_class = MessageCenterSerializer
     create_serializer_class = MessageCenterCreateSerializer
     extra_filter_backends = []
+    search_fields = ['title', 'content']
+    search_backend = "fulltext"
+    index_hints = [("system.MessageCenterTargetUser", "users", "is_read")]
 
     def get_queryset(self):
         if self.action == 'list':
@@ -215,7 +222,10 @@ class MessageCenterViewSet(CustomModelViewSet):
         """
         self_user_id = self.request.user.id
         # queryset = MessageCenterTargetUser.objects.filter(users__id=self_user_id).order_by('-create_datetime')
-        queryset = MessageCenter.objects.filter(target_user__id=self_user_id)
+        queryset = MessageCenter.objects.filter(target_user__id=self_user_id).annotate(
+            self_is_read=Subquery(MessageCenterTargetUser.objects.filter(
+                messagecenter=OuterRef("pk"), users_id=self_user_id).values("is_read")[:1])
+        )
         # queryset = self.filter_queryset(queryset)
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 接口指标(Prometheus)
+"""
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.views import APIView
+
+from dvadmin.utils.log_writer import WRITERS
+from dvadmin.utils.metrics import render_prometheus
+from dvadmin.utils.permission import SuperuserPermission
+
+
+class MetricsPermission(SuperuserPermission):
+    """
+    超级管理员, 或请求头 Authorization: Bearer <METRICS_TOKEN> 可访问
+    """
+
+    def has_permission(self, request, view):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        if token and request.META.get('HTTP_AUTHORIZATION', '') == f'Bearer {token}':
+            return True
+        return super().has_permission(request, view)
+
+
+class MetricsView(APIView):
+    """
+    获取接口指标, Prometheus文本格式
+    """
+    permission_classes = [MetricsPermission]
+
+    def get(self, request):
+        writers = [({"writer": writer.name}, writer.stats()) for writer in WRITERS]
+        extra = [
+            ("log_writer_queued", "gauge", "日志写入队列中等待的条数",
+             [(labels, stats["queued"]) for labels, stats in writers]),
+            ("log_writer_dropped_total", "counter", "日志队列已满被丢弃的条数",
+             [(labels, stats["dropped"]) for labels, stats in writers]),
+        ]
+        return HttpResponse(render_prometheus(extra=extra), content_type='text/plain; version=0.0.4; charset=utf-8')
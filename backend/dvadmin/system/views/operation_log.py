@@ -7,7 +7,12 @@
 @Remark: 操作日志管理
 """
 
-from dvadmin.system.models import OperationLog
+from django.db.models import CharField, OuterRef, Subquery
+from django.db.models.functions import Cast
+
+from dvadmin.system.models import OperationLog, Users
+from dvadmin.utils.log_store import limit_to_recent
+from dvadmin.utils.projection import Projection
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
 
@@ -44,4 +49,40 @@ class OperationLogViewSet(CustomModelViewSet):
     """
     queryset = OperationLog.objects.order_by('-create_datetime')
     serializer_class = OperationLogSerializer
+    # 大表按估算统计总条数, 前端分页组件依赖 total, 保持页码分页
+    count_strategy = "estimated"
+    search_fields = ['request_modular', 'request_path', 'request_msg']
+    search_backend = "fulltext"
+    # 列表只读, 直接按字段查询, 输出与 OperationLogSerializer 一致
+    values_projection = Projection({
+        "id": "id",
+        "creator_name": "creator__name",
+        "modifier_name": Subquery(
+            Users.objects.annotate(id_str=Cast("id", CharField())).filter(id_str=OuterRef("modifier")).values("name")[:1]
+        ),
+        "create_datetime": "create_datetime",
+        "update_datetime": "update_datetime",
+        "description": "description",
+        "modifier": "modifier",
+        "dept_belong_id": "dept_belong_id",
+        "request_modular": "request_modular",
+        "request_path": "request_path",
+        "request_body": "request_body",
+        "request_method": "request_method",
+        "request_msg": "request_msg",
+        "request_ip": "request_ip",
+        "request_browser": "request_browser",
+        "response_code": "response_code",
+        "request_os": "request_os",
+        "json_result": "json_result",
+        "status": "status",
+        "creator": "creator",
+    })
     # permission_classes = []
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # 未指定时间范围时只查询最近的日志
+            queryset = limit_to_recent(queryset, self.request)
+        return queryset
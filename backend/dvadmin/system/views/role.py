@@ -14,6 +14,7 @@ from dvadmin.system.models import Role, Menu, MenuButton, Dept, Users
 from dvadmin.system.views.dept import DeptSerializer
 from dvadmin.system.views.menu import MenuSerializer
 from dvadmin.system.views.menu_button import MenuButtonSerializer
+from dvadmin.utils.authentication import get_auth_context
 from dvadmin.utils.crud_mixin import FastCrudMixin
 from dvadmin.utils.field_permission import FieldPermissionMixin
 from dvadmin.utils.json_response import SuccessResponse, DetailResponse, ErrorResponse
@@ -100,7 +101,7 @@ class MenuButtonPermissionSerializer(CustomModelSerializer):
         else:
             return MenuButton.objects.filter(
                 menu__id=instance.id,
-                role__id__in=self.request.user.role.values_list('id', flat=True),
+                role__id__in=get_auth_context(self.request).role_ids,
             ).exists()
 
     class Meta:
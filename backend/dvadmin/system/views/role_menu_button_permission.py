@@ -12,6 +12,7 @@ from rest_framework.permissions import IsAuthenticated
 
 from dvadmin.system.models import RoleMenuButtonPermission, Menu, Dept, MenuButton, RoleMenuPermission, \
     MenuField, FieldPermission
+from dvadmin.utils.authentication import get_auth_context
 from dvadmin.utils.json_response import DetailResponse
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
@@ -274,7 +275,7 @@ class RoleMenuButtonPermissionViewSet(CustomModelViewSet):
         is_superuser = request.user.is_superuser
         params = request.query_params
         # 当前登录用户的角色
-        role_list = request.user.role.values_list('id', flat=True)
+        role_list = get_auth_context(request).role_ids
 
         menu_button_id = params.get('menu_button')
         # 当前登录用户角色可以分配的自定义部门权限
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 慢查询记录查看(仅超级管理员)
+"""
+from rest_framework.views import APIView
+
+from dvadmin.utils.json_response import DetailResponse
+from dvadmin.utils.permission import SuperuserPermission
+from dvadmin.utils.slow_query import clear_slow_queries, get_slow_queries, get_threshold
+
+
+class SlowQueryView(APIView):
+    """
+    get: 获取当前进程记录的慢查询(按时间倒序), 包含规范化SQL/路由/耗时/执行计划
+    delete: 清空记录
+    """
+    permission_classes = [SuperuserPermission]
+
+    def get(self, request):
+        data = {
+            "threshold_ms": round(get_threshold() * 1000, 2),
+            "records": get_slow_queries(),
+        }
+        return DetailResponse(data=data, msg="获取成功")
+
+    def delete(self, request):
+        clear_slow_queries()
+        return DetailResponse(data=[], msg="清空成功")
@@ -14,7 +14,7 @@ from rest_framework.views import APIView
 
 from application import dispatch
 from dvadmin.system.models import SystemConfig
-from dvadmin.utils.json_response import DetailResponse, SuccessResponse, ErrorResponse
+from dvadmin.utils.json_response import DetailResponse, SuccessResponse, ErrorResponse, conditional_response
 from dvadmin.utils.models import get_all_models_objects
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.validator import CustomValidationError
@@ -206,29 +206,8 @@ class InitSettingsViewSet(APIView):
     authentication_classes = []
     permission_classes = []
 
-    def filter_system_config_values(self, data: dict):
-        """
-        过滤系统初始化配置
-        :param data:
-        :return:
-        """
-        if not self.request.query_params.get('key', ''):
-            return data
-        new_data = {}
-        for key in self.request.query_params.get('key', '').split('|'):
-            if key:
-                new_data.update(**dict(filter(lambda x: x[0].startswith(key), data.items())))
-        return new_data
-
     def get(self, request):
-        data = dispatch.get_system_config()
-        if not data:
-            dispatch.refresh_system_config()
-            data = dispatch.get_system_config()
-        # 不返回后端专用配置
-        backend_config = [f"{ele.get('parent__key')}.{ele.get('key')}" for ele in
-                          SystemConfig.objects.filter(status=False, parent_id__isnull=False).values('parent__key',
-                                                                                                    'key')]
-        data = dict(filter(lambda x: x[0] not in backend_config, data.items()))
-        data = self.filter_system_config_values(data=data)
-        return DetailResponse(data=data)
+        # 多个配置前缀以 | 分隔, 不返回后端专用配置
+        prefixes = request.query_params.get('key', '').split(dispatch.KEY_SEPARATOR)
+        data, etag = dispatch.get_frontend_system_config(prefixes)
+        return conditional_response(request, etag, lambda: DetailResponse(data=data))
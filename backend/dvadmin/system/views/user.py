@@ -11,24 +11,14 @@ from application import dispatch
 from dvadmin.system.models import Users, Role, Dept
 from dvadmin.system.utils.notifications import send_notification_to_user
 from dvadmin.system.views.role import RoleSerializer
+from dvadmin.utils.authentication import get_auth_context
 from dvadmin.utils.json_response import ErrorResponse, DetailResponse, SuccessResponse
 from dvadmin.utils.serializers import CustomModelSerializer
+from dvadmin.utils.tree_index import get_path_name, descendant_ids_queryset
 from dvadmin.utils.validator import CustomUniqueValidator
 from dvadmin.utils.viewset import CustomModelViewSet
 
 
-def recursion(instance, parent, result):
-    new_instance = getattr(instance, parent, None)
-    res = []
-    data = getattr(instance, result, None)
-    if data:
-        res.append(data)
-    if new_instance:
-        array = recursion(new_instance, parent, result)
-        res += array
-    return res
-
-
 class UserSerializer(CustomModelSerializer):
     """
     用户管理-序列化器
@@ -47,9 +37,13 @@ class UserSerializer(CustomModelSerializer):
         }
 
     def get_dept_name_all(self, instance):
-        dept_name_all = recursion(instance.dept, "parent", "name")
-        dept_name_all.reverse()
-        return "/".join(dept_name_all)
+        if instance.dept_id is None:
+            return ""
+        # 同一次序列化中相同部门只查询一次
+        dept_name_cache = self.context.setdefault("dept_name_all", {})
+        if instance.dept_id not in dept_name_cache:
+            dept_name_cache[instance.dept_id] = get_path_name(Dept, instance.dept_id)
+        return dept_name_cache[instance.dept_id]
 
     def get_role_info(self, instance, parsed_query):
         roles = instance.role.all()
@@ -286,7 +280,7 @@ class UserViewSet(CustomModelViewSet):
             "avatar": user.avatar,
             "dept": user.dept_id,
             "is_superuser": user.is_superuser,
-            "role": user.role.values_list('id', flat=True),
+            "role": get_auth_context(request).role_ids,
             "pwd_change_count":user.pwd_change_count
         }
         if hasattr(connection, 'tenant'):
@@ -403,16 +397,7 @@ class UserViewSet(CustomModelViewSet):
             # 当选择了部门时，默认包含下级部门的人员
             show_all = 1 if dept_id else 0
         if int(show_all):
-            all_did = [dept_id]
-            def inner(did):
-                sub = Dept.objects.filter(parent_id=did)
-                if not sub.exists():
-                    return
-                for i in sub:
-                    all_did.append(i.pk)
-                    inner(i)
             if dept_id != '':
-                inner(dept_id)
                 searchs = [
                     Q(**{f+'__icontains':i})
                     for f in self.search_fields
@@ -423,7 +408,8 @@ class UserViewSet(CustomModelViewSet):
                     for i in searchs[1:]:
                         q |= i
                     q_obj.append(Q(q))
-                queryset = Users.objects.filter(*q_obj, dept_id__in=all_did)
+                # 当前部门及所有下级部门, 通过树形索引子查询一次获得
+                queryset = Users.objects.filter(*q_obj, dept_id__in=descendant_ids_queryset(Dept, dept_id))
             else:
                 queryset = self.filter_queryset(self.get_queryset())
         else:
@@ -451,15 +437,7 @@ class UserViewSet(CustomModelViewSet):
             return ErrorResponse(msg="通知内容不能为空")
 
         # 只有管理员或超级管理员才能发送通知
-        request_user = request.user
-        is_admin_role = False
-        try:
-            roles = request_user.role.values_list("key", flat=True)
-            is_admin_role = "admin" in roles
-        except Exception:
-            pass
-
-        if not (request_user.is_superuser or is_admin_role):
+        if not get_auth_context(request).is_admin:
             return ErrorResponse(msg="只有管理员可以发送通知", code=403)
 
         message = send_notification_to_user(
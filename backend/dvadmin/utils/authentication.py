@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 自定义JWT认证
+(1)同一个请求只解析一次token, 中间件与DRF共用解析结果
+(2)用户信息短时间缓存, 用户变更时通过信号清除; 与权限缓存一样只在配置了共享缓存(或 PERMISSION_CACHE_ENABLE=True)时启用,
+   否则其他worker中已停用/修改密码的用户在缓存过期前仍可通过认证
+"""
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from dvadmin.utils.permission_cache import get_user_roles, permission_cache_enabled
+
+AUTH_USER_CACHE_KEY = "auth_user_{user_id}"
+AUTH_USER_CACHE_TIMEOUT = 60
+# 请求对象上保存认证结果的属性名
+REQUEST_AUTH_ATTR = "_jwt_authenticate_result"
+
+
+def clear_auth_user_cache(*user_ids):
+    """
+    用户信息变更时清除认证缓存
+    """
+    cache.delete_many([AUTH_USER_CACHE_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
+class CustomJWTAuthentication(JWTAuthentication):
+    """
+    带请求级复用与用户缓存的JWT认证
+    """
+
+    def authenticate(self, request):
+        raw_request = getattr(request, "_request", request)
+        if hasattr(raw_request, REQUEST_AUTH_ATTR):
+            return getattr(raw_request, REQUEST_AUTH_ATTR)
+        result = super().authenticate(request)
+        setattr(raw_request, REQUEST_AUTH_ATTR, result)
+        return result
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        use_cache = permission_cache_enabled()
+        key = AUTH_USER_CACHE_KEY.format(user_id=user_id)
+        user = cache.get(key) if use_cache else None
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if use_cache:
+                cache.set(key, user, timeout=AUTH_USER_CACHE_TIMEOUT)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class AuthContext:
+    """
+    请求级认证上下文, 角色等信息来自缓存, 同一请求内只取一次
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def user_id(self):
+        return getattr(self.user, "id", None)
+
+    @property
+    def dept_id(self):
+        return getattr(self.user, "dept_id", None)
+
+    @property
+    def is_superuser(self):
+        return bool(getattr(self.user, "is_superuser", False))
+
+    @cached_property
+    def roles(self):
+        if not self.user_id:
+            return {"ids": [], "keys": []}
+        return get_user_roles(self.user)
+
+    @property
+    def role_ids(self):
+        return self.roles["ids"]
+
+    @property
+    def is_admin(self):
+        return self.is_superuser or "admin" in self.roles["keys"]
+
+
+def get_auth_context(request):
+    """
+    获取请求的认证上下文
+    """
+    raw_request = getattr(request, "_request", request)
+    context = getattr(raw_request, "auth_context", None)
+    if context is None or context.user is not getattr(request, "user", None):
+        context = AuthContext(getattr(request, "user", None))
+        raw_request.auth_context = context
+    return context
@@ -6,6 +6,7 @@ from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.hashers import check_password
 from django.utils import timezone
 
+from dvadmin.utils.login_identity import resolve_login_user
 from dvadmin.utils.validator import CustomValidationError
 
 logger = logging.getLogger(__name__)
@@ -56,8 +57,9 @@ class CustomBackend(ModelBackend):
             raise CustomValidationError("当前用户已被禁用，请联系管理员!")
         
         try:
-            user = UserModel._default_manager.get_by_natural_key(username)
-        except UserModel.DoesNotExist:
+            # 登录序列化器已解析过的用户直接复用, 不再重复查询
+            user = resolve_login_user(username, request=request)
+        except (UserModel.DoesNotExist, UserModel.MultipleObjectsReturned):
             UserModel().set_password(password)
         else:
             verify_password = check_password(password, user.password)
@@ -67,6 +69,7 @@ class CustomBackend(ModelBackend):
             if verify_password:
                 if self.user_can_authenticate(user):
                     user.last_login = timezone.now()
-                    user.save()
+                    user.login_error_count = 0
+                    user.save(update_fields=["last_login", "login_error_count"])
                     return user
                 raise CustomValidationError("当前用户已被禁用，请联系管理员!")
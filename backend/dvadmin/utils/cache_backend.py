@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 缓存后端检查
+权限矩阵/字典等进程内缓存依靠缓存中的版本号在多进程间失效,
+未配置 CACHES 时Django默认使用进程内的 LocMemCache, 版本号无法在 gunicorn/uvicorn 的多个worker间共享
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+
+# 只在当前进程内有效的缓存后端
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """
+    缓存是否在多个进程间共享(redis/memcached/数据库/文件等)
+    """
+    backend = getattr(settings, "CACHES", {}).get(alias, {}).get("BACKEND", LOCAL_CACHE_BACKENDS[0])
+    return backend not in LOCAL_CACHE_BACKENDS
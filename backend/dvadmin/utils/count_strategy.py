@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 分页总条数统计策略
+(1)exact: 精确统计 COUNT(*)
+(2)cached: 按查询条件(SQL指纹)缓存精确统计结果, 短时间过期, 模型数据变更时失效;
+   只为使用 cached 的模型(视图声明 count_strategy = "cached" 或全局默认为 cached)注册数据变更信号
+(3)estimated: 超过阈值时返回估算值, PostgreSQL使用执行计划的估算行数, 其他数据库统计到上限(LIMIT n+1)为止
+"""
+import hashlib
+import json
+import logging
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+EXACT_COUNT = "exact"
+CACHED_COUNT = "cached"
+ESTIMATED_COUNT = "estimated"
+
+COUNT_VERSION_KEY = "count_version_{label}"
+COUNT_CACHE_KEY = "count_{label}_{version}_{digest}"
+
+
+def get_count_version(model):
+    key = COUNT_VERSION_KEY.format(label=model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+def refresh_count_version(model):
+    """
+    模型数据变更后使缓存的统计结果失效
+    bulk_create/update 等不触发信号的批量写入依靠缓存过期时间(PAGINATION_COUNT_CACHE_TIMEOUT)
+    """
+    cache.set(COUNT_VERSION_KEY.format(label=model._meta.label_lower), uuid4().hex, timeout=None)
+
+
+def _refresh_count_cache(sender, **kwargs):
+    refresh_count_version(sender)
+
+
+def get_count_strategy(strategy=None):
+    return strategy or getattr(settings, "PAGINATION_COUNT_STRATEGY", EXACT_COUNT)
+
+
+def register_count_cache(model):
+    """
+    模型数据变更(post_save/post_delete)时使缓存的统计结果失效, 重复注册无影响
+    """
+    dispatch_uid = f"refresh_count_cache_{model._meta.label_lower}"
+    post_save.connect(_refresh_count_cache, sender=model, dispatch_uid=dispatch_uid)
+    post_delete.connect(_refresh_count_cache, sender=model, dispatch_uid=dispatch_uid)
+
+
+def query_fingerprint(queryset):
+    """
+    查询条件指纹: 相同的SQL及参数(包含数据权限过滤)得到相同的值
+    """
+    sql, params = queryset.query.sql_with_params()
+    connection = connections[queryset.db]
+    schema = getattr(connection, "schema_name", "")
+    content = f"{schema}\n{sql}\n{json.dumps(params, default=str)}"
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+def exact_count(queryset):
+    return queryset.count()
+
+
+def cached_count(queryset):
+    model = queryset.model
+    # 视图之外(如 paginate())使用时在首次统计前注册
+    register_count_cache(model)
+    try:
+        digest = query_fingerprint(queryset)
+    except Exception as e:
+        # 无法生成SQL的查询(如结果必为空)直接统计
+        logger.debug(f"生成查询指纹失败: {e}")
+        return queryset.count()
+    key = COUNT_CACHE_KEY.format(label=model._meta.label_lower, version=get_count_version(model), digest=digest)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout=getattr(settings, "PAGINATION_COUNT_CACHE_TIMEOUT", 60))
+    return count
+
+
+def planner_estimate(queryset):
+    """
+    PostgreSQL执行计划估算的行数, 其他数据库返回None
+    """
+    if connections[queryset.db].vendor != "postgresql":
+        return None
+    try:
+        plan = json.loads(queryset.order_by().explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning(f"获取估算行数失败: {e}")
+        return None
+
+
+def estimated_count(queryset):
+    """
+    :return: (条数, 是否为估算值)
+    """
+    threshold = getattr(settings, "PAGINATION_COUNT_ESTIMATE_THRESHOLD", 100000)
+    estimate = planner_estimate(queryset)
+    if estimate is not None:
+        # 估算值在数据量小时误差较大, 低于阈值时仍精确统计
+        if estimate >= threshold:
+            return estimate, True
+        return queryset.count(), False
+    count = queryset.order_by()[:threshold + 1].count()
+    if count > threshold:
+        return threshold, True
+    return count, False
+
+
+def get_count(queryset, strategy=None):
+    """
+    按策略统计条数
+    :param strategy: exact/cached/estimated, 默认读取 PAGINATION_COUNT_STRATEGY
+    :return: (条数, 是否为估算值)
+    """
+    strategy = get_count_strategy(strategy)
+    if not hasattr(queryset, "query"):
+        return len(queryset), False
+    if strategy == CACHED_COUNT:
+        return cached_count(queryset), False
+    if strategy == ESTIMATED_COUNT:
+        return estimated_count(queryset)
+    return exact_count(queryset), False
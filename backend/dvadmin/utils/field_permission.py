@@ -4,6 +4,7 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
 from dvadmin.system.models import FieldPermission, MenuField
+from dvadmin.utils.authentication import get_auth_context
 from dvadmin.utils.json_response import DetailResponse
 
 
@@ -35,7 +36,7 @@ class FieldPermissionMixin:
             data = MenuField.objects.filter(model=model).values('field_name')
             result = {item['field_name']: {"is_create": True, "is_query": True, "is_update": True} for item in data}
         else:
-            roles = request.user.role.values_list('id', flat=True)
+            roles = get_auth_context(request).role_ids
             data = FieldPermission.objects.filter(
                 field__model=model, role__in=roles
             ).values('is_create', 'is_query', 'is_update', field_name=F('field__field_name'))
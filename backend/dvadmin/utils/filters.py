@@ -14,6 +14,7 @@ from functools import reduce
 import six
 from django.db import models
 from django.db.models import Q, F
+from django.db.models.functions import Cast
 from django.db.models.constants import LOOKUP_SEP
 from django_filters import utils, FilterSet
 from django_filters.constants import ALL_FIELDS
@@ -22,8 +23,11 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django_filters.utils import get_model_field
 from rest_framework.filters import BaseFilterBackend
 from django_filters.conf import settings
-from dvadmin.system.models import Dept, ApiWhiteList, RoleMenuButtonPermission, MenuButton
+from dvadmin.system.models import Dept, RoleMenuButtonPermission, MenuButton
 from dvadmin.utils.models import CoreModel
+from dvadmin.utils.authentication import get_auth_context
+from dvadmin.utils.permission_cache import get_method_index, get_data_white_list_matcher, get_data_scope
+from dvadmin.utils.tree_index import get_descendant_ids, descendant_ids_queryset
 
 class CoreModelFilterBankend(BaseFilterBackend):
     """
@@ -58,21 +62,13 @@ class CoreModelFilterBankend(BaseFilterBackend):
 
 def get_dept(dept_id: int, dept_all_list=None, dept_list=None):
     """
-    递归获取部门的所有下级部门
+    获取部门的所有下级部门(含自身), 通过树形索引一次查询获得
     :param dept_id: 需要获取的部门id
-    :param dept_all_list: 所有部门列表
-    :param dept_list: 递归部门list
+    :param dept_all_list: 已废弃, 保留以兼容旧调用
+    :param dept_list: 已废弃, 保留以兼容旧调用
     :return:
     """
-    if not dept_all_list:
-        dept_all_list = Dept.objects.all().values("id", "parent")
-    if dept_list is None:
-        dept_list = [dept_id]
-    for ele in dept_all_list:
-        if ele.get("parent") == dept_id:
-            dept_list.append(ele.get("id"))
-            get_dept(ele.get("id"), dept_all_list, dept_list)
-    return list(set(dept_list))
+    return get_descendant_ids(Dept, dept_id)
 
 
 class DataLevelPermissionsFilter(BaseFilterBackend):
@@ -93,27 +89,10 @@ class DataLevelPermissionsFilter(BaseFilterBackend):
         接口白名单是否认证数据权限
         """
         api = request.path  # 当前请求接口
-        method = request.method  # 当前请求方法
-        methodList = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
-        method = methodList.index(method)
+        method = get_method_index(request.method)  # 当前请求方法
         # ***接口白名单***
-        api_white_list = ApiWhiteList.objects.filter(enable_datasource=False).values(
-            permission__api=F("url"), permission__method=F("method")
-        )
-        api_white_list = [
-            str(item.get("permission__api").replace("{id}", ".*?"))
-            + ":"
-            + str(item.get("permission__method"))
-            for item in api_white_list
-            if item.get("permission__api")
-        ]
-        for item in api_white_list:
-            new_api = f"{api}:{method}"
-            matchObj = re.match(item, new_api, re.M | re.I)
-            if matchObj is None:
-                continue
-            else:
-                return queryset
+        if method is not None and get_data_white_list_matcher().match(api, method):
+            return queryset
         """
         判断是否为超级管理员:
         如果不是超级管理员,则进入下一步权限判断
@@ -123,6 +102,32 @@ class DataLevelPermissionsFilter(BaseFilterBackend):
         else:
             return queryset
 
+    @staticmethod
+    def resolve_data_scope(role_id_list, re_api, method, user_dept_id):
+        """
+        解析角色集合在某个接口上的数据权限范围(结果按 角色集合/接口/方法/部门 缓存)
+        :return: {"all": 全部数据, "self": 仅本人, "dept_ids": 部门id列表, "children": 是否含本部门及以下,
+                  "custom": 是否含自定数据权限}
+        """
+        # 修复权限获取bug
+        menu_button_ids = MenuButton.objects.filter(api=re_api, method=method).values_list('id', flat=True)
+        dataScope_list = set()  # 权限范围列表
+        if menu_button_ids:
+            dataScope_list = set(RoleMenuButtonPermission.objects.filter(
+                role__in=role_id_list,
+                role__status=1,
+                menu_button_id__in=menu_button_ids).values_list('data_range', flat=True))
+        # 判断用户是否为超级管理员角色/如果拥有[全部数据权限]则返回所有数据
+        if 3 in dataScope_list:
+            return {"all": True}
+        if 0 in dataScope_list:
+            return {"self": True}
+        return {
+            "dept_ids": [user_dept_id] if 2 in dataScope_list else [],
+            "children": 1 in dataScope_list,
+            "custom": 4 in dataScope_list,
+        }
+
     # TODO Rename this here and in `filter_queryset`
     def _extracted_from_filter_queryset_33(self, request, queryset, api, method):
         # 0. 获取用户的部门id，没有部门则返回空
@@ -148,59 +153,66 @@ class DataLevelPermissionsFilter(BaseFilterBackend):
         _pk = request.parser_context["kwargs"].get('pk')
         if _pk: # 判断是否是单例查询
             re_api = re.sub(_pk,'{id}', api)
-        role_id_list = request.user.role.values_list('id', flat=True)
-        # 修复权限获取bug
-        menu_button_ids = MenuButton.objects.filter(api=re_api,method=method).values_list('id', flat=True)
-        role_permission_list = []
-        if menu_button_ids:
-            role_permission_list=RoleMenuButtonPermission.objects.filter(
-                role__in=role_id_list,
-                role__status=1,
-                menu_button_id__in=menu_button_ids).values(
-                'data_range'
-            )
-        dataScope_list = []  # 权限范围列表
-        for ele in role_permission_list:
-                # 判断用户是否为超级管理员角色/如果拥有[全部数据权限]则返回所有数据
-            if ele.get("data_range") == 3:
-                return queryset
-            dataScope_list.append(ele.get("data_range"))
-        dataScope_list = list(set(dataScope_list))
+        role_id_list = get_auth_context(request).role_ids
+        data_scope = get_data_scope(
+            role_id_list, re_api, method, user_dept_id,
+            lambda: self.resolve_data_scope(role_id_list, re_api, method, user_dept_id)
+        )
+        if data_scope.get("all"):
+            return queryset
 
         # 4. 只为仅本人数据权限时只返回过滤本人数据，并且部门为自己本部门(考虑到用户会变部门，只能看当前用户所在的部门数据)
-        if 0 in dataScope_list:
+        if data_scope.get("self"):
             return queryset.filter(
                 creator=request.user, dept_belong_id=user_dept_id
             )
 
-        # 5. 自定数据权限 获取部门，根据部门过滤
-        dept_list = []
-        for ele in dataScope_list:
-            if ele == 1:
-                dept_list.append(user_dept_id)
-                dept_list.extend(
-                    get_dept(
-                        user_dept_id,
-                    )
-                )
-            elif ele == 2:
-                dept_list.append(user_dept_id)
-            elif ele == 4:
-                dept_ids = RoleMenuButtonPermission.objects.filter(
-                    role__in=role_id_list,
-                    role__status=1,
-                    data_range=4).values_list(
-                    'dept__id',flat=True
-                )
-                dept_list.extend(
-                    dept_ids
-                )
-        if queryset.model._meta.model_name == 'dept':
-            return queryset.filter(id__in=list(set(dept_list)))
-        return queryset.filter(dept_belong_id__in=list(set(dept_list)))
+        # 5. 自定数据权限 获取部门，根据部门过滤; 下级部门与自定部门以子查询方式交给数据库处理
+        is_dept_model = queryset.model._meta.model_name == 'dept'
+        field_name = "id" if is_dept_model else "dept_belong_id"
+        dept_querysets = []
+        if data_scope["children"]:
+            dept_querysets.append(Dept.objects.filter(id__in=descendant_ids_queryset(Dept, user_dept_id)))
+        if data_scope["custom"]:
+            dept_querysets.append(Dept.objects.filter(
+                rolemenubuttonpermission__role__in=role_id_list,
+                rolemenubuttonpermission__role__status=1,
+                rolemenubuttonpermission__data_range=4,
+            ))
+        condition = Q(**{f"{field_name}__in": data_scope["dept_ids"]})
+        for dept_queryset in dept_querysets:
+            if is_dept_model:
+                dept_queryset = dept_queryset.values("id")
+            else:
+                # dept_belong_id 为字符串字段, 子查询中需要转换类型
+                dept_queryset = dept_queryset.annotate(
+                    dept_id_str=Cast("id", output_field=models.CharField())).values("dept_id_str")
+            condition |= Q(**{f"{field_name}__in": dept_queryset})
+        return queryset.filter(condition)
+
+
+def _freeze_fields(fields):
+    """
+    filter_fields 的可哈希形式, 用作缓存键
+    """
+    if isinstance(fields, dict):
+        return tuple((name, tuple(lookups)) for name, lookups in fields.items())
+    if isinstance(fields, (list, tuple)):
+        return tuple(fields)
+    return fields
+
+
+# 自动生成的FilterSet类缓存 {(视图类, 模型, filterset_fields, filter_fields): FilterSet类}
+_auto_filterset_classes = {}
 
 
 class CustomDjangoFilterBackend(DjangoFilterBackend):
+    """
+    (1)视图未指定 filterset_class 时按 filter_fields 自动生成FilterSet, 生成的类按
+       (视图类, 模型, filterset_fields, filter_fields) 缓存复用, 不在每次请求时重新创建
+    (2)cache_filterset_class = False 时每次请求重新生成(用于性能对比)
+    """
+    cache_filterset_class = True
     lookup_prefixes = {
         "^": "istartswith",
         "=": "iexact",
@@ -273,159 +285,172 @@ class CustomDjangoFilterBackend(DjangoFilterBackend):
             return filterset_class
 
         if filterset_fields and queryset is not None:
-            MetaBase = getattr(self.filterset_base, "Meta", object)
-
-            class AutoFilterSet(self.filterset_base):
-                @classmethod
-                def get_all_model_fields(cls, model):
-                    opts = model._meta
-
-                    return [
-                        f.name
-                        for f in sorted(opts.fields + opts.many_to_many)
-                        if (f.name == "id")
-                        or not isinstance(f, models.AutoField)
-                        and not (getattr(f.remote_field, "parent_link", False))
-                    ]
-
-                @classmethod
-                def get_fields(cls):
-                    """
-                    Resolve the 'fields' argument that should be used for generating filters on the
-                    filterset. This is 'Meta.fields' sans the fields in 'Meta.exclude'.
-                    """
-                    model = cls._meta.model
-                    fields = cls._meta.fields
-                    exclude = cls._meta.exclude
-
-                    assert not (fields is None and exclude is None), (
-                        "Setting 'Meta.model' without either 'Meta.fields' or 'Meta.exclude' "
-                        "has been deprecated since 0.15.0 and is now disallowed. Add an explicit "
-                        "'Meta.fields' or 'Meta.exclude' to the %s class." % cls.__name__
-                    )
+            if not self.cache_filterset_class:
+                return self.build_auto_filterset_class(queryset.model, filterset_fields)
+            key = (view.__class__, queryset.model, _freeze_fields(filterset_fields), _freeze_fields(self.filter_fields))
+            filterset_class = _auto_filterset_classes.get(key)
+            if filterset_class is None:
+                filterset_class = self.build_auto_filterset_class(queryset.model, filterset_fields)
+                _auto_filterset_classes[key] = filterset_class
+            return filterset_class
+
+        return None
 
-                    # Setting exclude with no fields implies all other fields.
-                    if exclude is not None and fields is None:
-                        fields = ALL_FIELDS
-
-                    # Resolve ALL_FIELDS into all fields for the filterset's model.
-                    if fields == ALL_FIELDS:
-                        fields = cls.get_all_model_fields(model)
-
-                    # Remove excluded fields
-                    exclude = exclude or []
-                    if not isinstance(fields, dict):
-                        fields = [(f, [settings.DEFAULT_LOOKUP_EXPR]) for f in fields if f not in exclude]
-                    else:
-                        fields = [(f, lookups) for f, lookups in fields.items() if f not in exclude]
-
-                    return OrderedDict(fields)
-
-                @classmethod
-                def get_filters(cls):
-                    """
-                    Get all filters for the filterset. This is the combination of declared and
-                    generated filters.
-                    """
-
-                    # No model specified - skip filter generation
-                    if not cls._meta.model:
-                        return cls.declared_filters.copy()
-
-                    # Determine the filters that should be included on the filterset.
-                    filters = OrderedDict()
-                    fields = cls.get_fields()
-                    undefined = []
-
-                    for field_name, lookups in fields.items():
-                        field = get_model_field(cls._meta.model, field_name)
-                        from django.db import models
-                        from timezone_field import TimeZoneField
-
-                        # 不进行 过滤的model 类
-                        if isinstance(field, (models.JSONField, TimeZoneField, models.FileField)):
+    def build_auto_filterset_class(self, filterset_model, filterset_fields):
+        """
+        按 filterset_fields 生成FilterSet类, 并预先计算条件查询使用的 {参数名: ORM查询表达式}
+        """
+        MetaBase = getattr(self.filterset_base, "Meta", object)
+
+        class AutoFilterSet(self.filterset_base):
+            @classmethod
+            def get_all_model_fields(cls, model):
+                opts = model._meta
+
+                return [
+                    f.name
+                    for f in sorted(opts.fields + opts.many_to_many)
+                    if (f.name == "id")
+                    or not isinstance(f, models.AutoField)
+                    and not (getattr(f.remote_field, "parent_link", False))
+                ]
+
+            @classmethod
+            def get_fields(cls):
+                """
+                Resolve the 'fields' argument that should be used for generating filters on the
+                filterset. This is 'Meta.fields' sans the fields in 'Meta.exclude'.
+                """
+                model = cls._meta.model
+                fields = cls._meta.fields
+                exclude = cls._meta.exclude
+
+                assert not (fields is None and exclude is None), (
+                    "Setting 'Meta.model' without either 'Meta.fields' or 'Meta.exclude' "
+                    "has been deprecated since 0.15.0 and is now disallowed. Add an explicit "
+                    "'Meta.fields' or 'Meta.exclude' to the %s class." % cls.__name__
+                )
+
+                # Setting exclude with no fields implies all other fields.
+                if exclude is not None and fields is None:
+                    fields = ALL_FIELDS
+
+                # Resolve ALL_FIELDS into all fields for the filterset's model.
+                if fields == ALL_FIELDS:
+                    fields = cls.get_all_model_fields(model)
+
+                # Remove excluded fields
+                exclude = exclude or []
+                if not isinstance(fields, dict):
+                    fields = [(f, [settings.DEFAULT_LOOKUP_EXPR]) for f in fields if f not in exclude]
+                else:
+                    fields = [(f, lookups) for f, lookups in fields.items() if f not in exclude]
+
+                return OrderedDict(fields)
+
+            @classmethod
+            def get_filters(cls):
+                """
+                Get all filters for the filterset. This is the combination of declared and
+                generated filters.
+                """
+
+                # No model specified - skip filter generation
+                if not cls._meta.model:
+                    return cls.declared_filters.copy()
+
+                # Determine the filters that should be included on the filterset.
+                filters = OrderedDict()
+                fields = cls.get_fields()
+                undefined = []
+
+                for field_name, lookups in fields.items():
+                    field = get_model_field(cls._meta.model, field_name)
+                    from django.db import models
+                    from timezone_field import TimeZoneField
+
+                    # 不进行 过滤的model 类
+                    if isinstance(field, (models.JSONField, TimeZoneField, models.FileField)):
+                        continue
+                    # warn if the field doesn't exist.
+                    if field is None:
+                        undefined.append(field_name)
+                    # 更新默认字符串搜索为模糊搜索
+                    if (
+                        isinstance(field, (models.CharField))
+                        and filterset_fields == "__all__"
+                        and lookups == ["exact"]
+                    ):
+                        lookups = ["icontains"]
+                    for lookup_expr in lookups:
+                        filter_name = cls.get_filter_name(field_name, lookup_expr)
+
+                        # If the filter is explicitly declared on the class, skip generation
+                        if filter_name in cls.declared_filters:
+                            filters[filter_name] = cls.declared_filters[filter_name]
                             continue
-                        # warn if the field doesn't exist.
-                        if field is None:
-                            undefined.append(field_name)
-                        # 更新默认字符串搜索为模糊搜索
-                        if (
-                            isinstance(field, (models.CharField))
-                            and filterset_fields == "__all__"
-                            and lookups == ["exact"]
-                        ):
-                            lookups = ["icontains"]
-                        for lookup_expr in lookups:
-                            filter_name = cls.get_filter_name(field_name, lookup_expr)
-
-                            # If the filter is explicitly declared on the class, skip generation
-                            if filter_name in cls.declared_filters:
-                                filters[filter_name] = cls.declared_filters[filter_name]
-                                continue
-
-                            if field is not None:
-                                filters[filter_name] = cls.filter_for_field(field, field_name, lookup_expr)
-
-                    # Allow Meta.fields to contain declared filters *only* when a list/tuple
-                    if isinstance(cls._meta.fields, (list, tuple)):
-                        undefined = [f for f in undefined if f not in cls.declared_filters]
-
-                    if undefined:
-                        raise TypeError(
-                            "'Meta.fields' must not contain non-model field names: %s" % ", ".join(undefined)
-                        )
-
-                    # Add in declared filters. This is necessary since we don't enforce adding
-                    # declared filters to the 'Meta.fields' option
-                    filters.update(cls.declared_filters)
-                    return filters
-
-                class Meta(MetaBase):
-                    model = queryset.model
-                    fields = filterset_fields
-
-            return AutoFilterSet
 
-        return None
+                        if field is not None:
+                            filters[filter_name] = cls.filter_for_field(field, field_name, lookup_expr)
+
+                # Allow Meta.fields to contain declared filters *only* when a list/tuple
+                if isinstance(cls._meta.fields, (list, tuple)):
+                    undefined = [f for f in undefined if f not in cls.declared_filters]
+
+                if undefined:
+                    raise TypeError(
+                        "'Meta.fields' must not contain non-model field names: %s" % ", ".join(undefined)
+                    )
+
+                # Add in declared filters. This is necessary since we don't enforce adding
+                # declared filters to the 'Meta.fields' option
+                filters.update(cls.declared_filters)
+                return filters
+
+            class Meta(MetaBase):
+                model = filterset_model
+                fields = filterset_fields
+
+        filter_fields = AutoFilterSet.base_filters if self.filter_fields == "__all__" else self.filter_fields
+        orm_lookup_dict = dict(
+            zip(
+                [field for field in filter_fields],
+                [AutoFilterSet.base_filters[lookup].lookup_expr for lookup in AutoFilterSet.base_filters.keys()],
+            )
+        )
+        orm_lookups = [
+            self.construct_search(lookup, lookup_expr) for lookup, lookup_expr in orm_lookup_dict.items()
+        ]
+        # 参数名对应的第一个查询表达式, 与 find_filter_lookups 的结果一致
+        search_lookups = {}
+        for lookup in orm_lookups:
+            search_lookups.setdefault(LOOKUP_SEP.join(lookup.split(LOOKUP_SEP)[:-1]) or lookup, lookup)
+        AutoFilterSet.is_auto_filterset = True
+        AutoFilterSet.search_lookups = search_lookups
+        return AutoFilterSet
 
     def filter_queryset(self, request, queryset, view):
-        filterset = self.get_filterset(request, queryset, view)
-        if filterset is None:
+        filterset_class = self.get_filterset_class(view, queryset)
+        if filterset_class is None:
             return queryset
-        if filterset.__class__.__name__ == "AutoFilterSet":
-            queryset = filterset.queryset
-            filter_fields = filterset.filters if self.filter_fields == "__all__" else self.filter_fields
-            orm_lookup_dict = dict(
-                zip(
-                    [field for field in filter_fields],
-                    [filterset.filters[lookup].lookup_expr for lookup in filterset.filters.keys()],
-                )
-            )
-            orm_lookups = [
-                self.construct_search(lookup, lookup_expr) for lookup, lookup_expr in orm_lookup_dict.items()
-            ]
-            # print(orm_lookups)
-            conditions = []
+        if getattr(filterset_class, "is_auto_filterset", False):
+            # 自动生成的FilterSet只用于生成查询表达式, 无需实例化(实例化时会深拷贝全部过滤器)
+            data = request.query_params
             queries = []
-            for search_term_key in filterset.data.keys():
-                orm_lookup = self.find_filter_lookups(orm_lookups, search_term_key)
-                if not orm_lookup or filterset.data.get(search_term_key) == '':
+            for search_term_key in data.keys():
+                orm_lookup = filterset_class.search_lookups.get(search_term_key)
+                if not orm_lookup or data.get(search_term_key) == '':
                     continue
-                filterset_data_len = len(filterset.data.getlist(search_term_key))
+                filterset_data_len = len(data.getlist(search_term_key))
                 if filterset_data_len == 1:
-                    query = Q(**{orm_lookup: filterset.data[search_term_key]})
-                    queries.append(query)
+                    queries.append(Q(**{orm_lookup: data[search_term_key]}))
                 elif filterset_data_len == 2:
-                    orm_lookup += '__range'
-                    query = Q(**{orm_lookup: filterset.data.getlist(search_term_key)})
-                    queries.append(query)
-            if len(queries) > 0:
-                conditions.append(reduce(operator.and_, queries))
-                queryset = queryset.filter(reduce(operator.and_, conditions))
-                return queryset
-            else:
-                return queryset
+                    queries.append(Q(**{orm_lookup + '__range': data.getlist(search_term_key)}))
+            if queries:
+                return queryset.filter(reduce(operator.and_, queries))
+            return queryset
 
+        filterset = filterset_class(**self.get_filterset_kwargs(request, queryset, view))
         if not filterset.is_valid() and self.raise_exception:
             raise utils.translate_validation(filterset.errors)
         return filterset.qs
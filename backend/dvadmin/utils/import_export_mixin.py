@@ -258,6 +258,8 @@ class ExportSerializerMixin:
     export_field_label = []
     # 导出序列化器
     export_serializer_class = None
+    # 导出投影 Projection({字段: 字段路径/表达式/ChoiceLabel}), 设置后直接用 values_list() 导出, 不经过导出序列化器
+    export_projection = None
     # 表格表头最大宽度，默认50个字符
     export_column_width = 50
 
@@ -302,8 +304,11 @@ class ExportSerializerMixin:
         """
         queryset = self.filter_queryset(self.get_queryset())
         assert self.export_field_label, "'%s' 请配置对应的导出模板字段。" % self.__class__.__name__
-        assert self.export_serializer_class, "'%s' 请配置对应的导出序列化器。" % self.__class__.__name__
-        data = self.export_serializer_class(queryset, many=True, request=request).data
+        if self.export_projection:
+            data = self.export_projection.apply(queryset).iterator(chunk_size=2000)
+        else:
+            assert self.export_serializer_class, "'%s' 请配置对应的导出序列化器。" % self.__class__.__name__
+            data = self.export_serializer_class(queryset, many=True, request=request).data
         
         # 直接导出excel文件，不通过异步任务
         timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
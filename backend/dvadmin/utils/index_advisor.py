@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 索引建议
+根据 CustomModelViewSet 的过滤/排序配置推断常用的查询条件, 与数据库中已有的索引对比后给出缺少的组合索引:
+(1)filter_fields/filterset_fields 中的等值字段, 与日期类过滤字段或排序字段组成 (等值字段, 范围/排序字段)
+(2)数据权限过滤(DataLevelPermissionsFilter)使用的 dept_belong_id, 与 create_datetime 组合
+(3)时间范围过滤(CoreModelFilterBankend)使用的 create_datetime
+(4)视图 index_hints 声明的组合, 如 [("code", "status"), ("system.MessageCenterTargetUser", "users", "is_read")]
+search_fields 为模糊匹配, 普通索引无法使用, 由全文索引(SEARCH_INDEXES)处理;
+建议以 models.Index 的形式加入模型的 Meta.indexes, 随部署时生成的迁移创建, 同时给出可直接执行的SQL
+"""
+import hashlib
+from dataclasses import dataclass, field
+from itertools import groupby
+
+from django.apps import apps
+from django.db import connection, models
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from dvadmin.utils.filters import CoreModelFilterBankend, DataLevelPermissionsFilter
+from dvadmin.utils.viewset import CustomModelViewSet
+
+DATA_SCOPE_FIELD = "dept_belong_id"
+DATE_RANGE_FIELD = "create_datetime"
+# 只用于模糊匹配或无法建立普通索引的字段类型
+UNINDEXABLE_FIELDS = (models.TextField, models.JSONField, models.FileField, models.BinaryField)
+
+
+@dataclass
+class IndexSuggestion:
+    model: type
+    columns: tuple
+    fields: tuple
+    reasons: list = field(default_factory=list)
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    @property
+    def name(self):
+        digest = hashlib.md5(f"{self.table}.{'.'.join(self.columns)}".encode("utf-8")).hexdigest()[:8]
+        # 索引名最长30个字符(Django 模型检查)
+        return f"{self.table[:17]}_{digest}_idx"
+
+    def as_index(self):
+        return models.Index(fields=list(self.fields), name=self.name)
+
+    def render_index(self):
+        """
+        加入模型 Meta.indexes 的代码
+        """
+        return f"models.Index(fields={list(self.fields)!r}, name={self.name!r})"
+
+    def create_sql(self):
+        """
+        按当前数据库生成的建索引SQL, PostgreSQL使用 CONCURRENTLY 不锁表(不能在事务中执行)
+        """
+        kwargs = {"concurrently": True} if connection.vendor == "postgresql" else {}
+        return f"{self.as_index().create_sql(self.model, connection.schema_editor(), **kwargs)};"
+
+    def describe(self):
+        return f"{self.model.__name__}({', '.join(self.fields)})"
+
+
+def iter_viewsets(patterns=None):
+    """
+    遍历路由中注册的 CustomModelViewSet
+    """
+    seen = set()
+    for pattern in patterns if patterns is not None else get_resolver().url_patterns:
+        if isinstance(pattern, URLResolver):
+            for viewset in iter_viewsets(pattern.url_patterns):
+                if viewset not in seen:
+                    seen.add(viewset)
+                    yield viewset
+        elif isinstance(pattern, URLPattern):
+            viewset = getattr(pattern.callback, "cls", None)
+            if viewset is not None and issubclass(viewset, CustomModelViewSet) and viewset not in seen:
+                seen.add(viewset)
+                yield viewset
+
+
+def _concrete_field(model, name):
+    """
+    模型自身可建立索引的字段, 关联查询(a__b)及不存在的字段返回None
+    """
+    name = name.lstrip("-^=@$~")
+    if "__" in name:
+        return None
+    try:
+        model_field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+    except Exception:
+        return None
+    if not getattr(model_field, "concrete", False) or model_field.many_to_many \
+            or isinstance(model_field, UNINDEXABLE_FIELDS):
+        return None
+    return model_field
+
+
+def _is_range(model_field):
+    return isinstance(model_field, (models.DateField, models.DateTimeField, models.TimeField))
+
+
+def get_filter_fields(viewset):
+    fields = getattr(viewset, "filterset_fields", None) or getattr(viewset, "filter_fields", None)
+    if not fields or fields == "__all__":
+        return []
+    return list(fields.keys()) if isinstance(fields, dict) else list(fields)
+
+
+def get_ordering_field(viewset, model):
+    ordering = getattr(viewset, "ordering", None)
+    if not ordering and viewset.queryset is not None:
+        ordering = viewset.queryset.query.order_by
+    ordering = ordering or model._meta.ordering
+    if isinstance(ordering, str):
+        ordering = [ordering]
+    for item in ordering or []:
+        if isinstance(item, str):
+            return _concrete_field(model, item)
+    return None
+
+
+def get_existing_indexes(model):
+    """
+    数据库中已有的索引列(按顺序), 包括唯一约束及主键; 表不存在时读取模型定义
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if table in connection.introspection.table_names(cursor):
+            constraints = connection.introspection.get_constraints(cursor, table)
+            return [tuple(item["columns"]) for item in constraints.values()
+                    if item.get("columns") and (item.get("index") or item.get("unique") or item.get("primary_key"))]
+    indexes = [tuple(model._meta.get_field(name.lstrip("-")).column for name in index.fields)
+               for index in model._meta.indexes if index.fields]
+    indexes += [(f.column,) for f in model._meta.concrete_fields if f.db_index or f.unique or f.primary_key]
+    return indexes
+
+
+def is_covered(columns, existing):
+    return any(index[:len(columns)] == tuple(columns) for index in existing)
+
+
+def suggest_indexes(viewsets=None):
+    """
+    :return: [IndexSuggestion] 数据库中尚未覆盖的组合索引
+    """
+    suggestions = {}
+
+    def add(model, model_fields, reason):
+        columns = tuple(f.column for f in model_fields if f is not None)
+        if not columns or len(set(columns)) != len(columns) or columns[0] == model._meta.pk.column:
+            return
+        names = tuple(f.name for f in model_fields if f is not None)
+        suggestion = suggestions.setdefault((model, columns), IndexSuggestion(model, columns, names))
+        if reason not in suggestion.reasons:
+            suggestion.reasons.append(reason)
+
+    for viewset in viewsets if viewsets is not None else iter_viewsets():
+        if viewset.queryset is None:
+            continue
+        model = viewset.queryset.model
+        name = viewset.__name__
+        filter_fields = [f for f in (_concrete_field(model, n) for n in get_filter_fields(viewset)) if f is not None]
+        range_field = next((f for f in filter_fields if _is_range(f)), None) or get_ordering_field(viewset, model)
+        for model_field in filter_fields:
+            if model_field is range_field:
+                continue
+            add(model, [model_field, range_field], f"{name}.filter_fields")
+        extra_filters = getattr(viewset, "extra_filter_class", None) or []
+        model_fields = {f.attname: f for f in model._meta.concrete_fields}
+        if DataLevelPermissionsFilter in extra_filters and DATA_SCOPE_FIELD in model_fields:
+            add(model, [model_fields[DATA_SCOPE_FIELD], model_fields.get(DATE_RANGE_FIELD)], f"{name} 数据权限")
+        if CoreModelFilterBankend in extra_filters and DATE_RANGE_FIELD in model_fields:
+            add(model, [model_fields[DATE_RANGE_FIELD]], f"{name} 时间范围过滤")
+        for hint in getattr(viewset, "index_hints", None) or []:
+            hint_model = model
+            if "." in hint[0]:
+                hint_model, hint = apps.get_model(hint[0]), hint[1:]
+            add(hint_model, [_concrete_field(hint_model, n) for n in hint], f"{name}.index_hints")
+
+    result = []
+    for suggestion in suggestions.values():
+        if not is_covered(suggestion.columns, get_existing_indexes(suggestion.model)):
+            result.append(suggestion)
+    return sorted(result, key=lambda item: (item.model._meta.label, item.columns))
+
+
+def render_suggestions(suggestions):
+    """
+    按模型分组输出 Meta.indexes 条目及建索引SQL
+    """
+    lines = []
+    for model, items in groupby(suggestions, key=lambda item: item.model):
+        items = list(items)
+        lines.append(f"# ---------- {model._meta.label} ({model.__module__}) ----------")
+        lines.append("# Meta.indexes:")
+        for item in items:
+            lines.append(f"#   {', '.join(item.reasons)}")
+            lines.append(f"{item.render_index()},")
+        lines.append("# SQL:")
+        lines.extend(item.create_sql() for item in items)
+        lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 离线IP归属地查询
+IP段数据库为本地二进制文件, 通过mmap加载, 二分查找命中的IP段, 查询结果带LRU缓存
+文件结构:
+    文件头: magic(4s) 版本(H) 保留(H) 记录数(I) 记录区偏移(I)
+    记录区: 起始IP(I) 结束IP(I) 数据偏移(I) 数据长度(H), 按起始IP升序
+    数据区: utf-8编码, 按 IP_FIELDS 顺序以 | 分隔的字段
+可通过 python manage.py build_ip_database 将csv转换为该格式
+"""
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FILE_MAGIC = b"DVIP"
+FILE_VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+RECORD = struct.Struct("<IIIH")
+# 与 LoginLog 的地址字段保持一致
+IP_FIELDS = ("continent", "country", "province", "city", "district", "isp", "area_code",
+             "country_english", "country_code", "longitude", "latitude")
+FIELD_SEPARATOR = "|"
+LOOKUP_CACHE_SIZE = 4096
+
+
+def get_ip_database_path():
+    return getattr(settings, "IP_DATABASE_PATH", os.path.join(settings.BASE_DIR, "conf", "ip_database.dat"))
+
+
+class IpDatabase:
+    """
+    IP段数据库(只读)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, self.record_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} 不是有效的IP数据库文件")
+
+    def _record(self, index):
+        return RECORD.unpack_from(self._mmap, self.record_offset + index * RECORD.size)
+
+    def lookup(self, ip):
+        """
+        查询IPv4地址的归属地, 未命中返回None
+        """
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version != 4:
+            return None
+        value = int(address)
+        low, high = 0, self.count - 1
+        while low <= high:
+            middle = (low + high) // 2
+            start, end, offset, length = self._record(middle)
+            if value < start:
+                high = middle - 1
+            elif value > end:
+                low = middle + 1
+            else:
+                values = self._mmap[offset:offset + length].decode("utf-8").split(FIELD_SEPARATOR)
+                return dict(zip(IP_FIELDS, values))
+        return None
+
+    def close(self):
+        self._mmap.close()
+
+
+def build_ip_database(rows, path):
+    """
+    生成IP数据库文件
+    :param rows: 可迭代的 (起始IP, 结束IP, 字段字典), IP段不能重叠
+    :param path: 输出文件路径
+    :return: 记录数
+    """
+    records = []
+    for start_ip, end_ip, fields in rows:
+        start, end = int(ipaddress.IPv4Address(start_ip)), int(ipaddress.IPv4Address(end_ip))
+        if start > end:
+            start, end = end, start
+        value = FIELD_SEPARATOR.join(str(fields.get(field) or "").replace(FIELD_SEPARATOR, " ") for field in IP_FIELDS)
+        records.append((start, end, value))
+    records.sort()
+
+    record_offset = HEADER.size
+    data_offset = record_offset + RECORD.size * len(records)
+    pool, pool_index, index = bytearray(), {}, bytearray()
+    for start, end, value in records:
+        # 相同的地址信息只保存一份
+        if value not in pool_index:
+            pool_index[value] = (data_offset + len(pool), len(value.encode("utf-8")))
+            pool += value.encode("utf-8")
+        offset, length = pool_index[value]
+        index += RECORD.pack(start, end, offset, length)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(FILE_MAGIC, FILE_VERSION, 0, len(records), record_offset))
+        f.write(index)
+        f.write(pool)
+    return len(records)
+
+
+_database = {"instance": None, "loaded": False}
+_lock = threading.Lock()
+
+
+def get_ip_database():
+    """
+    获取IP数据库, 文件不存在时返回None
+    """
+    if not _database["loaded"]:
+        with _lock:
+            if not _database["loaded"]:
+                path = get_ip_database_path()
+                if path and os.path.exists(path):
+                    try:
+                        _database["instance"] = IpDatabase(path)
+                    except Exception as e:
+                        logger.error(f"IP数据库 {path} 加载失败: {e}")
+                _database["loaded"] = True
+    return _database["instance"]
+
+
+def reload_ip_database():
+    """
+    替换数据库文件后重新加载
+    """
+    with _lock:
+        if _database["instance"] is not None:
+            _database["instance"].close()
+        _database["instance"] = None
+        _database["loaded"] = False
+    lookup_ip.cache_clear()
+
+
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def lookup_ip(ip):
+    """
+    离线查询IP归属地(带缓存), 数据库不存在或未命中返回None
+    """
+    database = get_ip_database()
+    if database is None:
+        return None
+    return database.lookup(ip)
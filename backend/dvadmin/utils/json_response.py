@@ -7,6 +7,7 @@
 @Remark: 自定义的JsonResonpse文件
 """
 
+from django.utils.http import parse_etags, quote_etag
 from rest_framework.response import Response
 
 
@@ -59,3 +60,22 @@ class ErrorResponse(Response):
             "msg": msg
         }
         super().__init__(std_data, status, template_name, headers, exception, content_type)
+
+
+def conditional_response(request, etag, get_response):
+    """
+    协商缓存: 请求头 If-None-Match 与 ETag 一致时返回304(无响应体), 否则返回 get_response() 并附带ETag
+    :param request: 请求
+    :param etag: 响应内容摘要
+    :param get_response: 生成完整响应的函数
+    """
+    etag = quote_etag(etag)
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = Response(status=304)
+    else:
+        response = get_response()
+    response['ETag'] = etag
+    # 浏览器每次都需要重新验证
+    response['Cache-Control'] = 'no-cache'
+    return response
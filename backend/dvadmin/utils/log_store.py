@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 日志存储(操作日志/登录日志)
+(1)PostgreSQL下按月分区(按 create_datetime 范围分区), 查询带时间条件时只扫描相关分区
+(2)按保留天数将过期日志归档为gzip压缩的jsonl文件后从数据库删除
+(3)配置 LOG_QUERY_DEFAULT_DAYS 后日志列表默认只查询最近一段时间, 避免全表扫描
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+LOG_MODELS = ("system.OperationLog", "system.LoginLog")
+ARCHIVE_BATCH_SIZE = 2000
+
+
+def get_log_models():
+    return [apps.get_model(label) for label in LOG_MODELS]
+
+
+def get_retention_days(model):
+    """
+    日志保留天数, 未配置或为空时不清理
+    """
+    return getattr(settings, "LOG_RETENTION_DAYS", {}).get(model.__name__)
+
+
+def get_archive_dir():
+    return getattr(settings, "LOG_ARCHIVE_DIR", os.path.join(settings.BASE_DIR, "logs", "archive"))
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    return month_start(month_start(value) + timedelta(days=32))
+
+
+def iter_months(start, end):
+    """
+    遍历 [start, end] 涉及的每个月的起始时间
+    """
+    current = month_start(start)
+    while current <= end:
+        yield current
+        current = next_month(current)
+
+
+# ================================================= #
+# ***************** 按月分区(PostgreSQL) ***************** #
+# ================================================= #
+def is_postgresql():
+    return connection.vendor == "postgresql"
+
+
+def partition_name(model, month):
+    return f"{model._meta.db_table}_p{month:%Y%m}"
+
+
+def is_partitioned(model):
+    if not is_postgresql():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON pt.partrelid = c.oid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [model._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def get_partitions(model):
+    """
+    获取已有的月分区 {分区表名: 月份起始时间}
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON i.inhrelid = c.oid "
+            "JOIN pg_class p ON i.inhparent = p.oid WHERE p.relname = %s",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        suffix = name[len(table) + 2:]
+        if name.startswith(f"{table}_p") and suffix.isdigit():
+            month = datetime.strptime(suffix, "%Y%m")
+            partitions[name] = timezone.make_aware(month) if settings.USE_TZ else month
+    return partitions
+
+
+def _create_partition(cursor, model, month):
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote(partition_name(model, month))} PARTITION OF "
+        f"{quote(model._meta.db_table)} FOR VALUES FROM (%s) TO (%s)",
+        [month, next_month(month)],
+    )
+
+
+def ensure_partitions(model, months_ahead=2):
+    """
+    为当前月及之后若干个月创建分区, 需定期执行(如每天)
+    """
+    if not is_partitioned(model):
+        return []
+    now = timezone.now()
+    months = list(iter_months(now, now + timedelta(days=31 * months_ahead)))
+    with connection.cursor() as cursor:
+        for month in months:
+            _create_partition(cursor, model, month)
+    return [partition_name(model, month) for month in months]
+
+
+def convert_to_partitioned(model, months_ahead=2):
+    """
+    将普通日志表转换为按月分区表(仅PostgreSQL, 一次性操作)
+    主键变为 (id, create_datetime), 原有数据按月迁移到各分区
+    """
+    if not is_postgresql():
+        raise RuntimeError("按月分区仅支持PostgreSQL")
+    if is_partitioned(model):
+        return False
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    legacy = f"{table}_legacy"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT MIN(create_datetime), MAX(create_datetime) FROM {quote(table)}")
+        first, last = cursor.fetchone()
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY "
+            f"INCLUDING CONSTRAINTS) PARTITION BY RANGE (create_datetime)"
+        )
+        cursor.execute(f"ALTER TABLE {quote(table)} ALTER COLUMN create_datetime SET NOT NULL")
+        cursor.execute(f"UPDATE {quote(legacy)} SET create_datetime = update_datetime WHERE create_datetime IS NULL")
+        cursor.execute(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, create_datetime)")
+        cursor.execute(
+            f"CREATE INDEX {quote(table + '_create_creator')} ON {quote(table)} (create_datetime, creator_id)"
+        )
+        now = timezone.now()
+        for month in iter_months(min(first or now, now), now + timedelta(days=31 * months_ahead)):
+            _create_partition(cursor, model, month)
+        # 超出已建分区范围的数据进入默认分区
+        cursor.execute(f"CREATE TABLE {quote(table + '_pdefault')} PARTITION OF {quote(table)} DEFAULT")
+        cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(legacy)}")
+        # 自增序列: identity列需同步当前最大值, serial列需转移序列归属
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        if sequence is None:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [legacy])
+            sequence = cursor.fetchone()[0]
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.id")
+        cursor.execute(f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {quote(table)}), 0) + 1, false)",
+                       [sequence])
+        cursor.execute(f"DROP TABLE {quote(legacy)}")
+    return True
+
+
+def drop_expired_partitions(model, cutoff):
+    """
+    删除整月都已过期且已归档清空的分区
+    """
+    if not is_partitioned(model):
+        return []
+    quote = connection.ops.quote_name
+    dropped = []
+    with connection.cursor() as cursor:
+        for name, month in get_partitions(model).items():
+            if next_month(month) > cutoff:
+                continue
+            cursor.execute(f"SELECT 1 FROM {quote(name)} LIMIT 1")
+            if cursor.fetchone() is None:
+                cursor.execute(f"DROP TABLE {quote(name)}")
+                dropped.append(name)
+    return dropped
+
+
+# ================================================= #
+# ******************** 归档清理 ******************** #
+# ================================================= #
+def _archive_path(model, month):
+    directory = os.path.join(get_archive_dir(), model._meta.db_table)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{month:%Y-%m}.jsonl.gz")
+
+
+def _write_archive(model, rows):
+    groups = {}
+    for row in rows:
+        month = month_start(row["create_datetime"] or row["update_datetime"] or timezone.now())
+        groups.setdefault(month, []).append(row)
+    for month, items in groups.items():
+        # gzip追加写入会生成多段压缩流, 可直接用 gzip.open 连续读取
+        with gzip.open(_archive_path(model, month), "at", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False, default=str))
+                f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def archive_expired_logs(model, days=None, batch_size=ARCHIVE_BATCH_SIZE, dry_run=False):
+    """
+    将超过保留天数的日志写入归档文件后从数据库删除
+    :param model: 日志模型
+    :param days: 保留天数, 默认读取 LOG_RETENTION_DAYS
+    :param batch_size: 每批处理条数
+    :param dry_run: 只统计不归档
+    :return: 归档条数
+    """
+    days = days if days is not None else get_retention_days(model)
+    if not days:
+        return 0
+    cutoff = timezone.now() - timedelta(days=days)
+    queryset = model._base_manager.filter(create_datetime__lt=cutoff)
+    if dry_run:
+        return queryset.count()
+    total = 0
+    while True:
+        rows = list(queryset.order_by("create_datetime", "id").values()[:batch_size])
+        if not rows:
+            break
+        # 先写入归档文件再删除, 中途失败重新执行时最多产生重复的归档记录
+        _write_archive(model, rows)
+        model._base_manager.filter(id__in=[row["id"] for row in rows]).delete()
+        total += len(rows)
+    dropped = drop_expired_partitions(model, cutoff)
+    if dropped:
+        logger.info(f"[{model.__name__}] 删除过期分区: {', '.join(dropped)}")
+    return total
+
+
+# ================================================= #
+# ******************** 日志查询 ******************** #
+# ================================================= #
+def limit_to_recent(queryset, request):
+    """
+    请求未指定创建时间范围时, 只查询最近 LOG_QUERY_DEFAULT_DAYS 天的日志(未配置时不限制)
+    分区表上带有时间条件的查询只会扫描相关的月分区;
+    应用了默认范围时记录在 request.recent_days, 列表接口返回 recent_days 告知前端
+    """
+    days = getattr(settings, "LOG_QUERY_DEFAULT_DAYS", None)
+    if not days:
+        return queryset
+    params = request.query_params
+    if params.get("create_datetime_after") or params.get("create_datetime_before"):
+        return queryset
+    request.recent_days = days
+    return queryset.filter(create_datetime__gte=timezone.now() - timedelta(days=days))
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 后台批量日志写入
+请求线程只负责把日志放入有界队列, 由后台线程按条数或时间间隔批量写库;
+队列满时丢弃并计数, 进程退出时写完剩余日志
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+# 所有已创建的写入器, 用于统计
+WRITERS = []
+# 日志入队时记录所属的租户schema, 后台线程在对应schema下写入
+SCHEMA_KEY = "_schema_name"
+
+
+def get_schema_name():
+    """
+    当前连接的租户schema, 非租户模式返回None
+    """
+    return getattr(connection, "schema_name", None)
+
+
+def write_by_schema(items, handler):
+    """
+    按入队时的租户schema分组写入(后台线程的数据库连接不带请求的租户信息)
+    :param items: 日志字典列表, SCHEMA_KEY 为所属schema
+    :param handler: 写入函数, 参数为同一schema的日志列表
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(item.pop(SCHEMA_KEY, None), []).append(item)
+    for schema_name, group in groups.items():
+        if not schema_name:
+            handler(group)
+            continue
+        from django_tenants.utils import schema_context
+
+        with schema_context(schema_name):
+            handler(group)
+
+
+class BatchWriter:
+    """
+    后台批量写入器
+    :param name: 名称, 用于线程名及日志
+    :param handler: 批量处理函数, 参数为日志列表
+    :param batch_size: 每批最多条数
+    :param flush_interval: 最长等待秒数, 超过后即使不足一批也写入
+    :param max_queue_size: 队列上限, 超过后新日志被丢弃
+    """
+
+    def __init__(self, name, handler, batch_size=100, flush_interval=1.0, max_queue_size=10000):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+        self.written = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        atexit.register(self.stop)
+        WRITERS.append(self)
+
+    def _ensure_started(self):
+        # 多进程部署(fork)时每个进程需要单独启动线程
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+                self._thread.start()
+
+    def put(self, item):
+        """
+        放入一条日志, 队列已满时丢弃并返回False
+        """
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"[{self.name}] 日志队列已满, 累计丢弃 {self.dropped} 条")
+            return False
+
+    def _take(self, timeout):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=max(remaining, 0)) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        close_old_connections()
+        try:
+            self.handler(batch)
+            self.written += len(batch)
+        except Exception as e:
+            logger.exception(f"[{self.name}] 批量写入 {len(batch)} 条日志失败: {e}")
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                self._write(self._take(self.flush_interval))
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """
+        写入队列中剩余的全部日志
+        """
+        while True:
+            batch = self._take(0)
+            if not batch:
+                break
+            self._write(batch)
+
+    def stop(self, timeout=5):
+        """
+        停止后台线程并写完剩余日志
+        """
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 登录账号解析
+登录账号可以是 用户名/邮箱/手机号, 先按用户名精确查找, 再按格式(邮箱/手机号)查询对应的一个索引字段,
+两者分别对应不同用户时视为账号不唯一, 拒绝登录;
+账号到用户id的映射短时间缓存, 命中后按主键取用户并校验账号仍然匹配
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+LOGIN_IDENTITY_CACHE_KEY = "login_identity_{field}_{identifier}"
+LOGIN_IDENTITY_CACHE_TIMEOUT = 60 * 10
+# 请求对象上保存已解析用户的属性名, 序列化器与认证后端共用
+REQUEST_LOGIN_USERS_ATTR = "_login_users"
+
+MOBILE_REGEX = re.compile(r"^\+?\d[\d-]{5,19}$")
+
+
+def classify_identifier(identifier):
+    """
+    判断登录账号类型
+    :return: email / mobile / username
+    """
+    if "@" in identifier:
+        return "email"
+    if MOBILE_REGEX.match(identifier):
+        return "mobile"
+    return "username"
+
+
+def _cache_key(field, identifier):
+    return LOGIN_IDENTITY_CACHE_KEY.format(field=field, identifier=identifier)
+
+
+def _find_user_by_field(field, identifier):
+    """
+    与 _get_user_by_field 相同, 不存在时返回None
+    """
+    try:
+        return _get_user_by_field(field, identifier)
+    except get_user_model().DoesNotExist:
+        return None
+
+
+def _get_user_by_field(field, identifier):
+    """
+    按单个字段查询用户, 先查缓存的用户id
+    :raise: UserModel.MultipleObjectsReturned 账号对应多个用户
+    """
+    UserModel = get_user_model()
+    manager = UserModel._default_manager
+    key = _cache_key(field, identifier)
+    user_id = cache.get(key)
+    if user_id is not None:
+        user = manager.filter(pk=user_id).first()
+        # 用户被删除或账号已修改时缓存失效, 重新查询
+        if user is not None and getattr(user, field) == identifier:
+            return user
+        cache.delete(key)
+    users = list(manager.filter(**{field: identifier})[:2])
+    if len(users) > 1:
+        raise UserModel.MultipleObjectsReturned()
+    if not users:
+        raise UserModel.DoesNotExist()
+    user = users[0]
+    cache.set(key, user.pk, timeout=LOGIN_IDENTITY_CACHE_TIMEOUT)
+    return user
+
+
+def resolve_login_user(identifier, request=None):
+    """
+    根据登录账号(用户名/邮箱/手机号)获取用户
+    (1)优先按用户名精确匹配, 兼容纯数字等格式的用户名
+    (2)账号为邮箱/手机号格式时同时按对应字段查找, 与用户名匹配到不同用户时抛出 MultipleObjectsReturned
+    (3)传入request时, 同一请求内的重复解析直接复用结果
+    :raise: UserModel.DoesNotExist 账号不存在; UserModel.MultipleObjectsReturned 账号对应多个用户
+    """
+    UserModel = get_user_model()
+    users = getattr(request, REQUEST_LOGIN_USERS_ATTR, None) if request is not None else None
+    if users is not None and identifier in users:
+        return users[identifier]
+    field = classify_identifier(identifier)
+    user = _find_user_by_field(UserModel.USERNAME_FIELD, identifier)
+    if field != UserModel.USERNAME_FIELD:
+        other = _find_user_by_field(field, identifier)
+        if user is not None and other is not None and user.pk != other.pk:
+            # 如某用户的纯数字用户名与另一用户的手机号相同, 无法确定登录的是哪个账号
+            raise UserModel.MultipleObjectsReturned()
+        user = user or other
+    if user is None:
+        raise UserModel.DoesNotExist()
+    if request is not None:
+        if users is None:
+            users = {}
+            setattr(request, REQUEST_LOGIN_USERS_ATTR, users)
+        users[identifier] = users[user.get_username()] = user
+    return user
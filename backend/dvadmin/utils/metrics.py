@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 接口指标统计
+按 路由+请求方法 统计 耗时分布/SQL次数及耗时/响应大小/错误数, 以Prometheus文本格式输出;
+默认只统计当前进程, 配置 METRICS_MULTIPROC_DIR 后各进程定期将数据写入该目录, 输出时合并所有进程;
+进程退出时删除自己的文件, 异常退出(未执行atexit)的进程文件在汇总时按进程号清理
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# 耗时分布的区间上限(秒)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRIC_PREFIX = "dvadmin"
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def get_metrics_dir():
+    return getattr(settings, "METRICS_MULTIPROC_DIR", None)
+
+
+class QueryCounter:
+    """
+    通过 connection.execute_wrapper 统计SQL次数及耗时
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsRegistry:
+    """
+    进程内指标数据 {(路由, 请求方法): 指标}
+    """
+
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+        self._last_dump = 0.0
+
+    @staticmethod
+    def _new_entry():
+        return {
+            "requests": {},
+            "errors": 0,
+            "buckets": [0] * len(DURATION_BUCKETS),
+            "duration_sum": 0.0,
+            "count": 0,
+            "sql_count": 0,
+            "sql_duration": 0.0,
+            "response_bytes": 0,
+        }
+
+    def observe(self, route, method, status_code, duration, sql_count, sql_duration, response_bytes):
+        status = f"{status_code // 100}xx"
+        with self._lock:
+            entry = self.data.get((route, method))
+            if entry is None:
+                entry = self.data[(route, method)] = self._new_entry()
+            entry["requests"][status] = entry["requests"].get(status, 0) + 1
+            if status_code >= 500:
+                entry["errors"] += 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    entry["buckets"][index] += 1
+                    break
+            entry["duration_sum"] += duration
+            entry["count"] += 1
+            entry["sql_count"] += sql_count
+            entry["sql_duration"] += sql_duration
+            entry["response_bytes"] += response_bytes
+
+    def snapshot(self):
+        with self._lock:
+            return {f"{route}\t{method}": copy.deepcopy(entry) for (route, method), entry in self.data.items()}
+
+    def dump(self, force=False):
+        """
+        将当前进程的数据写入共享目录(按进程号一个文件)
+        """
+        directory = get_metrics_dir()
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_dump < getattr(settings, "METRICS_DUMP_INTERVAL", 5):
+            return
+        self._last_dump = now
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"metrics_{os.getpid()}.json")
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.warning(f"写入指标文件失败: {e}")
+
+    def remove(self):
+        """
+        删除当前进程的指标文件(进程退出时)
+        """
+        directory = get_metrics_dir()
+        if directory:
+            _remove_file(os.path.join(directory, f"metrics_{os.getpid()}.json"))
+
+
+registry = MetricsRegistry()
+atexit.register(registry.remove)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除指标文件 {path} 失败: {e}")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 进程存在但属于其他用户
+        return True
+    return True
+
+
+def _merge(target, source):
+    for key, entry in source.items():
+        current = target.get(key)
+        if current is None:
+            target[key] = entry
+            continue
+        for status, count in entry["requests"].items():
+            current["requests"][status] = current["requests"].get(status, 0) + count
+        current["buckets"] = [a + b for a, b in zip(current["buckets"], entry["buckets"])]
+        for name in ("errors", "duration_sum", "count", "sql_count", "sql_duration", "response_bytes"):
+            current[name] += entry[name]
+
+
+def collect():
+    """
+    汇总指标: 配置了共享目录时合并所有进程的数据, 否则只返回当前进程
+    """
+    directory = get_metrics_dir()
+    if not directory:
+        return registry.snapshot()
+    registry.dump(force=True)
+    data = {}
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith("metrics_") and name.endswith(".json")):
+            continue
+        pid = name[len("metrics_"):-len(".json")]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            _remove_file(os.path.join(directory, name))
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                _merge(data, json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取指标文件 {name} 失败: {e}")
+    return data
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(data=None, extra=None):
+    """
+    输出Prometheus文本格式
+    :param data: collect() 的结果
+    :param extra: 其他指标 [(名称, 类型, 说明, [(标签字典, 值)])]
+    """
+    data = collect() if data is None else data
+    items = sorted((key.split("\t", 1), entry) for key, entry in data.items())
+    metrics = [
+        ("http_requests_total", "counter", "请求总数",
+         [(dict(route=r, method=m, status=s), c) for (r, m), e in items for s, c in sorted(e["requests"].items())]),
+        ("http_request_errors_total", "counter", "服务端错误(5xx)次数",
+         [(dict(route=r, method=m), e["errors"]) for (r, m), e in items]),
+        ("db_queries_total", "counter", "SQL执行次数",
+         [(dict(route=r, method=m), e["sql_count"]) for (r, m), e in items]),
+        ("db_query_duration_seconds_total", "counter", "SQL执行总耗时(秒)",
+         [(dict(route=r, method=m), e["sql_duration"]) for (r, m), e in items]),
+        ("http_response_bytes_total", "counter", "响应内容总字节数",
+         [(dict(route=r, method=m), e["response_bytes"]) for (r, m), e in items]),
+    ] + list(extra or [])
+    lines = []
+    for name, metric_type, help_text, samples in metrics:
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{METRIC_PREFIX}_{name}{_labels(**labels)} {value}")
+    name = f"{METRIC_PREFIX}_http_request_duration_seconds"
+    lines.append(f"# HELP {name} 请求耗时(秒)")
+    lines.append(f"# TYPE {name} histogram")
+    for (route, method), entry in items:
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, entry["buckets"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(route=route, method=method, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(route=route, method=method, le='+Inf')} {entry['count']}")
+        lines.append(f"{name}_sum{_labels(route=route, method=method)} {entry['duration_sum']}")
+        lines.append(f"{name}_count{_labels(route=route, method=method)} {entry['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def get_route(request):
+    """
+    获取请求匹配的路由模板, 如 api/system/user/<pk>/, 避免以实际路径作为标签
+    """
+    resolver_match = getattr(request, "resolver_match", None)
+    if resolver_match is None:
+        return UNMATCHED_ROUTE
+    return resolver_match.route or resolver_match.view_name or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    接口指标统计中间件, METRICS_ENABLE=False 时关闭
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enable = getattr(settings, "METRICS_ENABLE", True)
+
+    def __call__(self, request):
+        if not self.enable:
+            return self.get_response(request)
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        response_bytes = 0 if getattr(response, "streaming", False) else len(response.content)
+        registry.observe(get_route(request), request.method, response.status_code, duration,
+                         counter.count, counter.duration, response_bytes)
+        registry.dump()
+        return response
@@ -10,20 +10,45 @@ from django.http import HttpResponse, HttpResponseServerError
 from django.utils.deprecation import MiddlewareMixin
 
 from dvadmin.system.models import OperationLog
-from dvadmin.utils.request_util import get_request_user, get_request_ip, get_request_data, get_request_path, get_os, \
-    get_browser, get_verbose_name
+from dvadmin.utils.log_writer import BatchWriter, SCHEMA_KEY, get_schema_name, write_by_schema
+from dvadmin.utils.search import get_search_index
+from dvadmin.utils.request_util import get_request_user, get_request_ip, get_request_data, get_request_path, \
+    get_verbose_name, parse_user_agent
+
+
+def _write_operation_logs(items):
+    def write(group):
+        logs = OperationLog.objects.bulk_create([OperationLog(**item) for item in group])
+        # bulk_create 不触发信号, 需手动同步全文索引
+        index = get_search_index(OperationLog)
+        if index is not None:
+            index.update_many(logs)
+
+    write_by_schema(items, write)
+
+
+# 操作日志由后台线程按条数或时间间隔批量写入, 队列满时丢弃并计数
+operation_log_writer = BatchWriter(
+    name='operation_log',
+    handler=_write_operation_logs,
+    batch_size=getattr(settings, 'API_LOG_BATCH_SIZE', 200),
+    flush_interval=getattr(settings, 'API_LOG_FLUSH_INTERVAL', 1.0),
+    max_queue_size=getattr(settings, 'API_LOG_QUEUE_SIZE', 10000),
+)
 
 
 class ApiLoggingMiddleware(MiddlewareMixin):
     """
     用于记录API访问日志中间件
+    (1)请求处理完成后一次性生成日志, 不再先插入再更新
+    (2)API_LOG_ASYNC=True(默认)时放入后台批量写入, 否则同步写入
     """
 
     def __init__(self, get_response=None):
         super().__init__(get_response)
         self.enable = getattr(settings, 'API_LOG_ENABLE', None) or False
         self.methods = getattr(settings, 'API_LOG_METHODS', None) or set()
-        self.operation_log_id = None
+        self.use_async = getattr(settings, 'API_LOG_ASYNC', True)
 
     @classmethod
     def __handle_request(cls, request):
@@ -33,12 +58,9 @@ class ApiLoggingMiddleware(MiddlewareMixin):
 
     def __handle_response(self, request, response):
 
-        # 判断有无log_id属性，使用All记录时，会出现此情况
-        if request.request_data.get('log_id', None) is None:
+        # 没有操作日志模块属性时不记录(非模型视图)
+        if not hasattr(request, 'operation_log_modular'):
             return
-        
-        # 移除log_id，不记录此ID
-        log_id = request.request_data.pop('log_id')
 
         # request_data,request_ip由PermissionInterfaceMiddleware中间件中添加的属性
         body = getattr(request, 'request_data', {})
@@ -54,33 +76,33 @@ class ApiLoggingMiddleware(MiddlewareMixin):
         except Exception:
             return
         user = get_request_user(request)
+        _, browser, os = parse_user_agent(request.META.get('HTTP_USER_AGENT', ''))
         info = {
+            'request_modular': request.operation_log_modular or settings.API_MODEL_MAP.get(request.request_path, None),
             'request_ip': getattr(request, 'request_ip', 'unknown'),
-            'creator': user if not isinstance(user, AnonymousUser) else None,
+            'creator_id': user.id if not isinstance(user, AnonymousUser) else None,
             'dept_belong_id': getattr(request.user, 'dept_id', None),
             'request_method': request.method,
             'request_path': request.request_path,
             'request_body': body,
             'response_code': response.data.get('code'),
-            'request_os': get_os(request),
-            'request_browser': get_browser(request),
+            'request_os': os,
+            'request_browser': browser,
             'request_msg': request.session.get('request_msg'),
             'status': True if response.data.get('code') in [2000, ] else False,
             'json_result': {"code": response.data.get('code'), "msg": response.data.get('msg')},
+            SCHEMA_KEY: get_schema_name(),
         }
-        operation_log, creat = OperationLog.objects.update_or_create(defaults=info, id=log_id)
-        if not operation_log.request_modular and settings.API_MODEL_MAP.get(request.request_path, None):
-            operation_log.request_modular = settings.API_MODEL_MAP[request.request_path]
-            operation_log.save()
+        if self.use_async:
+            operation_log_writer.put(info)
+        else:
+            _write_operation_logs([info])
 
     def process_view(self, request, view_func, view_args, view_kwargs):
         if hasattr(view_func, 'cls') and hasattr(view_func.cls, 'queryset'):
             if self.enable:
                 if self.methods == 'ALL' or request.method in self.methods:
-                    log = OperationLog(request_modular=get_verbose_name(view_func.cls.queryset))
-                    log.save()
-                    # self.operation_log_id = log.id
-                    request.request_data['log_id'] = log.id
+                    request.operation_log_modular = get_verbose_name(view_func.cls.queryset)
 
         return
 
@@ -13,6 +13,8 @@ from application import settings
 from django.apps import apps
 from django.conf import settings
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework.request import Request
 
 table_prefix = settings.TABLE_PREFIX  # 数据库表名前缀
@@ -231,23 +233,60 @@ class CoreModel(models.Model):
         return self
 
 
+def count_subquery(queryset, field, outer_field="pk"):
+    """
+    关联记录数的子查询, 代替序列化时逐行 count() (N+1):
+    Dept.objects.annotate(user_count=count_subquery(Users.objects.all(), "dept"))
+    :param field: queryset 中指向外层模型的字段
+    :param outer_field: 外层模型被关联的字段, 外键指定了 to_field 时传入该字段
+    """
+    queryset = queryset.filter(**{field: OuterRef(outer_field)}).order_by().values(field)
+    return Coalesce(Subquery(queryset.annotate(count=Count("*")).values("count")), 0,
+                    output_field=models.IntegerField())
+
+
+# 模型注册表, 应用启动(ready)时构建一次, 之后直接读取
+_model_registry = {
+    "all": None,
+    "custom": None,
+    "custom_objects": None,
+}
+
+
+def build_model_registry():
+    """
+    构建模型注册表(应用启动时调用), 反射遍历所有模型及字段只进行一次
+    """
+    all_models_objects = {}
+    for item in apps.get_models():
+        table = {"tableName": item._meta.verbose_name, "table": item.__name__, "tableFields": []}
+        for field in item._meta.fields:
+            fields = {"title": field.verbose_name, "field": field.name}
+            table['tableFields'].append(fields)
+        all_models_objects.setdefault(item.__name__, {"table": table, "object": item})
+    settings.ALL_MODELS_OBJECTS = all_models_objects
+    custom_models = _load_custom_app_models()
+    _model_registry["all"] = all_models_objects
+    _model_registry["custom"] = custom_models
+    _model_registry["custom_objects"] = {model['object'] for model in custom_models}
+    return _model_registry
+
+
+def _get_model_registry():
+    if _model_registry["all"] is None:
+        build_model_registry()
+    return _model_registry
+
+
 def get_all_models_objects(model_name=None):
     """
     获取所有 models 对象
     :return: {}
     """
-    settings.ALL_MODELS_OBJECTS = {}
-    if not settings.ALL_MODELS_OBJECTS:
-        all_models = apps.get_models()
-        for item in list(all_models):
-            table = {"tableName": item._meta.verbose_name, "table": item.__name__, "tableFields": []}
-            for field in item._meta.fields:
-                fields = {"title": field.verbose_name, "field": field.name}
-                table['tableFields'].append(fields)
-            settings.ALL_MODELS_OBJECTS.setdefault(item.__name__, {"table": table, "object": item})
+    all_models_objects = _get_model_registry()["all"]
     if model_name:
-        return settings.ALL_MODELS_OBJECTS[model_name] or {}
-    return settings.ALL_MODELS_OBJECTS or {}
+        return all_models_objects[model_name] or {}
+    return all_models_objects or {}
 
 
 def get_model_from_app(app_name):
@@ -270,12 +309,7 @@ def get_model_from_app(app_name):
     return model_list
 
 
-def get_custom_app_models(app_name=None):
-    """
-    获取所有项目下的app里的models
-    """
-    if app_name:
-        return get_model_from_app(app_name)
+def _load_custom_app_models():
     all_apps = apps.get_app_configs()
     res = []
     for app in all_apps:
@@ -291,3 +325,19 @@ def get_custom_app_models(app_name=None):
         except Exception as e:
             pass
     return res
+
+
+def get_custom_app_models(app_name=None):
+    """
+    获取所有项目下的app里的models(使用启动时构建的注册表)
+    """
+    if app_name:
+        return get_model_from_app(app_name)
+    return _get_model_registry()["custom"]
+
+
+def is_custom_app_model(model):
+    """
+    判断模型是否属于项目下的app(可配置列权限)
+    """
+    return model in _get_model_registry()["custom_objects"]
@@ -7,32 +7,108 @@
 
 @Created on: 2020/4/16 23:35
 """
+import base64
+import datetime
+import json
 from collections import OrderedDict
+from types import SimpleNamespace
 
 from django.core import paginator
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
 from django.core.paginator import Paginator as DjangoPaginator, InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from dvadmin.utils.count_strategy import get_count
+
+PAGE_MODE = "page"
+CURSOR_MODE = "cursor"
+
+
+def _cursor_value(value):
+    """
+    时间按完整精度(微秒)编码, DjangoJSONEncoder 会截断到毫秒, 同一毫秒内的行会被跳过或重复
+    """
+    if isinstance(value, (datetime.datetime, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values, reverse=False):
+    """
+    游标: 分页边界行的排序字段值, base64编码后对前端不透明; 解码后按字段的 to_python 还原
+    """
+    content = json.dumps({"v": [_cursor_value(value) for value in values], "r": int(reverse)},
+                         cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(content.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        content = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        data = json.loads(content)
+        return list(data["v"]), bool(data.get("r"))
+    except (TypeError, ValueError, KeyError):
+        raise ValidationError("无效的分页游标")
+
+
+class CountStrategyPaginator(DjangoPaginator):
+    """
+    按统计策略获取总条数的分页器, 见 dvadmin.utils.count_strategy
+    """
+
+    def __init__(self, object_list, per_page, count_strategy=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_strategy = count_strategy
+        self.count_estimated = False
+
+    @cached_property
+    def count(self):
+        count, self.count_estimated = get_count(self.object_list, self.count_strategy)
+        return count
+
 
 class CustomPagination(PageNumberPagination):
+    """
+    分页, 视图可通过 pagination_mode 选择模式:
+    (1)page(默认): 页码分页, 返回总条数
+    (2)cursor: 游标(keyset)分页, 按 (排序字段..., id) 的值定位, 不执行COUNT及OFFSET, 深分页耗时不变;
+       请求参数 cursor 为上次返回的 next/previous, 未传时按页码定位(兼容只传page的前端);
+       返回格式与页码分页一致, 另外返回 next/previous/has_more; 不统计总条数, total 为 None 且 total_estimated=True,
+       按游标翻页时无法得知页码, page 为 None
+    页码分页的总条数按视图的 count_strategy 统计(exact/cached/estimated), 为估算值时返回 total_estimated=True
+    """
     page_size = 10
     page_size_query_param = "limit"
     max_page_size = 999
-    django_paginator_class = DjangoPaginator
+    django_paginator_class = CountStrategyPaginator
+    cursor_query_param = "cursor"
+    default_cursor_ordering = ("-create_datetime", "-id")
+
+    def get_pagination_mode(self, view):
+        return getattr(view, "pagination_mode", PAGE_MODE)
 
     def paginate_queryset(self, queryset, request, view=None):
         """
         Paginate a queryset if required, either returning a
         page object, or `None` if pagination is not configured for this view.
         """
+        self.mode = self.get_pagination_mode(view)
+        if self.mode == CURSOR_MODE:
+            return self.paginate_queryset_by_cursor(queryset, request, view)
         empty = True
 
         page_size = self.get_page_size(request)
         if not page_size:
             return None
 
-        paginator = self.django_paginator_class(queryset, page_size)
+        paginator = self.django_paginator_class(queryset, page_size,
+                                                count_strategy=getattr(view, "count_strategy", None))
         page_number = request.query_params.get(self.page_query_param, 1)
         if page_number in self.last_page_strings:
             page_number = paginator.num_pages
@@ -57,27 +133,186 @@ class CustomPagination(PageNumberPagination):
 
         return list(self.page)
 
+    # ================================================= #
+    # ******************** 游标分页 ******************** #
+    # ================================================= #
+    def get_cursor_ordering(self, queryset):
+        """
+        游标分页的排序: 使用查询集当前的排序(视图ordering/排序参数/模型Meta.ordering),
+        只支持模型自身的字段, 否则按 default_cursor_ordering; 最后追加主键保证顺序唯一
+        :return: [(字段, 是否倒序)]
+        """
+        model = queryset.model
+        ordering = queryset.query.order_by or model._meta.ordering
+        fields = self._parse_ordering(model, ordering)
+        if fields is None:
+            fields = self._parse_ordering(model, self.default_cursor_ordering) or []
+        pk_name = model._meta.pk.name
+        if not any(field.name == pk_name for field, _ in fields):
+            fields.append((model._meta.pk, fields[-1][1] if fields else True))
+        return fields
+
+    @staticmethod
+    def _parse_ordering(model, ordering):
+        fields = []
+        for item in ordering:
+            if not isinstance(item, str) or "__" in item or item.lstrip("-") == "?":
+                return None
+            name = item.lstrip("-")
+            try:
+                field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.many_to_many:
+                return None
+            fields.append((field, item.startswith("-")))
+        return fields
+
+    @staticmethod
+    def _row_value(row, field):
+        if isinstance(row, dict):
+            return row.get(field.name, row.get(field.attname))
+        return getattr(row, field.attname)
+
+    @staticmethod
+    def _after(field, descending, value):
+        """
+        排序在 value 之后的条件; 空值在PostgreSQL中视为最大, 在MySQL/SQLite中视为最小
+        """
+        nulls_after = (connection.vendor in ("postgresql", "oracle")) != descending
+        if value is None:
+            return Q(pk__in=[]) if nulls_after else Q(**{f"{field.attname}__isnull": False})
+        condition = Q(**{f"{field.attname}__{'lt' if descending else 'gt'}": value})
+        if field.null and nulls_after:
+            condition |= Q(**{f"{field.attname}__isnull": True})
+        return condition
+
+    def _keyset_filter(self, ordering, values):
+        """
+        (a, b, id) 在游标之后: a>va or (a=va and b>vb) or (a=va and b=vb and id>vid)
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), raw in zip(ordering, values):
+            try:
+                value = None if raw is None else field.to_python(raw)
+            except (DjangoValidationError, TypeError, ValueError):
+                raise ValidationError("无效的分页游标")
+            condition |= equal & self._after(field, descending, value)
+            equal &= Q(**{f"{field.attname}__isnull": True}) if value is None else Q(**{field.attname: value})
+        return condition
+
+    def paginate_queryset_by_cursor(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        ordering = self.get_cursor_ordering(queryset)
+        cursor = request.query_params.get(self.cursor_query_param)
+        reverse = False
+        offset = 0
+        if cursor:
+            values, reverse = decode_cursor(cursor)
+            if len(values) != len(ordering):
+                raise ValidationError("分页游标与排序不匹配")
+            # 向前翻页时反向排序查询, 结果再倒回来
+            query_ordering = [(field, descending != reverse) for field, descending in ordering]
+            queryset = queryset.filter(self._keyset_filter(query_ordering, values))
+        else:
+            query_ordering = ordering
+            try:
+                offset = (max(int(request.query_params.get(self.page_query_param, 1)), 1) - 1) * page_size
+            except ValueError:
+                offset = 0
+        queryset = queryset.order_by(*[f"{'-' if descending else ''}{field.name}" for field, descending in query_ordering])
+        rows = list(queryset[offset:offset + page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, bool(cursor) or offset > 0
+        self.offset = offset
+        self.cursor = cursor
+        self.next_cursor = self._make_cursor(rows[-1], ordering) if rows and self.has_next else None
+        self.previous_cursor = self._make_cursor(rows[0], ordering, reverse=True) \
+            if rows and self.has_previous else None
+        self.page = rows
+        return rows
+
+    def _make_cursor(self, row, ordering, reverse=False):
+        return encode_cursor([self._row_value(row, field) for field, _ in ordering], reverse)
+
+    def get_page_info(self, count):
+        """
+        分页信息(不含数据)
+        :param count: 当前页条数
+        """
+        limit = int(self.get_page_size(self.request)) or 10
+        if getattr(self, "mode", PAGE_MODE) == CURSOR_MODE:
+            return OrderedDict([
+                ('page', None if self.cursor else self.offset // limit + 1),
+                ('limit', limit),
+                ('total', None),
+                ('total_estimated', True),
+                ('is_next', self.has_next),
+                ('is_previous', self.has_previous),
+                ('has_more', self.has_next),
+                ('next', self.next_cursor),
+                ('previous', self.previous_cursor),
+            ])
+        info = OrderedDict([
+            ('page', int(self.get_page_number(self.request, paginator)) or 1),
+            ('limit', limit),
+            ('total', self.page.paginator.count if self.page else 0),
+            ('is_next', self.page.has_next() if self.page else False),
+            ('is_previous', self.page.has_previous() if self.page else False),
+        ])
+        if self.page and self.page.paginator.count_estimated:
+            info['total_estimated'] = True
+        return info
+
     def get_paginated_response(self, data):
         code = 2000
         msg = 'success'
-        page = int(self.get_page_number(self.request, paginator)) or 1
-        total = self.page.paginator.count if self.page else 0
-        limit = int(self.get_page_size(self.request)) or 10
-        is_next = self.page.has_next() if self.page else False
-        is_previous = self.page.has_previous() if self.page else False
-
         if not data:
             code = 2000
             msg = "暂无数据"
             data = []
-
         return Response(OrderedDict([
             ('code', code),
             ('msg', msg),
-            ('page', page),
-            ('limit', limit),
-            ('total', total),
-            ('is_next', is_next),
-            ('is_previous', is_previous),
+            *self.get_page_info(len(data)).items(),
+            *self.get_extra_info().items(),
             ('data', data)
         ]))
+
+    def get_extra_info(self):
+        """
+        查询条件之外的默认限制, 如日志列表默认只查询最近 recent_days 天(dvadmin.utils.log_store.limit_to_recent)
+        """
+        info = OrderedDict()
+        recent_days = getattr(self.request, "recent_days", None)
+        if recent_days:
+            info['recent_days'] = recent_days
+        return info
+
+
+def paginate(request, queryset, mode=PAGE_MODE, count_strategy=None, page_size=None, max_page_size=None):
+    """
+    @action/APIView 中使用的分页, 参数与列表接口一致(page/limit/cursor)
+    :param mode: page 页码分页 / cursor 游标分页
+    :param count_strategy: 页码分页的总条数统计策略
+    :param page_size: 未传limit时的每页条数
+    :param max_page_size: 每页条数上限, 超过时按上限返回
+    :return: (当前页数据, 分页信息 {page, limit, total, is_next, is_previous, ...})
+    """
+    pagination = CustomPagination()
+    if page_size:
+        pagination.page_size = page_size
+    if max_page_size:
+        pagination.max_page_size = max_page_size
+    view = SimpleNamespace(pagination_mode=mode, count_strategy=count_strategy)
+    rows = pagination.paginate_queryset(queryset, request, view)
+    return rows, pagination.get_page_info(len(rows))
@@ -9,10 +9,10 @@
 import re
 
 from django.contrib.auth.models import AnonymousUser
-from django.db.models import F
 from rest_framework.permissions import BasePermission
 
-from dvadmin.system.models import ApiWhiteList, RoleMenuButtonPermission
+from dvadmin.utils.authentication import get_auth_context
+from dvadmin.utils.permission_cache import has_api_permission
 
 
 def ValidationApi(reqApi, validApi):
@@ -65,11 +65,8 @@ class AdminPermission(BasePermission):
     def has_permission(self, request, view):
         if isinstance(request.user, AnonymousUser):
             return False
-        # 判断是否是超级管理员
-        is_superuser = request.user.is_superuser
-        # 判断是否是管理员角色
-        is_admin = request.user.role.values_list('admin', flat=True)
-        if is_superuser or True in is_admin:
+        # 判断是否是超级管理员或管理员角色
+        if get_auth_context(request).is_admin:
             return True
 
 
@@ -97,32 +94,8 @@ class CustomPermission(BasePermission):
         # 判断是否是超级管理员
         if request.user.is_superuser:
             return True
-        else:
-            api = request.path  # 当前请求接口
-            method = request.method  # 当前请求方法
-            methodList = ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH']
-            method = methodList.index(method)
-            # ***接口白名单***
-            api_white_list = ApiWhiteList.objects.values(permission__api=F('url'), permission__method=F('method'))
-            api_white_list = [
-                str(item.get('permission__api').replace('{id}', '([a-zA-Z0-9-]+)')) + ":" + str(
-                    item.get('permission__method')) + '$' for item in api_white_list if item.get('permission__api')]
-            # ********#
-            if not hasattr(request.user, "role"):
-                return False
-            role_id_list = request.user.role.values_list('id', flat=True)
-            userApiList = RoleMenuButtonPermission.objects.filter(role__in=role_id_list).values(
-                permission__api=F('menu_button__api'), permission__method=F('menu_button__method'))  # 获取当前用户的角色拥有的所有接口
-            ApiList = [
-                str(item.get('permission__api').replace('{id}', '([a-zA-Z0-9-]+)')) + ":" + str(
-                    item.get('permission__method')) + '$' for item in userApiList if item.get('permission__api')]
-            new_api_ist = api_white_list + ApiList
-            new_api = api + ":" + str(method)
-            for item in new_api_ist:
-                matchObj = re.match(item, new_api, re.M | re.I)
-                if matchObj is None:
-                    continue
-                else:
-                    return True
-            else:
-                return False
+        if not hasattr(request.user, "role"):
+            return False
+        # 接口白名单与角色接口权限均来自按角色集合缓存的权限矩阵
+        role_id_list = get_auth_context(request).role_ids
+        return has_api_permission(role_id_list, request.path, request.method)
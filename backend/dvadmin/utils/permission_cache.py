@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 接口权限矩阵缓存
+按角色集合缓存预编译的接口白名单、接口权限及数据权限范围, 通过版本号在多进程间失效;
+版本号保存在缓存中, 只有缓存在多进程间共享(redis等)时才启用, 进程内的数据另有过期时间 PERMISSION_LOCAL_CACHE_TTL
+"""
+import logging
+import re
+import threading
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from dvadmin.utils.cache_backend import is_shared_cache
+
+logger = logging.getLogger(__name__)
+
+PERMISSION_VERSION_KEY = "permission_matrix_version"
+USER_ROLE_CACHE_KEY = "permission_user_roles_{version}_{user_id}"
+USER_ROLE_CACHE_TIMEOUT = 60 * 5
+# 与 MenuButton.METHOD_CHOICES/ApiWhiteList.METHOD_CHOICES 的下标保持一致
+METHOD_LIST = ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH']
+# 进程内每类缓存最多保存的条目数量
+MAX_CACHE_ENTRIES = 1024
+
+_REGEX_META = set('.^$*+?{}[]\\|()')
+
+
+class ApiMatcher:
+    """
+    预编译的接口匹配器
+    (1)不含正则字符的接口直接按 (方法, 路径) 哈希查找
+    (2)含 {id} 等动态部分的接口按方法分组, 先比较静态前缀再做正则匹配
+    """
+
+    def __init__(self, rules):
+        self.static = {}
+        self.dynamic = {}
+        for api, method in rules:
+            self.add(api, method)
+
+    def add(self, api, method):
+        if not api or method is None:
+            return
+        api = api.replace('{id}', '([a-zA-Z0-9-]+)')
+        meta_index = next((index for index, char in enumerate(api) if char in _REGEX_META), None)
+        if meta_index is None:
+            self.static.setdefault(method, set()).add(api.lower())
+            return
+        try:
+            pattern = re.compile(api + '$', re.M | re.I)
+        except re.error as e:
+            logger.warning(f"接口权限规则 {api} 不是合法的正则表达式: {e}")
+            return
+        self.dynamic.setdefault(method, []).append((api[:meta_index].lower(), pattern))
+
+    def match(self, path, method):
+        lower_path = path.lower()
+        if lower_path in self.static.get(method, ()):
+            return True
+        for prefix, pattern in self.dynamic.get(method, ()):
+            if lower_path.startswith(prefix) and pattern.match(path):
+                return True
+        return False
+
+
+_local = {
+    "version": None,
+    "loaded": 0,
+    "white_list": None,
+    "data_white_list": None,
+    "roles": {},
+    "data_scopes": {},
+    "field_permissions": {},
+}
+_lock = threading.Lock()
+
+
+def permission_cache_enabled():
+    """
+    PERMISSION_CACHE_ENABLE 为 None 时按缓存后端自动判断: 进程内缓存(LocMemCache)无法在多个worker间失效, 不启用
+    单进程部署可设置为 True 强制启用
+    """
+    enabled = getattr(settings, "PERMISSION_CACHE_ENABLE", None)
+    return is_shared_cache() if enabled is None else bool(enabled)
+
+
+def check_permission_cache():
+    """
+    启动时检查, 未启用时记录原因
+    """
+    if getattr(settings, "PERMISSION_CACHE_ENABLE", None) is None and not is_shared_cache():
+        logger.warning("未配置共享缓存(CACHES), 权限缓存在多进程间无法失效, 已关闭权限缓存, 每次请求查询数据库; "
+                       "单进程部署可设置 PERMISSION_CACHE_ENABLE = True")
+
+
+def get_permission_version():
+    """
+    获取当前权限矩阵版本号, 多个进程共用缓存中的同一个版本号
+    """
+    version = cache.get(PERMISSION_VERSION_KEY)
+    if version is None:
+        cache.add(PERMISSION_VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(PERMISSION_VERSION_KEY)
+    return version
+
+
+def refresh_permission_version():
+    """
+    接口白名单/按钮/角色权限发生变化时调用, 使所有进程的权限矩阵失效
+    """
+    cache.set(PERMISSION_VERSION_KEY, uuid4().hex, timeout=None)
+
+
+def _get_local_cache():
+    version = get_permission_version()
+    now = time.monotonic()
+    ttl = getattr(settings, "PERMISSION_LOCAL_CACHE_TTL", 60)
+    if _local["version"] != version or now - _local["loaded"] > ttl:
+        with _lock:
+            if _local["version"] != version or now - _local["loaded"] > ttl:
+                _local["white_list"] = None
+                _local["data_white_list"] = None
+                _local["roles"] = {}
+                _local["data_scopes"] = {}
+                _local["field_permissions"] = {}
+                _local["version"] = version
+                _local["loaded"] = now
+    return _local
+
+
+def _get_or_build(bucket, key, builder):
+    local = _get_local_cache()
+    value = local[bucket].get(key)
+    if value is None:
+        value = builder()
+        with _lock:
+            if len(local[bucket]) >= MAX_CACHE_ENTRIES:
+                local[bucket].clear()
+            local[bucket][key] = value
+    return value
+
+
+def _build_white_list_matcher(**filters):
+    from dvadmin.system.models import ApiWhiteList
+
+    return ApiMatcher(ApiWhiteList.objects.filter(**filters).values_list('url', 'method'))
+
+
+def _build_role_matcher(role_ids):
+    from dvadmin.system.models import RoleMenuButtonPermission
+
+    return ApiMatcher(
+        RoleMenuButtonPermission.objects.filter(role__in=role_ids).values_list('menu_button__api', 'menu_button__method')
+    )
+
+
+def get_white_list_matcher():
+    """
+    获取接口白名单匹配器
+    """
+    if not permission_cache_enabled():
+        return _build_white_list_matcher()
+    local = _get_local_cache()
+    matcher = local["white_list"]
+    if matcher is None:
+        matcher = local["white_list"] = _build_white_list_matcher()
+    return matcher
+
+
+def get_data_white_list_matcher():
+    """
+    获取不校验数据权限的接口白名单匹配器
+    """
+    if not permission_cache_enabled():
+        return _build_white_list_matcher(enable_datasource=False)
+    local = _get_local_cache()
+    matcher = local["data_white_list"]
+    if matcher is None:
+        matcher = local["data_white_list"] = _build_white_list_matcher(enable_datasource=False)
+    return matcher
+
+
+def get_role_matcher(role_ids):
+    """
+    获取角色集合的接口权限匹配器
+    :param role_ids: 角色id列表
+    """
+    key = frozenset(role_ids)
+    if not permission_cache_enabled():
+        return _build_role_matcher(list(key))
+    return _get_or_build("roles", key, lambda: _build_role_matcher(list(key)))
+
+
+def get_data_scope(role_ids, api, method, dept_id, builder):
+    """
+    获取已解析的数据权限范围
+    :param role_ids: 角色id列表
+    :param api: 规范化后的接口地址
+    :param method: 请求方法下标
+    :param dept_id: 用户所属部门id
+    :param builder: 缓存未命中时的解析函数
+    """
+    if not permission_cache_enabled():
+        return builder()
+    key = (frozenset(role_ids), api, method, dept_id)
+    return _get_or_build("data_scopes", key, builder)
+
+
+def _build_field_permissions(role_ids, model_name):
+    from dvadmin.system.models import FieldPermission
+
+    queryset = FieldPermission.objects.filter(field__model=model_name)
+    if role_ids is not None:
+        queryset = queryset.filter(is_query=True, role__in=role_ids)
+    return list(queryset.values_list('field__field_name', flat=True))
+
+
+def get_field_permissions(role_ids, model_name):
+    """
+    获取角色集合在某个模型上可查询的字段(列权限)
+    :param role_ids: 角色id列表, None表示不按角色过滤
+    :param model_name: 模型类名
+    """
+    key = (None if role_ids is None else frozenset(role_ids), model_name)
+    if not permission_cache_enabled():
+        return _build_field_permissions(None if key[0] is None else list(key[0]), model_name)
+    return _get_or_build("field_permissions", key, lambda: _build_field_permissions(
+        None if key[0] is None else list(key[0]), model_name))
+
+
+def get_user_roles(user):
+    """
+    获取用户的角色id及权限字符(缓存)
+    :return: {"ids": 角色id列表, "keys": 角色权限字符列表}
+    """
+    if not permission_cache_enabled():
+        return _build_user_roles(user)
+    key = USER_ROLE_CACHE_KEY.format(version=get_permission_version(), user_id=user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = _build_user_roles(user)
+        cache.set(key, roles, timeout=USER_ROLE_CACHE_TIMEOUT)
+    return roles
+
+
+def _build_user_roles(user):
+    role_list = sorted(user.role.values_list('id', 'key'))
+    return {"ids": [role_id for role_id, _ in role_list], "keys": [role_key for _, role_key in role_list]}
+
+
+def get_user_role_ids(user):
+    """
+    获取用户的角色id列表(缓存)
+    """
+    return get_user_roles(user)["ids"]
+
+
+def clear_user_role_ids(*user_ids):
+    """
+    用户与角色关系变更时清除对应缓存
+    """
+    version = get_permission_version()
+    cache.delete_many([USER_ROLE_CACHE_KEY.format(version=version, user_id=user_id) for user_id in user_ids])
+
+
+def get_method_index(method):
+    """
+    将请求方法转为数据库中存储的下标, 不支持的方法返回None
+    """
+    try:
+        return METHOD_LIST.index(method)
+    except ValueError:
+        return None
+
+
+def has_api_permission(role_ids, path, method):
+    """
+    判断角色集合是否拥有接口权限(含接口白名单)
+    :param role_ids: 角色id列表
+    :param path: 请求路径
+    :param method: 请求方法, 如 GET
+    """
+    method = get_method_index(method)
+    if method is None:
+        return False
+    if get_white_list_matcher().match(path, method):
+        return True
+    if not role_ids:
+        return False
+    return get_role_matcher(role_ids).match(path, method)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 只读投影
+大数据量的只读列表/导出直接用 values_list() 查询并生成字典, 不创建模型实例, 也不经过序列化器逐字段转换:
+    values_projection = Projection({
+        "id": "id",
+        "merchant_name": "merchant__name",           # 关联字段
+        "status_label": ChoiceLabel("status"),        # 选项的显示名称
+        "creator_name": Coalesce("creator__name", Value("")),   # 任意表达式
+        "create_datetime": "create_datetime",
+    })
+时间格式与 CustomModelSerializer 一致("%Y-%m-%d %H:%M:%S"), Decimal 与DRF默认一致输出字符串
+"""
+import datetime
+import decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Case, CharField, Value, When
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.query import ValuesListIterable
+from django.utils.functional import cached_property
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_FORMAT = "%Y-%m-%d"
+
+
+class ChoiceLabel:
+    """
+    选项字段(choices)的显示名称, 生成 CASE WHEN 表达式, 未匹配的值返回 default
+    :param field_path: 字段路径, 支持关联字段 merchant__status
+    """
+
+    def __init__(self, field_path, default=""):
+        self.field_path = field_path
+        self.default = default
+
+    def resolve(self, model):
+        model_field = get_model_field(model, self.field_path)
+        if model_field is None or not model_field.choices:
+            raise ValueError(f"{model.__name__}.{self.field_path} 不是选项字段")
+        whens = [When(**{self.field_path: value}, then=Value(str(label))) for value, label in model_field.flatchoices]
+        return Case(*whens, default=Value(self.default), output_field=CharField())
+
+
+def get_model_field(model, path):
+    """
+    按字段路径(a__b__c)查找模型字段, 不存在时返回None
+    """
+    model_field = None
+    for name in path.split(LOOKUP_SEP):
+        if model is None:
+            return None
+        try:
+            model_field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        model = model_field.related_model
+    return model_field
+
+
+def format_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, datetime.date):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+class Projection:
+    """
+    :param mapping: {输出字段: 字段路径 | 表达式 | ChoiceLabel}
+    """
+
+    def __init__(self, mapping):
+        self.mapping = dict(mapping)
+
+    def get_expressions(self, model):
+        expressions = []
+        for source in self.mapping.values():
+            # 字段路径直接查询对应的列, 表达式作为注解查询
+            expressions.append(source.resolve(model) if isinstance(source, ChoiceLabel) else source)
+        return expressions
+
+    @cached_property
+    def iterable_class(self):
+        """
+        values_list 的元组按输出字段转为字典
+        """
+        keys = list(self.mapping.keys())
+
+        def __iter__(self):
+            for row in ValuesListIterable.__iter__(self):
+                yield dict(zip(keys, row))
+
+        return type("ProjectionIterable", (ValuesListIterable,), {"__iter__": __iter__})
+
+    def apply(self, queryset):
+        """
+        :return: 逐行产生字典(原始值)的查询集, 仍可继续分页/切片/count
+        """
+        # values_list 不使用预取, 视图中声明的 prefetch_related 需要去掉
+        queryset = queryset.prefetch_related(None).values_list(*self.get_expressions(queryset.model))
+        queryset._iterable_class = self.iterable_class
+        return queryset
+
+    def get_formatters(self, model):
+        """
+        需要格式化的输出字段, 字段路径按模型字段类型判断, 表达式逐个值判断
+        """
+        formatters = []
+        for key, source in self.mapping.items():
+            if isinstance(source, ChoiceLabel):
+                continue
+            if isinstance(source, str):
+                model_field = get_model_field(model, source)
+                internal_type = model_field.get_internal_type() if model_field is not None else None
+                if internal_type not in ("DateTimeField", "DateField", "DecimalField"):
+                    continue
+            formatters.append(key)
+        return formatters
+
+    def format(self, rows, model):
+        """
+        转换时间/Decimal为与序列化器一致的输出格式(原地修改)
+        """
+        formatters = self.get_formatters(model)
+        if formatters:
+            for row in rows:
+                for key in formatters:
+                    row[key] = format_value(row[key])
+        return rows
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: SQL查询检查(开发/测试使用)
+(1)按请求记录SQL, 去掉参数后的语句相同而参数不同并重复多次的视为N+1查询
+(2)视图可声明查询次数上限 max_queries, 超出时记录错误, 严格模式(测试)下直接抛出异常
+使用方式:
+    中间件: 配置 QUERY_INSPECTOR_ENABLE=True 后 QueryInspectorMiddleware 生效
+    测试: with assert_max_queries(5): ... / with assert_no_n_plus_one(): ...
+"""
+import logging
+import os
+import re
+import time
+import traceback
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# 同一语句重复达到该次数视为N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_RE = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.I)
+_SPACE_RE = re.compile(r"\s+")
+_PROJECT_DIR = str(settings.BASE_DIR)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    查询次数超过视图声明的 max_queries
+    """
+
+
+class NPlusOneDetected(AssertionError):
+    """
+    检测到N+1查询
+    """
+
+
+def fingerprint(sql):
+    """
+    SQL指纹: 去掉字面量及参数个数差异, 只保留语句结构
+    """
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_RE.sub("IN (...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def _caller():
+    """
+    发起查询的项目代码位置(跳过django及第三方库)
+    """
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        filename = frame.filename
+        if filename.startswith(_PROJECT_DIR) and f"{os.sep}site-packages{os.sep}" not in filename \
+                and not filename.endswith("query_inspector.py"):
+            return f"{os.path.relpath(filename, _PROJECT_DIR)}:{frame.lineno} {frame.name}"
+    return ""
+
+
+class QueryInspector:
+    """
+    通过 connection.execute_wrapper 记录SQL
+    """
+
+    def __init__(self, capture_caller=True):
+        self.capture_caller = capture_caller
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            key = fingerprint(sql)
+            statement = self.statements.get(key)
+            if statement is None:
+                statement = self.statements[key] = {
+                    "sql": sql,
+                    "count": 0,
+                    "params": set(),
+                    "duration": 0.0,
+                    "caller": _caller() if self.capture_caller else "",
+                }
+            statement["count"] += 1
+            statement["duration"] += duration
+            statement["params"].add(repr(params))
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """
+        获取疑似N+1的语句: 结构相同, 参数不同, 重复次数达到阈值
+        """
+        return [
+            {"sql": statement["sql"], "count": statement["count"], "duration": statement["duration"],
+             "caller": statement["caller"]}
+            for statement in sorted(self.statements.values(), key=lambda item: -item["count"])
+            if statement["count"] >= threshold and len(statement["params"]) > 1
+        ]
+
+    def report(self, threshold=N_PLUS_ONE_THRESHOLD):
+        lines = [f"共执行 {self.count} 条SQL, 耗时 {self.duration * 1000:.1f}ms"]
+        for item in self.repeated(threshold):
+            lines.append(f"  重复 {item['count']} 次 [{item['caller']}]: {item['sql'][:300]}")
+        return "\n".join(lines)
+
+
+def get_query_budget(view_func, method):
+    """
+    获取视图声明的查询次数上限
+    max_queries = 10 或按action声明 max_queries = {"list": 10, "retrieve": 5}
+    """
+    view_class = getattr(view_func, "cls", None)
+    budget = getattr(view_class, "max_queries", None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, "actions", None) or {}
+        return budget.get(actions.get(method.lower(), method.lower()))
+    return budget
+
+
+class QueryInspectorMiddleware:
+    """
+    开发/测试环境的SQL检查中间件, QUERY_INSPECTOR_ENABLE=True 时启用
+    (1)检测到N+1查询时输出警告
+    (2)超出视图 max_queries 时输出错误, QUERY_INSPECTOR_STRICT=True 时抛出异常(测试中直接失败)
+    (3)响应头 X-Query-Count 返回本次请求的SQL次数
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_INSPECTOR_ENABLE", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.strict = getattr(settings, "QUERY_INSPECTOR_STRICT", False)
+        self.threshold = getattr(settings, "QUERY_INSPECTOR_THRESHOLD", N_PLUS_ONE_THRESHOLD)
+
+    def __call__(self, request):
+        inspector = QueryInspector()
+        with connection.execute_wrapper(inspector):
+            response = self.get_response(request)
+        response["X-Query-Count"] = str(inspector.count)
+        repeated = inspector.repeated(self.threshold)
+        if repeated:
+            logger.warning(f"[N+1] {request.method} {request.path}\n{inspector.report(self.threshold)}")
+            if self.strict:
+                raise NPlusOneDetected(f"{request.method} {request.path} 存在N+1查询\n{inspector.report(self.threshold)}")
+        resolver_match = getattr(request, "resolver_match", None)
+        budget = get_query_budget(resolver_match.func, request.method) if resolver_match else None
+        if budget is not None and inspector.count > budget:
+            message = f"{request.method} {request.path} 执行了 {inspector.count} 条SQL, 超出上限 {budget}"
+            logger.error(f"{message}\n{inspector.report(self.threshold)}")
+            if self.strict:
+                raise QueryBudgetExceeded(f"{message}\n{inspector.report(self.threshold)}")
+        return response
+
+
+# ================================================= #
+# ******************** 测试辅助 ******************** #
+# ================================================= #
+@contextmanager
+def assert_max_queries(max_queries, using=None):
+    """
+    断言代码块内执行的SQL不超过 max_queries 条
+    """
+    from django.db import connections
+
+    inspector = QueryInspector()
+    with connections[using or "default"].execute_wrapper(inspector):
+        yield inspector
+    if inspector.count > max_queries:
+        raise QueryBudgetExceeded(f"执行了 {inspector.count} 条SQL, 超出上限 {max_queries}\n{inspector.report()}")
+
+
+@contextmanager
+def assert_no_n_plus_one(threshold=N_PLUS_ONE_THRESHOLD, using=None):
+    """
+    断言代码块内没有N+1查询
+    """
+    from django.db import connections
+
+    inspector = QueryInspector()
+    with connections[using or "default"].execute_wrapper(inspector):
+        yield inspector
+    if inspector.repeated(threshold):
+        raise NPlusOneDetected(f"存在N+1查询\n{inspector.report(threshold)}")
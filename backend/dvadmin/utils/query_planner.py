@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 查询计划
+根据序列化器字段的 source 路径(如 source="merchant.name"、SlugRelatedField(source="creator")、嵌套序列化器)
+自动为视图查询集加上 select_related/prefetch_related, 避免序列化时逐行查询关联对象(N+1);
+请求带有 restql 查询(?query={id,name})时只分析选中的字段, 并用 only()/defer() 只查询用到的列;
+序列化器重写了 to_representation 时可能读取任意字段, 不限制查询的列, 除非在 Meta.query_plan_fields 中声明读取的字段;
+每个序列化器类(及字段选择)只分析一次, 结果缓存复用
+"""
+import logging
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.query import ModelIterable
+from django_restql.parser import Query
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField, RelatedField
+
+logger = logging.getLogger(__name__)
+
+# 最多跟随的关联层数
+MAX_DEPTH = 3
+
+# 缓存的查询计划数上限, restql 字段选择由客户端决定, 避免无限增长
+MAX_CACHED_PLANS = 1000
+
+# {(序列化器类, 字段选择): QueryPlan}
+_plans = {}
+
+# 这些模块中的 to_representation 只读取序列化器字段
+BASE_SERIALIZER_MODULES = ("rest_framework.", "django_restql.", "dvadmin.utils.serializers")
+
+
+def overrides_to_representation(serializer_class):
+    """
+    序列化器(及项目中的父类)是否重写了 to_representation
+    """
+    for klass in serializer_class.__mro__:
+        if klass.__module__.startswith(BASE_SERIALIZER_MODULES):
+            return False
+        if "to_representation" in klass.__dict__:
+            return True
+    return False
+
+
+class QueryPlan:
+    """
+    :param select_related: 需要连表查询的一对一/多对一路径
+    :param prefetch_related: 需要预取的一对多/多对多路径
+    :param only: 只查询的字段, 存在无法分析的字段(如SerializerMethodField)时为None
+    :param defer: 未选择的普通字段, 未使用 only() 时延迟加载; 存在无法分析的字段时为空,
+                  避免序列化时访问被延迟的字段而逐行查询(N+1)
+    """
+
+    def __init__(self, select_related=(), prefetch_related=(), only=None, defer=()):
+        self.select_related = tuple(sorted(select_related))
+        self.prefetch_related = tuple(sorted(prefetch_related))
+        self.only = tuple(sorted(only)) if only is not None else None
+        self.defer = tuple(sorted(defer))
+
+    def apply(self, queryset, exclude=(), use_only=False):
+        """
+        :param exclude: 不自动处理的关联路径(及其下级路径)
+        :param use_only: 是否同时用 only() 限制查询的字段
+        """
+        def allowed(path):
+            return not any(path == item or path.startswith(f"{item}__") for item in exclude)
+
+        # 视图中已声明的预取(如 Prefetch 对象)保持不变
+        existing = {getattr(lookup, "prefetch_to", lookup) for lookup in queryset._prefetch_related_lookups}
+        select_related = [path for path in self.select_related if allowed(path)]
+        prefetch_related = [path for path in self.prefetch_related if allowed(path) and path not in existing]
+        use_only = use_only and self.only is not None and not exclude
+        if use_only:
+            # 视图中声明的其他连表查询用不到, 且与 only() 同时使用时会报错
+            queryset = queryset.select_related(None)
+        if select_related and queryset.query.select_related is not True:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if use_only:
+            queryset = queryset.only(*self.only, *self.get_ordering_fields(queryset))
+        elif self.defer:
+            ordering = self.get_ordering_fields(queryset)
+            defer = [path for path in self.defer if allowed(path) and path not in ordering]
+            if defer:
+                queryset = queryset.defer(*defer)
+        return queryset
+
+    @staticmethod
+    def get_ordering_fields(queryset):
+        """
+        排序字段一并查询, 游标分页需要读取最后一行的排序值
+        """
+        opts = queryset.model._meta
+        fields = []
+        for item in queryset.query.order_by or opts.ordering:
+            if not isinstance(item, str):
+                continue
+            name = item.lstrip("-")
+            try:
+                model_field = opts.pk if name == "pk" else opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete:
+                fields.append(model_field.name)
+        return fields
+
+    def __repr__(self):
+        return f"<QueryPlan select_related={self.select_related} prefetch_related={self.prefetch_related}>"
+
+
+class _Planner:
+    def __init__(self):
+        self.select_related = set()
+        self.prefetch_related = set()
+        self.only = set()
+        self.defer = set()
+        self.complete = True
+
+    @staticmethod
+    def _get_relation(model, name):
+        """
+        按属性名查找模型字段, 反向关联按访问名(related_name 或 xxx_set)查找
+        """
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            for related in model._meta.related_objects:
+                if related.get_accessor_name() == name:
+                    return related
+        return None
+
+    def walk(self, model, source_attrs, prefix="", many=False, depth=0, pk_only=False):
+        """
+        沿 source 路径记录需要的关联
+        :param pk_only: 最后一级关联只使用主键(PrimaryKeyRelatedField), 不需要查询关联对象
+        :return: (最终模型, 路径, 是否经过多对多/一对多) 路径中有非模型字段时返回 None
+        """
+        for index, attr in enumerate(source_attrs):
+            field = self._get_relation(model, attr)
+            if field is None:
+                # 属性/方法, 可能访问任意字段
+                self.complete = False
+                return None
+            last = index == len(source_attrs) - 1
+            if not field.is_relation:
+                if not many:
+                    self.only.add(f"{prefix}__{field.name}" if prefix else field.name)
+                return (model, prefix, many) if last else None
+            name = field.get_accessor_name() if field.auto_created and not field.concrete else field.name
+            path = f"{prefix}__{name}" if prefix else name
+            if last and pk_only and field.concrete and not field.many_to_many:
+                if not many:
+                    self.only.add(path)
+                return model, prefix, many
+            if depth + index >= MAX_DEPTH:
+                self.complete = False
+                return None
+            if field.concrete and not field.many_to_many and not many:
+                # 外键列本身需要查询
+                self.only.add(path)
+            # 一对多/多对多及 GenericForeignKey 只能预取; 预取路径下的字段在单独的查询中, 不参与 only()
+            if not (field.concrete or field.auto_created):
+                self.complete = False
+            many = many or field.many_to_many or field.one_to_many or not (field.concrete or field.auto_created)
+            (self.prefetch_related if many else self.select_related).add(path)
+            model, prefix = field.related_model, path
+        return model, prefix, many
+
+    def visit_serializer(self, serializer, model, prefix="", many=False, depth=0, selection=None):
+        include, exclude, nested = selection or (None, frozenset(), ())
+        nested = dict(nested)
+        if overrides_to_representation(type(serializer)):
+            fields = getattr(getattr(serializer, "Meta", None), "query_plan_fields", None)
+            if fields is None:
+                self.complete = False
+            elif not many:
+                self.only.update(f"{prefix}__{name}" if prefix else name for name in fields)
+        for field_name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if (include is not None and field_name not in include) or field_name in exclude:
+                self.visit_unselected(field, model, prefix, many)
+                continue
+            self.visit_field(field, model, prefix, many, depth, nested.get(field_name))
+
+    def visit_unselected(self, field, model, prefix, many):
+        """
+        未选择的字段: 模型自身的普通字段可延迟加载
+        """
+        if many or isinstance(field, (serializers.BaseSerializer, RelatedField, ManyRelatedField)) \
+                or field.source == "*" or len(field.source_attrs) != 1:
+            return
+        model_field = self._get_relation(model, field.source_attrs[0])
+        if model_field is not None and model_field.concrete and not model_field.is_relation \
+                and not model_field.primary_key:
+            self.defer.add(f"{prefix}__{model_field.name}" if prefix else model_field.name)
+
+    def visit_field(self, field, model, prefix, many, depth, selection=None):
+        if isinstance(field, serializers.SerializerMethodField):
+            self.complete = False
+            return
+        if field.source == "*":
+            if isinstance(field, serializers.BaseSerializer):
+                self.visit_serializer(field, model, prefix, many, depth, selection)
+            else:
+                self.complete = False
+            return
+        source_attrs = field.source_attrs
+        if isinstance(field, serializers.ListSerializer):
+            result = self.walk(model, source_attrs, prefix, many, depth)
+            if result:
+                self.visit_nested(field.child, result, depth + len(source_attrs), True, selection)
+            return
+        if isinstance(field, serializers.BaseSerializer):
+            result = self.walk(model, source_attrs, prefix, many, depth)
+            if result:
+                self.visit_nested(field, result, depth + len(source_attrs), False, selection)
+            return
+        if isinstance(field, ManyRelatedField):
+            self.walk(model, source_attrs, prefix, many, depth)
+            return
+        if isinstance(field, RelatedField):
+            pk_only = isinstance(field, PrimaryKeyRelatedField) and field.use_pk_only_optimization()
+            self.walk(model, source_attrs, prefix, many, depth, pk_only=pk_only)
+            return
+        self.walk(model, source_attrs, prefix, many, depth)
+
+    def visit_nested(self, serializer, result, depth, many=False, selection=None):
+        model, prefix, walked_many = result
+        nested_model = getattr(getattr(serializer, "Meta", None), "model", None)
+        if nested_model is None:
+            self.complete = False
+            return
+        self.visit_serializer(serializer, nested_model, prefix, many or walked_many, depth, selection)
+
+
+def get_restql_selection(query):
+    """
+    restql 解析结果转为可缓存的字段选择 (选择的字段, 排除的字段, ((嵌套字段, 下级选择), ...)),
+    选择的字段为 None 表示全部字段(未使用查询或使用了 * 及 -字段)
+    """
+    if query is None:
+        return None
+    include = set()
+    nested = {}
+    for field in query.included_fields:
+        if isinstance(field, Query):
+            include.add(field.field_name)
+            nested[field.field_name] = get_restql_selection(field)
+        else:
+            include.add(field)
+    if "*" in include or query.excluded_fields:
+        include = None
+    return (
+        frozenset(include) if include is not None else None,
+        frozenset(query.excluded_fields),
+        tuple(sorted(nested.items(), key=lambda item: item[0])),
+    )
+
+
+def build_query_plan(serializer_class, selection=None):
+    """
+    分析序列化器需要的关联查询
+    :param selection: 只分析部分字段(get_restql_selection), None表示全部
+    """
+    model = getattr(getattr(serializer_class, "Meta", None), "model", None)
+    if model is None:
+        return QueryPlan()
+    planner = _Planner()
+    try:
+        planner.visit_serializer(serializer_class(), model, selection=selection)
+    except Exception as e:
+        logger.warning(f"分析序列化器 {serializer_class.__name__} 的查询计划失败: {e}")
+        return QueryPlan()
+    if not planner.complete:
+        # SerializerMethodField/属性等可能访问任意字段, 不限制查询的列
+        return QueryPlan(planner.select_related, planner.prefetch_related)
+    only = planner.only | {model._meta.pk.name}
+    # 未选择但 to_representation 会读取的字段(query_plan_fields)不延迟加载
+    return QueryPlan(planner.select_related, planner.prefetch_related, only, planner.defer - planner.only)
+
+
+def get_query_plan(serializer_class, selection=None):
+    key = (serializer_class, selection)
+    plan = _plans.get(key)
+    if plan is None:
+        if len(_plans) >= MAX_CACHED_PLANS:
+            _plans.clear()
+        plan = _plans[key] = build_query_plan(serializer_class, selection)
+    return plan
+
+
+def apply_query_plan(queryset, serializer_class, selection=None, exclude=(), use_only=False):
+    """
+    按序列化器为查询集加上关联查询, values()等非模型实例的查询集不处理
+    """
+    if getattr(queryset, "_iterable_class", None) is not ModelIterable:
+        return queryset
+    if not issubclass(queryset.model, getattr(getattr(serializer_class, "Meta", None), "model", object)):
+        return queryset
+    return get_query_plan(serializer_class, selection).apply(queryset, exclude, use_only)
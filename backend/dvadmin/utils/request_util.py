@@ -2,22 +2,30 @@
 Request工具类
 """
 import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
 
 import requests
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser
 from django.contrib.auth.models import AnonymousUser
 from django.urls.resolvers import ResolverMatch
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from user_agents import parse
 
 from dvadmin.system.models import LoginLog
+from dvadmin.utils.authentication import CustomJWTAuthentication
+from dvadmin.utils.ip_location import lookup_ip
+from dvadmin.utils.log_writer import BatchWriter, SCHEMA_KEY, get_schema_name, write_by_schema
+
+logger = logging.getLogger(__name__)
 
 
 def get_request_user(request):
     """
     获取请求user
-    (1)如果request里的user没有认证,那么则手动认证一次
+    (1)如果request里的user没有认证,那么则手动认证一次(解析结果会被DRF认证复用)
     :param request:
     :return:
     """
@@ -25,7 +33,7 @@ def get_request_user(request):
     if user and user.is_authenticated:
         return user
     try:
-        user, tokrn = JWTAuthentication().authenticate(request)
+        user, tokrn = CustomJWTAuthentication().authenticate(request)
     except Exception as e:
         pass
     return user or AnonymousUser()
@@ -120,6 +128,17 @@ def get_request_canonical_path(request, ):
     return path
 
 
+@lru_cache(maxsize=1024)
+def parse_user_agent(ua_string):
+    """
+    解析User-Agent(带缓存), 同一浏览器的请求只解析一次
+    :param ua_string: User-Agent字符串
+    :return: (完整描述, 浏览器, 操作系统)
+    """
+    user_agent = parse(ua_string or '')
+    return str(user_agent), user_agent.get_browser(), user_agent.get_os()
+
+
 def get_browser(request, ):
     """
     获取浏览器名
@@ -128,9 +147,7 @@ def get_browser(request, ):
     :param kwargs:
     :return:
     """
-    ua_string = request.META['HTTP_USER_AGENT']
-    user_agent = parse(ua_string)
-    return user_agent.get_browser()
+    return parse_user_agent(request.META.get('HTTP_USER_AGENT', ''))[1]
 
 
 def get_os(request, ):
@@ -141,9 +158,7 @@ def get_os(request, ):
     :param kwargs:
     :return:
     """
-    ua_string = request.META['HTTP_USER_AGENT']
-    user_agent = parse(ua_string)
-    return user_agent.get_os()
+    return parse_user_agent(request.META.get('HTTP_USER_AGENT', ''))[2]
 
 
 def get_verbose_name(queryset=None, view=None, model=None):
@@ -169,51 +184,121 @@ def get_verbose_name(queryset=None, view=None, model=None):
     return model if model else ""
 
 
-def get_ip_analysis(ip):
+IP_ANALYSIS_FIELDS = ("continent", "country", "province", "city", "district", "isp", "area_code",
+                      "country_english", "country_code", "longitude", "latitude")
+# 在线接口单次超时及一批登录日志等待在线解析的总时间(秒)
+IP_ANALYSIS_TIMEOUT = 5
+# 同时进行的在线解析上限, 超过后不再调用在线接口
+IP_ANALYSIS_MAX_PENDING = 32
+
+_ip_analysis_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ip-analysis")
+_ip_analysis_slots = threading.BoundedSemaphore(IP_ANALYSIS_MAX_PENDING)
+
+
+def _online_analysis_enabled():
+    return getattr(settings, 'ENABLE_LOGIN_ANALYSIS_LOG', True) and not getattr(settings, 'IP_ANALYSIS_OFFLINE', False)
+
+
+def _get_online_ip_analysis(ip):
+    """
+    调用在线接口获取ip详细概略, 失败返回None
+    """
+    try:
+        res = requests.get(url='https://ip.django-vue-admin.com/ip/analysis', params={"ip": ip},
+                           timeout=IP_ANALYSIS_TIMEOUT)
+        if res.status_code == 200:
+            res_data = res.json()
+            if res_data.get('code') == 0:
+                return res_data.get('data')
+    except Exception as e:
+        logger.warning(f"获取ip详细概略失败: {e}")
+    return None
+
+
+def get_ip_analysis(ip, online=True):
     """
     获取ip详细概略
+    (1)优先查询本地离线IP数据库(IP_DATABASE_PATH)
+    (2)离线数据库不存在时, 若开启了 ENABLE_LOGIN_ANALYSIS_LOG 且 online=True 则调用在线接口
     :param ip: ip地址
     :return:
     """
-    data = {
-        "continent": "",
-        "country": "",
-        "province": "",
-        "city": "",
-        "district": "",
-        "isp": "",
-        "area_code": "",
-        "country_english": "",
-        "country_code": "",
-        "longitude": "",
-        "latitude": ""
-    }
+    data = dict.fromkeys(IP_ANALYSIS_FIELDS, "")
     if ip != 'unknown' and ip:
-        if getattr(settings, 'ENABLE_LOGIN_ANALYSIS_LOG', True):
-            try:
-                res = requests.get(url='https://ip.django-vue-admin.com/ip/analysis', params={"ip": ip}, timeout=5)
-                if res.status_code == 200:
-                    res_data = res.json()
-                    if res_data.get('code') == 0:
-                        data = res_data.get('data')
-                return data
-            except Exception as e:
-                print(e)
+        offline_data = lookup_ip(ip)
+        if offline_data is not None:
+            data.update(offline_data)
+            return data
+        if online and _online_analysis_enabled():
+            return _get_online_ip_analysis(ip) or data
     return data
 
 
+def _release_ip_analysis_slot(future):
+    _ip_analysis_slots.release()
+
+
+def resolve_ip_analysis(ips):
+    """
+    批量获取ip详细概略: 离线数据库直接查询; 需要在线查询的ip并发请求, 整批最多等待 IP_ANALYSIS_TIMEOUT 秒,
+    超时或超过并发上限的ip不再等待(地址为空), 单个慢请求不会阻塞日志写入
+    :return: {ip: 概略}
+    """
+    result, futures = {}, {}
+    for ip in set(ips):
+        result[ip] = get_ip_analysis(ip, online=False)
+        if not ip or ip == 'unknown' or lookup_ip(ip) is not None or not _online_analysis_enabled():
+            continue
+        if not _ip_analysis_slots.acquire(blocking=False):
+            continue
+        future = _ip_analysis_executor.submit(_get_online_ip_analysis, ip)
+        future.add_done_callback(_release_ip_analysis_slot)
+        futures[future] = ip
+    if futures:
+        done, _ = wait(futures, timeout=IP_ANALYSIS_TIMEOUT)
+        for future in done:
+            data = future.result()
+            if data:
+                result[futures[future]] = data
+    return result
+
+
+def _write_login_logs(items):
+    def write(group):
+        analysis = resolve_ip_analysis(item['ip'] for item in group)
+        LoginLog.objects.bulk_create([LoginLog(**{**analysis[item['ip']], **item}) for item in group])
+
+    write_by_schema(items, write)
+
+
+login_log_writer = BatchWriter(
+    name='login_log',
+    handler=_write_login_logs,
+    batch_size=getattr(settings, 'LOGIN_LOG_BATCH_SIZE', 50),
+    flush_interval=getattr(settings, 'LOGIN_LOG_FLUSH_INTERVAL', 1.0),
+    max_queue_size=getattr(settings, 'LOGIN_LOG_QUEUE_SIZE', 10000),
+)
+
+
 def save_login_log(request):
     """
     保存登录日志
+    请求内只收集请求信息, IP归属地解析及入库由后台线程完成(LOGIN_LOG_ASYNC=False 时同步写入)
     :return:
     """
     ip = get_request_ip(request=request)
-    analysis_data = get_ip_analysis(ip)
-    analysis_data['username'] = request.user.username
-    analysis_data['ip'] = ip
-    analysis_data['agent'] = str(parse(request.META['HTTP_USER_AGENT']))
-    analysis_data['browser'] = get_browser(request)
-    analysis_data['os'] = get_os(request)
-    analysis_data['creator_id'] = request.user.id
-    analysis_data['dept_belong_id'] = getattr(request.user, 'dept_id', '')
-    LoginLog.objects.create(**analysis_data)
+    agent, browser, os = parse_user_agent(request.META.get('HTTP_USER_AGENT', ''))
+    item = {
+        'username': request.user.username,
+        'ip': ip,
+        'agent': agent,
+        'browser': browser,
+        'os': os,
+        'creator_id': request.user.id,
+        'dept_belong_id': getattr(request.user, 'dept_id', ''),
+        SCHEMA_KEY: get_schema_name(),
+    }
+    if getattr(settings, 'LOGIN_LOG_ASYNC', True):
+        login_log_writer.put(item)
+    else:
+        _write_login_logs([item])
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 全文搜索
+视图设置 search_backend = "fulltext" 后, search 参数对 SEARCH_INDEXES 中配置的字段使用索引搜索并按相关度排序:
+(1)PostgreSQL: pg_trgm 三元组GIN索引(支持中文及任意位置的模糊匹配), 按 word_similarity 排序
+(2)SQLite: FTS5 虚拟表(trigram分词), 由信号同步数据, 按 bm25 排序
+(3)其他数据库或未建立索引时与 DRF SearchFilter 一致(icontains)
+索引通过 python manage.py build_search_index 创建/重建
+"""
+import logging
+import operator
+import sqlite3
+import time
+from functools import reduce
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+FULLTEXT_BACKEND = "fulltext"
+RANK_FIELD = "search_rank"
+# SQLite trigram 分词至少需要3个字符, 更短的关键字按 icontains 匹配
+MIN_TRIGRAM_LENGTH = 3
+# 索引(SQLite FTS5 表/PostgreSQL pg_trgm 扩展)不存在时重新检查的间隔(秒), 其他进程执行 build_search_index 后无需重启即可生效
+INDEX_RECHECK_INTERVAL = 60
+
+# {模型: SearchIndex}
+search_indexes = {}
+
+# PostgreSQL pg_trgm 扩展是否已安装(数据库级别, 所有模型共用)
+_pg_trgm = {"ready": False, "checked": 0}
+
+
+def pg_trgm_ready():
+    """
+    PostgreSQL 是否已安装 pg_trgm 扩展(由 build_search_index 创建), 未安装时不按相关度排序;
+    已安装后不再检查, 未安装时每隔 INDEX_RECHECK_INTERVAL 秒重新检查
+    """
+    if connection.vendor != "postgresql":
+        return False
+    if not _pg_trgm["ready"] and time.monotonic() - _pg_trgm["checked"] >= INDEX_RECHECK_INTERVAL:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _pg_trgm["ready"] = cursor.fetchone() is not None
+        _pg_trgm["checked"] = time.monotonic()
+    return _pg_trgm["ready"]
+
+
+class SearchIndex:
+    """
+    单个模型的全文索引
+    :param model: 模型
+    :param fields: 建立索引的文本字段
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = list(fields)
+        self.table = model._meta.db_table
+        self.columns = [model._meta.get_field(name).column for name in self.fields]
+        self.fts_table = f"{self.table}_fts"
+        self._sqlite_ready = None
+        self._sqlite_checked = 0
+
+    # ================================================= #
+    # ******************** 索引维护 ******************** #
+    # ================================================= #
+    def sqlite_ready(self):
+        """
+        SQLite FTS5 表是否可用, 可用后不再检查, 不可用时每隔 INDEX_RECHECK_INTERVAL 秒重新检查
+        """
+        if connection.vendor != "sqlite":
+            return False
+        if not self._sqlite_ready and time.monotonic() - self._sqlite_checked >= INDEX_RECHECK_INTERVAL:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.fts_table])
+                self._sqlite_ready = cursor.fetchone() is not None
+            self._sqlite_checked = time.monotonic()
+        return bool(self._sqlite_ready)
+
+    def build(self, rebuild=False):
+        """
+        创建索引, rebuild=True 时重新写入全部数据(SQLite)
+        """
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                for column in self.columns:
+                    # 与 icontains 生成的 UPPER(col::text) LIKE UPPER(%s) 保持一致, 查询才能使用索引
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS {quote(f'{self.table}_{column}_trgm')} ON {quote(self.table)} "
+                        f"USING gin (UPPER({quote(column)}::text) gin_trgm_ops)"
+                    )
+                _pg_trgm["ready"] = True
+                return True
+            if connection.vendor != "sqlite" or sqlite3.sqlite_version_info < (3, 34):
+                logger.warning(f"[{self.model.__name__}] 当前数据库不支持全文索引, 搜索使用 icontains")
+                return False
+            exists = self.sqlite_ready()
+            if exists and not rebuild:
+                return True
+            columns = ", ".join(quote(column) for column in self.columns)
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {quote(self.fts_table)} USING fts5({columns}, tokenize='trigram')"
+            )
+            cursor.execute(f"DELETE FROM {quote(self.fts_table)}")
+            cursor.execute(
+                f"INSERT INTO {quote(self.fts_table)} (rowid, {columns}) "
+                f"SELECT {quote(self.model._meta.pk.column)}, {columns} FROM {quote(self.table)}"
+            )
+        self._sqlite_ready = True
+        return True
+
+    def update(self, instance):
+        self.update_many([instance])
+
+    def update_many(self, instances):
+        """
+        同步数据到SQLite FTS5表, bulk_create 等不触发信号的写入可直接调用
+        """
+        instances = [instance for instance in instances if instance.pk is not None]
+        if not instances or not self.sqlite_ready():
+            return
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(column) for column in self.columns)
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {quote(self.fts_table)} WHERE rowid = %s",
+                               [[instance.pk] for instance in instances])
+            cursor.executemany(
+                f"INSERT INTO {quote(self.fts_table)} (rowid, {columns}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(self.columns))})",
+                [[instance.pk, *[getattr(instance, column) for column in self.columns]] for instance in instances],
+            )
+
+    def delete(self, pk):
+        if not self.sqlite_ready():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(self.fts_table)} WHERE rowid = %s", [pk])
+
+    # ================================================= #
+    # ******************** 搜索 ******************** #
+    # ================================================= #
+    def _fts_match(self, terms):
+        columns = " ".join(self.columns)
+        phrases = " AND ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        return f"{{{columns}}} : ({phrases})"
+
+    def _fts_subquery(self, terms):
+        return RawSQL(
+            f"SELECT rowid FROM {connection.ops.quote_name(self.fts_table)} "
+            f"WHERE {connection.ops.quote_name(self.fts_table)} MATCH %s",
+            [self._fts_match(terms)],
+        )
+
+    def search(self, queryset, terms, extra_fields=(), rank_ordering=True):
+        """
+        按关键字搜索并标注相关度 search_rank(越大越相关)
+        :param terms: 关键字列表, 多个关键字同时匹配
+        :param extra_fields: 未建立索引的搜索字段(如关联字段), 按 icontains 匹配
+        :param rank_ordering: 是否按相关度排序, 否则只搜索保持原有排序
+        """
+        use_fts = self.sqlite_ready()
+        conditions = []
+        for term in terms:
+            extra = [Q(**{f"{field}__icontains": term}) for field in extra_fields]
+            if use_fts and len(term) >= MIN_TRIGRAM_LENGTH:
+                indexed = [Q(pk__in=self._fts_subquery([term]))]
+            else:
+                indexed = [Q(**{f"{field}__icontains": term}) for field in self.fields]
+            conditions.append(reduce(operator.or_, indexed + extra))
+        queryset = queryset.filter(reduce(operator.and_, conditions))
+        if not rank_ordering:
+            return queryset
+        rank = self.rank_expression(terms, use_fts)
+        if rank is None:
+            return queryset
+        ordering = queryset.query.order_by or self.model._meta.ordering
+        return queryset.annotate(**{RANK_FIELD: rank}).order_by(f"-{RANK_FIELD}", *ordering)
+
+    def rank_expression(self, terms, use_fts):
+        if connection.vendor == "postgresql":
+            # 未安装 pg_trgm 时 word_similarity 函数不存在, 只按 icontains 搜索
+            if not pg_trgm_ready():
+                return None
+            from django.contrib.postgres.search import TrigramWordSimilarity
+
+            scores = [TrigramWordSimilarity(term, field) for term in terms for field in self.fields]
+            score = scores[0] if len(scores) == 1 else Greatest(*scores)
+            return Coalesce(score, Value(0.0), output_field=FloatField())
+        long_terms = [term for term in terms if len(term) >= MIN_TRIGRAM_LENGTH]
+        if use_fts and long_terms:
+            quote = connection.ops.quote_name
+            # bm25 越小越相关, 取负值后与PostgreSQL一致按降序排列
+            rank = RawSQL(
+                f"SELECT -rank FROM {quote(self.fts_table)} WHERE {quote(self.fts_table)} MATCH %s "
+                f"AND rowid = {quote(self.table)}.{quote(self.model._meta.pk.column)}",
+                [self._fts_match(long_terms)],
+                output_field=FloatField(),
+            )
+            return Coalesce(rank, Value(0.0), output_field=FloatField())
+        return None
+
+
+def register_search_indexes():
+    """
+    按 SEARCH_INDEXES 注册全文索引, 并连接SQLite同步数据的信号
+    SEARCH_INDEXES = {"app_label.Model": ["字段", ...]}
+    """
+    for label, fields in getattr(settings, "SEARCH_INDEXES", {}).items():
+        try:
+            model = apps.get_model(label)
+        except (LookupError, ValueError):
+            logger.info(f"全文索引模型 {label} 未安装, 跳过")
+            continue
+        search_indexes[model] = SearchIndex(model, fields)
+        post_save.connect(_update_index, sender=model, dispatch_uid=f"search_index_save_{label}")
+        post_delete.connect(_delete_index, sender=model, dispatch_uid=f"search_index_delete_{label}")
+
+
+def _update_index(sender, instance, **kwargs):
+    try:
+        search_indexes[sender].update(instance)
+    except DatabaseError as e:
+        logger.warning(f"[{sender.__name__}] 更新全文索引失败: {e}")
+
+
+def _delete_index(sender, instance, **kwargs):
+    try:
+        search_indexes[sender].delete(instance.pk)
+    except DatabaseError as e:
+        logger.warning(f"[{sender.__name__}] 删除全文索引失败: {e}")
+
+
+def get_search_index(model):
+    return search_indexes.get(model)
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    视图 search_backend = "fulltext" 且模型配置了全文索引时使用索引搜索并按相关度排序, 否则与 SearchFilter 一致;
+    请求指定了排序(ordering参数)或视图使用游标分页时只搜索, 不按相关度排序
+    """
+
+    @staticmethod
+    def use_rank_ordering(request, view):
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return False
+        return getattr(view, "pagination_mode", None) != "cursor"
+
+    def filter_queryset(self, request, queryset, view):
+        index = get_search_index(queryset.model)
+        if getattr(view, "search_backend", None) != FULLTEXT_BACKEND or index is None:
+            return super().filter_queryset(request, queryset, view)
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms:
+            return queryset
+        extra_fields = [str(field).lstrip("^=@$") for field in search_fields if field not in index.fields]
+        queryset = index.search(queryset, search_terms, extra_fields, self.use_rank_ordering(request, view))
+        if self.must_call_distinct(queryset, extra_fields):
+            queryset = queryset.distinct()
+        return queryset
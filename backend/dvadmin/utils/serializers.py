@@ -10,6 +10,7 @@ from rest_framework import serializers
 from rest_framework.fields import empty
 from rest_framework.request import Request
 from rest_framework.serializers import ModelSerializer
+from django.db.models import QuerySet
 from django.utils.functional import cached_property
 from rest_framework.utils.serializer_helpers import BindingDict
 
@@ -30,6 +31,9 @@ class CustomModelSerializer(DynamicFieldsMixin, ModelSerializer):
     def get_modifier_name(self, instance):
         if not hasattr(instance, "modifier"):
             return None
+        names = self.get_modifier_names()
+        if names is not None:
+            return names.get(str(instance.modifier))
         queryset = (
             Users.objects.filter(id=instance.modifier)
             .values_list("name", flat=True)
@@ -39,6 +43,28 @@ class CustomModelSerializer(DynamicFieldsMixin, ModelSerializer):
             return queryset
         return None
 
+    def get_modifier_names(self):
+        """
+        列表序列化时一次查询当前页全部修改人的姓名 {修改人id: 姓名}, 非列表时返回None
+        """
+        parent = self.parent
+        if not isinstance(parent, serializers.ListSerializer):
+            return None
+        names = getattr(parent, "_modifier_names", None)
+        if names is None:
+            rows = parent.instance
+            if isinstance(rows, QuerySet) and rows._result_cache is not None:
+                rows = rows._result_cache
+            if not isinstance(rows, (list, tuple)):
+                return None
+            ids = {str(getattr(row, "modifier", None)) for row in rows}
+            names = {
+                str(pk): name
+                for pk, name in Users.objects.filter(id__in=[pk for pk in ids if pk.isdigit()]).values_list("id", "name")
+            }
+            parent._modifier_names = names
+        return names
+
     # 创建人的审计字段名称, 默认creator, 继承使用时可自定义覆盖
     creator_field_id = "creator"
     creator_name = serializers.SlugRelatedField(
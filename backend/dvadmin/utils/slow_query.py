@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 慢查询记录
+通过 connection.execute_wrapper 记录超过 SLOW_QUERY_THRESHOLD_MS 的SQL(规范化语句/路由/耗时),
+执行计划(EXPLAIN)由后台线程获取, 不占用请求时间; 记录保存在进程内的环形缓冲区中
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, connections
+
+from dvadmin.utils.log_writer import BatchWriter
+from dvadmin.utils.metrics import get_route
+from dvadmin.utils.query_inspector import fingerprint
+
+logger = logging.getLogger(__name__)
+
+_records = deque(maxlen=getattr(settings, "SLOW_QUERY_BUFFER_SIZE", 200))
+_lock = threading.Lock()
+_sequence = {"value": 0}
+
+
+def get_threshold():
+    return getattr(settings, "SLOW_QUERY_THRESHOLD_MS", 500) / 1000
+
+
+def _explain_sql(vendor, sql, analyze=False):
+    if vendor in ("postgresql", "mysql"):
+        return f"EXPLAIN {'ANALYZE ' if analyze else ''}{sql}"
+    if vendor == "sqlite":
+        return f"EXPLAIN QUERY PLAN {sql}"
+    return None
+
+
+def explain(sql, params, using="default", analyze=False, schema_name=None):
+    """
+    获取SQL的执行计划, 只处理SELECT语句
+    :param analyze: 是否实际执行(EXPLAIN ANALYZE), 仅PostgreSQL/MySQL8支持
+    :param schema_name: 租户模式下语句所属的schema
+    """
+    if not sql.lstrip().upper().startswith("SELECT"):
+        return ""
+    db = connections[using]
+    explain_sql = _explain_sql(db.vendor, sql, analyze)
+    if explain_sql is None:
+        return ""
+    if schema_name:
+        from django_tenants.utils import schema_context
+
+        with schema_context(schema_name):
+            return _fetch_plan(db, explain_sql, params)
+    return _fetch_plan(db, explain_sql, params)
+
+
+def _fetch_plan(db, explain_sql, params):
+    with db.cursor() as cursor:
+        cursor.execute(explain_sql, params)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def _explain_records(records):
+    analyze = getattr(settings, "SLOW_QUERY_EXPLAIN_ANALYZE", False)
+    for record in records:
+        # 执行计划在锁外获取, 记录(与 get_slow_queries 共享)只在锁内修改
+        try:
+            plan = explain(record["_sql"], record["_params"], record["using"], analyze, record["schema_name"])
+        except Exception as e:
+            plan = f"获取执行计划失败: {e}"
+        with _lock:
+            record.pop("_sql", None)
+            record.pop("_params", None)
+            record["plan"] = plan
+
+
+explain_writer = BatchWriter(name="slow_query_explain", handler=_explain_records, batch_size=20,
+                             flush_interval=1.0, max_queue_size=1000)
+
+
+def record_slow_query(sql, params, duration, route="", using="default"):
+    """
+    记录一条慢查询
+    """
+    use_explain = getattr(settings, "SLOW_QUERY_EXPLAIN", True)
+    with _lock:
+        _sequence["value"] += 1
+        record = {
+            "id": _sequence["value"],
+            "sql": fingerprint(sql),
+            "route": route,
+            "duration_ms": round(duration * 1000, 2),
+            "using": using,
+            "schema_name": getattr(getattr(connections[using], "tenant", None), "schema_name", None),
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "plan": None,
+        }
+        if use_explain:
+            record.update({"_sql": sql, "_params": params})
+        _records.append(record)
+    logger.warning(f"[慢查询] {record['duration_ms']}ms {route} {record['sql'][:500]}")
+    if use_explain:
+        explain_writer.put(record)
+    return record
+
+
+def get_slow_queries():
+    """
+    获取当前进程记录的慢查询, 按时间倒序
+    """
+    with _lock:
+        # 在锁内复制, 后台线程写入执行计划时不影响遍历
+        records = [{key: value for key, value in record.items() if not key.startswith("_")} for record in _records]
+    return records[::-1]
+
+
+def clear_slow_queries():
+    with _lock:
+        _records.clear()
+
+
+class SlowQueryRecorder:
+    """
+    execute_wrapper: 记录超过阈值的SQL
+    """
+
+    def __init__(self, request=None, threshold=None, using="default"):
+        self.request = request
+        self.threshold = get_threshold() if threshold is None else threshold
+        self.using = using
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold and not many:
+                route = ""
+                if self.request is not None:
+                    route = f"{self.request.method} {get_route(self.request)}"
+                record_slow_query(sql, params, duration, route, self.using)
+
+
+class SlowQueryMiddleware:
+    """
+    慢查询记录中间件, SLOW_QUERY_ENABLE=False 时关闭
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SLOW_QUERY_ENABLE", True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with connection.execute_wrapper(SlowQueryRecorder(request)):
+            return self.get_response(request)
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+"""
+@Remark: 树形结构索引(闭包表)
+为部门、菜单、地区、字典等树形模型维护 祖先/后代/层级 关系,
+节点新增、移动、删除时通过信号增量维护, 任意子树或祖先链均可一次查询得到
+"""
+import logging
+import threading
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Q
+from django.db.models.signals import post_save, post_delete
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+
+TREE_REGISTRY = {}
+_ready = set()
+_lock = threading.Lock()
+
+
+class TreeConfig:
+    """
+    树形模型配置
+    :param model: 模型类
+    :param parent_field: 指向父级的外键字段名
+    """
+
+    def __init__(self, model, parent_field="parent"):
+        self.model = model
+        self.label = model._meta.label
+        self.parent_field = model._meta.get_field(parent_field)
+        # 外键不是指向主键时(如 Area.pcode 指向 code), 需要转换为父级主键
+        self.to_field = self.parent_field.target_field.attname
+        if self.to_field == model._meta.pk.attname:
+            self.to_field = None
+
+    @property
+    def manager(self):
+        return self.model._base_manager
+
+    def get_parent_pk(self, instance):
+        value = getattr(instance, self.parent_field.attname)
+        if value is None or self.to_field is None:
+            return value
+        return self.manager.filter(**{self.to_field: value}).values_list("pk", flat=True).first()
+
+    def get_edges(self):
+        """
+        获取所有 (节点, 父节点) 关系, 仅一次查询
+        """
+        if self.to_field is None:
+            return dict(self.manager.values_list("pk", self.parent_field.attname))
+        rows = list(self.manager.values_list("pk", self.to_field, self.parent_field.attname))
+        key_map = {key: pk for pk, key, _ in rows}
+        return {pk: key_map.get(parent) for pk, _, parent in rows}
+
+
+def get_tree_config(model):
+    config = TREE_REGISTRY.get(model._meta.label)
+    if config is None:
+        raise ValueError(f"{model._meta.label} 未注册树形索引")
+    return config
+
+
+def register_tree(model, parent_field="parent"):
+    """
+    注册树形模型并连接维护信号
+    """
+    config = TreeConfig(model, parent_field)
+    TREE_REGISTRY[config.label] = config
+    post_save.connect(_on_post_save, sender=model, weak=False, dispatch_uid=f"tree_index_save_{config.label}")
+    post_delete.connect(_on_post_delete, sender=model, weak=False, dispatch_uid=f"tree_index_delete_{config.label}")
+    return config
+
+
+def rebuild_tree_index(model):
+    """
+    根据当前数据全量重建某个树形模型的索引
+    """
+    from dvadmin.system.models import TreeIndex
+
+    config = get_tree_config(model)
+    edges = config.get_edges()
+    rows = []
+    for pk in edges:
+        ancestor, depth, visited = pk, 0, set()
+        while ancestor is not None and ancestor not in visited:
+            visited.add(ancestor)
+            rows.append(TreeIndex(tree=config.label, ancestor=ancestor, descendant=pk, depth=depth))
+            ancestor = edges.get(ancestor)
+            depth += 1
+        if ancestor is not None:
+            logger.warning(f"[{config.label}] 节点 {pk} 的上级存在循环引用, 已截断")
+    with transaction.atomic():
+        TreeIndex.objects.filter(tree=config.label).delete()
+        TreeIndex.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    _ready.add(config.label)
+    return len(rows)
+
+
+def rebuild_all_tree_index():
+    """
+    重建所有已注册的树形索引
+    """
+    return {label: rebuild_tree_index(config.model) for label, config in TREE_REGISTRY.items()}
+
+
+def ensure_tree_index(model):
+    """
+    首次使用时, 若索引为空则自动全量构建
+    """
+    from dvadmin.system.models import TreeIndex
+
+    config = get_tree_config(model)
+    if config.label in _ready:
+        return config
+    with _lock:
+        if config.label not in _ready:
+            if not TreeIndex.objects.filter(tree=config.label).exists() and config.manager.exists():
+                rebuild_tree_index(model)
+            _ready.add(config.label)
+    return config
+
+
+def _insert_node(config, pk, parent_pk):
+    from dvadmin.system.models import TreeIndex
+
+    rows = [TreeIndex(tree=config.label, ancestor=pk, descendant=pk, depth=0)]
+    if parent_pk is not None:
+        ancestors = list(
+            TreeIndex.objects.filter(tree=config.label, descendant=parent_pk).values_list("ancestor", "depth")
+        )
+        if not ancestors:
+            # 父节点尚未建立索引(如批量导入时), 直接全量重建
+            rebuild_tree_index(config.model)
+            return
+        rows += [TreeIndex(tree=config.label, ancestor=ancestor, descendant=pk, depth=depth + 1)
+                 for ancestor, depth in ancestors]
+    TreeIndex.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def _move_node(config, pk, parent_pk):
+    from dvadmin.system.models import TreeIndex
+
+    subtree = list(TreeIndex.objects.filter(tree=config.label, ancestor=pk).values_list("descendant", "depth"))
+    subtree_ids = [descendant for descendant, _ in subtree]
+    if parent_pk in subtree_ids:
+        logger.warning(f"[{config.label}] 节点 {pk} 不能移动到自己的下级 {parent_pk} 之下")
+        return
+    TreeIndex.objects.filter(tree=config.label, descendant__in=subtree_ids).exclude(
+        ancestor__in=subtree_ids).delete()
+    if parent_pk is None:
+        return
+    ancestors = list(
+        TreeIndex.objects.filter(tree=config.label, descendant=parent_pk).values_list("ancestor", "depth")
+    )
+    TreeIndex.objects.bulk_create([
+        TreeIndex(tree=config.label, ancestor=ancestor, descendant=descendant, depth=ancestor_depth + depth + 1)
+        for ancestor, ancestor_depth in ancestors
+        for descendant, depth in subtree
+    ], batch_size=BATCH_SIZE)
+
+
+def _on_post_save(sender, instance, **kwargs):
+    from dvadmin.system.models import TreeIndex
+
+    config = TREE_REGISTRY.get(sender._meta.label)
+    if config is None:
+        return
+    # 索引为空时会全量构建(已包含当前节点)
+    ensure_tree_index(sender)
+    parent_pk = config.get_parent_pk(instance)
+    with transaction.atomic():
+        relations = TreeIndex.objects.filter(tree=config.label, descendant=instance.pk)
+        if not relations.filter(depth=0).exists():
+            _insert_node(config, instance.pk, parent_pk)
+            return
+        current_parent = relations.filter(depth=1).values_list("ancestor", flat=True).first()
+        if current_parent != parent_pk:
+            _move_node(config, instance.pk, parent_pk)
+
+
+def _on_post_delete(sender, instance, **kwargs):
+    from dvadmin.system.models import TreeIndex
+
+    config = TREE_REGISTRY.get(sender._meta.label)
+    if config is None:
+        return
+    TreeIndex.objects.filter(Q(ancestor=instance.pk) | Q(descendant=instance.pk), tree=config.label).delete()
+
+
+# ================================================= #
+# ******************** 查询接口 ******************** #
+# ================================================= #
+def descendant_ids_queryset(model, pk, include_self=True):
+    """
+    获取节点所有下级id的查询集, 可直接用作子查询, 如 filter(dept_id__in=descendant_ids_queryset(Dept, 1))
+    :param model: 树形模型
+    :param pk: 节点id
+    :param include_self: 是否包含自身
+    """
+    from dvadmin.system.models import TreeIndex
+
+    config = ensure_tree_index(model)
+    queryset = TreeIndex.objects.filter(tree=config.label, ancestor=pk)
+    if not include_self:
+        queryset = queryset.filter(depth__gt=0)
+    return queryset.values_list("descendant", flat=True)
+
+
+def get_descendant_ids(model, pk, include_self=True):
+    """
+    获取节点所有下级id列表(一次查询)
+    """
+    return list(descendant_ids_queryset(model, pk, include_self))
+
+
+def get_ancestor_queryset(model, pk, include_self=True):
+    """
+    获取节点的祖先链, 按从根节点到当前节点排序(一次查询)
+    """
+    from dvadmin.system.models import TreeIndex
+
+    config = ensure_tree_index(model)
+    relations = TreeIndex.objects.filter(tree=config.label, descendant=pk)
+    if not include_self:
+        relations = relations.filter(depth__gt=0)
+    depth = relations.filter(ancestor=OuterRef("pk")).values("depth")[:1]
+    return config.manager.filter(pk__in=relations.values("ancestor")).annotate(
+        tree_depth=Subquery(depth)).order_by("-tree_depth")
+
+
+def get_path_name(model, pk, field="name", joint="/"):
+    """
+    获取节点完整路径名称, 如 总公司/研发部/后端组
+    """
+    if pk is None:
+        return ""
+    return joint.join(name for name in get_ancestor_queryset(model, pk).values_list(field, flat=True) if name)
@@ -16,12 +16,16 @@ from drf_yasg.utils import swagger_auto_schema
 from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
 
+from dvadmin.utils.authentication import get_auth_context
+from dvadmin.utils.count_strategy import CACHED_COUNT, get_count_strategy, register_count_cache
 from dvadmin.utils.filters import DataLevelPermissionsFilter, CoreModelFilterBankend
 from dvadmin.utils.import_export_mixin import ExportSerializerMixin, ImportSerializerMixin
 from dvadmin.utils.json_response import SuccessResponse, ErrorResponse, DetailResponse
 from dvadmin.utils.permission import CustomPermission
-from dvadmin.utils.models import get_custom_app_models, CoreModel
-from dvadmin.system.models import FieldPermission, MenuField
+from dvadmin.utils.models import is_custom_app_model, CoreModel
+from dvadmin.utils.permission_cache import get_field_permissions
+from dvadmin.utils.query_planner import apply_query_plan, get_restql_selection
+from django_restql.exceptions import QueryFormatError
 from django_restql.mixins import QueryArgumentsMixin
 
 
@@ -34,6 +38,17 @@ class CustomModelViewSet(ModelViewSet, ImportSerializerMixin, ExportSerializerMi
     (3)filter_fields = '__all__' 默认支持全部model中的字段查询(除json字段外)
     (4)import_field_dict={} 导入时的字段字典 {model值: model的label}
     (5)export_field_label = [] 导出时的字段
+    (6)max_queries = None 单次请求的SQL次数上限, 可按action声明 {"list": 10}, 开启SQL检查时生效
+    (7)pagination_mode = "page" 分页模式, 数据量大且只需顺序翻页的列表可用 "cursor" 游标分页(不统计总数)
+    (8)count_strategy = None 页码分页的总条数统计策略 exact/cached/estimated, 默认读取 PAGINATION_COUNT_STRATEGY;
+        为 cached 时定义视图即为 queryset 的模型注册数据变更信号, 变更后缓存的总条数失效
+    (9)search_backend = None 设置为 "fulltext" 时 search_fields 中已配置全文索引(SEARCH_INDEXES)的字段使用索引搜索并按相关度排序
+    (10)index_hints = [] 常用的组合查询条件, 供 python manage.py index_advisor 生成索引建议, 如 [("code", "status")]
+    (11)auto_query_plan = True list/retrieve 时按序列化器字段的 source 自动 select_related/prefetch_related;
+        query_plan_exclude = () 不自动处理的关联路径, 如 ("merchant",); query_plan_only = False 是否同时用 only() 只查询用到的字段,
+        请求带有 restql 查询(?query={id,name})时总是按选择的字段使用 only()/defer()
+    (12)values_projection = None 只读列表的投影 Projection({输出字段: 字段路径/表达式/ChoiceLabel}), 设置后 list 直接用
+        values_list() 生成字典返回, 不经过序列化器(不支持 restql 字段选择); 游标分页时需包含排序字段(如 id、create_datetime)
     """
     values_queryset = None
     ordering_fields = '__all__'
@@ -45,12 +60,47 @@ class CustomModelViewSet(ModelViewSet, ImportSerializerMixin, ExportSerializerMi
     permission_classes = [CustomPermission]
     import_field_dict = {}
     export_field_label = {}
+    max_queries = None
+    pagination_mode = "page"
+    count_strategy = None
+    search_backend = None
+    index_hints = []
+    auto_query_plan = True
+    query_plan_exclude = ()
+    query_plan_only = False
+    values_projection = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 缓存总条数的模型在数据变更时使缓存失效
+        queryset = getattr(cls, "queryset", None)
+        if queryset is not None and get_count_strategy(cls.count_strategy) == CACHED_COUNT:
+            register_count_cache(queryset.model)
 
     def filter_queryset(self, queryset):
-        for backend in set(set(self.filter_backends) | set(self.extra_filter_class or [])):
+        # 按声明顺序执行(排序在搜索之后), 重复的过滤器只执行一次
+        backends = list(self.filter_backends)
+        backends += [backend for backend in self.extra_filter_class or [] if backend not in backends]
+        for backend in backends:
             queryset = backend().filter_queryset(self.request, queryset, self)
+        if self.auto_query_plan and self.action in ("list", "retrieve") and self.serializer_class is not None \
+                and not (self.action == "list" and self.values_projection):
+            selection = self.get_restql_selection()
+            queryset = apply_query_plan(queryset, self.get_serializer_class(), selection, self.query_plan_exclude,
+                                        use_only=self.query_plan_only or selection is not None)
         return queryset
 
+    def get_restql_selection(self):
+        """
+        请求中 restql 查询选择的字段, 查询格式错误时由序列化器返回错误信息
+        """
+        if not self.has_restql_query_param(self.request):
+            return None
+        try:
+            return get_restql_selection(self.get_parsed_restql_query_from_req(self.request))
+        except (SyntaxError, QueryFormatError):
+            return None
+
     def get_queryset(self):
         if getattr(self, 'values_queryset', None):
             return self.values_queryset
@@ -86,18 +136,17 @@ class CustomModelViewSet(ModelViewSet, ImportSerializerMixin, ExportSerializerMi
             return serializer_class(*args, **kwargs)
 
     def get_menu_field(self, serializer_class):
-        """获取字段权限"""
+        """获取字段权限(按角色集合与模型缓存)"""
 
-        if not any(model['object'] is serializer_class.Meta.model for model in get_custom_app_models()):
+        model = serializer_class.Meta.model
+        if not is_custom_app_model(model):
             return []
 
         # 匿名用户没有角色
-        ret = FieldPermission.objects.filter(field__model=serializer_class.Meta.model.__name__)
+        roles = None
         if hasattr(self.request.user, 'role'):
-            roles = self.request.user.role.values_list('id', flat=True)
-            ret = ret.filter(is_query=True, role__in=roles)
-
-        return ret.values_list('field__field_name', flat=True)
+            roles = get_auth_context(self.request).role_ids
+        return get_field_permissions(roles, model.__name__)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, request=request)
@@ -107,6 +156,8 @@ class CustomModelViewSet(ModelViewSet, ImportSerializerMixin, ExportSerializerMi
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
+        if self.values_projection:
+            return self.list_projection(queryset)
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True, request=request)
@@ -114,6 +165,17 @@ class CustomModelViewSet(ModelViewSet, ImportSerializerMixin, ExportSerializerMi
         serializer = self.get_serializer(queryset, many=True, request=request)
         return SuccessResponse(data=serializer.data, msg="获取成功")
 
+    def list_projection(self, queryset):
+        """
+        按 values_projection 查询并分页, 结果为字典, 不创建模型实例及序列化器
+        """
+        model = queryset.model
+        queryset = self.values_projection.apply(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.values_projection.format(page, model))
+        return SuccessResponse(data=self.values_projection.format(list(queryset), model), msg="获取成功")
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
@@ -65,3 +65,6 @@ class ScanDataViewSet(CustomModelViewSet, FieldPermissionMixin):
     serializer_class = ScanDataSerializer
     create_serializer_class = CreateScanDataSerializer
     extra_filter_class = []
+    # 大表按估算统计总条数, 前端分页组件依赖 total, 保持页码分页
+    count_strategy = "estimated"
+    index_hints = [("code", "status")]
@@ -94,6 +94,7 @@ class MerchantViewSet(CustomModelViewSet):
     serializer_class = MerchantSerializer
     filter_fields = ['name', 'manager', 'phone', 'gps_status', 'merchant_code', 'category']
     search_fields = ['name', 'manager', 'phone', 'address', 'merchant_code']
+    search_backend = "fulltext"
     extra_filter_class = []
     
     # 导出配置
@@ -8,6 +8,7 @@ from rest_framework.response import Response
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
 from dvadmin.utils.json_response import DetailResponse
+from dvadmin.utils.pagination import paginate
 from dvadmin.system.utils.notifications import send_notification_to_user
 from plugins.task.models import Task
 from plugins.merchant.models import Merchant
@@ -483,6 +484,8 @@ class TaskViewSet(CustomModelViewSet):
     filter_fields = ['name', 'cycle', 'status', 'start_time', 'end_time']
     search_fields = ['name']
     extra_filter_class = []
+    # 商户/工单数量使用预取结果, 列表查询次数与条数无关
+    max_queries = {"list": 10}
     
     # 导出配置
     export_field_label = {
@@ -541,21 +544,13 @@ class TaskViewSet(CustomModelViewSet):
         workorders = WorkOrder.objects.filter(task=task).select_related('merchant', 'task').order_by('-create_datetime')
         
         # 分页
-        page = int(request.query_params.get('page', 1))
-        limit = int(request.query_params.get('limit', 10))
-        offset = (page - 1) * limit
-        
-        total = workorders.count()
-        workorders = workorders[offset:offset + limit]
-        
+        workorders, page_info = paginate(request, workorders, max_page_size=100)
         serializer = WorkOrderSerializer(workorders, many=True)
         
         return DetailResponse(
             data={
                 'list': serializer.data,
-                'total': total,
-                'page': page,
-                'limit': limit
+                **page_info
             },
             msg="获取成功"
         )
@@ -8,6 +8,7 @@ from django.db.models import Q
 from dvadmin.system.models import MessageCenter, MessageCenterTargetUser
 from plugins.workorder.models import WorkOrder
 from dvadmin.system.models import Users
+from dvadmin.utils.pagination import paginate
 
 
 class MobileNotificationsView(APIView):
@@ -64,10 +65,12 @@ class MobileNotificationsView(APIView):
                 target_qs = target_qs.filter(messagecenter__create_datetime__gt=last_check_time)
             # 按创建时间倒序排列
             target_qs = target_qs.select_related('messagecenter').order_by('-messagecenter__create_datetime')
+            # 分页(page/limit, 每页最多100条)
+            targets, page_info = paginate(request, target_qs, page_size=20, max_page_size=100)
             
             # 构建通知列表
             notifications = []
-            for target in target_qs:
+            for target in targets:
                 message = target.messagecenter
                 is_read_value = bool(target.is_read)
                 notifications.append({
@@ -90,6 +93,7 @@ class MobileNotificationsView(APIView):
                     "notifications": notifications,
                     "count": len(notifications),
                     "last_check_time": last_check_time_str,
+                    **page_info,
                 },
                 "msg": "查询成功"
             }, content_type='application/json')
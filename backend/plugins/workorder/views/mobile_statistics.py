@@ -2,20 +2,8 @@ from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from dvadmin.system.models import Users
-
-
-def recursion(instance, parent, result):
-    """递归获取部门路径"""
-    new_instance = getattr(instance, parent, None)
-    res = []
-    data = getattr(instance, result, None)
-    if data:
-        res.append(data)
-    if new_instance:
-        array = recursion(new_instance, parent, result)
-        res += array
-    return res
+from dvadmin.system.models import Users, Dept
+from dvadmin.utils.tree_index import get_path_name
 
 
 class MobileStatisticsView(APIView):
@@ -55,9 +43,7 @@ class MobileStatisticsView(APIView):
             # 获取部门完整路径
             dept_full_path = None
             if user.dept:
-                dept_name_all = recursion(user.dept, "parent", "name")
-                dept_name_all.reverse()
-                dept_full_path = "/".join(dept_name_all) if dept_name_all else user.dept.name
+                dept_full_path = get_path_name(Dept, user.dept_id) or user.dept.name
             
             # 构建返回数据
             data = {
@@ -12,6 +12,7 @@ from urllib.parse import quote
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
 from dvadmin.utils.json_response import DetailResponse
+from dvadmin.utils.pagination import paginate
 from plugins.workorder.models import WorkOrder, SupervisionPush
 from dvadmin.system.utils.notifications import send_notification_to_user
 
@@ -462,21 +463,13 @@ class SupervisionPushViewSet(CustomModelViewSet):
         queryset = self.filter_queryset(self.get_queryset())
         
         # 分页
-        page = int(request.query_params.get('page', 1))
-        limit = int(request.query_params.get('limit', 10))
-        offset = (page - 1) * limit
-        
-        total = queryset.count()
-        records = queryset[offset:offset + limit]
-        
+        records, page_info = paginate(request, queryset, max_page_size=100)
         serializer = self.get_serializer(records, many=True)
         
         return DetailResponse(
             data={
                 'list': serializer.data,
-                'total': total,
-                'page': page,
-                'limit': limit
+                **page_info
             },
             msg="获取成功"
         )
@@ -16,6 +16,7 @@ from rest_framework.renderers import JSONRenderer
 from dvadmin.utils.serializers import CustomModelSerializer
 from dvadmin.utils.viewset import CustomModelViewSet
 from dvadmin.utils.json_response import DetailResponse
+from dvadmin.utils.pagination import paginate
 from plugins.workorder.models import WorkOrder, WorkOrderRecheck, WorkOrderSubmission
 from dvadmin.system.models import Users
 from dvadmin.system.utils.notifications import send_notification_to_user
@@ -104,6 +105,8 @@ class WorkOrderSerializer(CustomModelSerializer):
         model = WorkOrder
         fields = "__all__"
         read_only_fields = ["id", "workorder_no", "report_time"]
+        # to_representation 中读取的字段, restql 选择部分字段时一并查询, 避免逐行加载
+        query_plan_fields = ("status", "deadline")
     
     def to_representation(self, instance):
         """序列化时自动判断是否逾期"""
@@ -359,8 +362,11 @@ class WorkOrderViewSet(CustomModelViewSet):
     create_serializer_class = WorkOrderCreateSerializer
     update_serializer_class = WorkOrderUpdateSerializer
     filter_fields = ['status', 'hazard_level', 'deadline', 'is_transferred']
-    search_fields = ['workorder_no']
+    # merchant__name 未建立全文索引, 由 FullTextSearchFilter 按 icontains 与索引字段取并集
+    search_fields = ['workorder_no', 'problem_description', 'merchant__name']
+    search_backend = "fulltext"
     extra_filter_class = []
+    count_strategy = "cached"
     
     # 导出配置
     export_field_label = {
@@ -402,17 +408,9 @@ class WorkOrderViewSet(CustomModelViewSet):
         return queryset
     
     def filter_queryset(self, queryset):
-        """自定义过滤，支持商户名称搜索"""
+        """自定义过滤，商户名称搜索见 search_fields"""
         queryset = super().filter_queryset(queryset)
         
-        # 处理商户名称搜索
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(workorder_no__icontains=search) |
-                Q(merchant__name__icontains=search)
-            )
-        
         # 处理上报时间范围查询
         report_time_after = self.request.query_params.get('report_time_after', None)
         report_time_before = self.request.query_params.get('report_time_before', None)
@@ -640,21 +638,13 @@ class WorkOrderViewSet(CustomModelViewSet):
         ).update(status=3)
         
         # 分页
-        page = int(request.query_params.get('page', 1))
-        limit = int(request.query_params.get('limit', 10))
-        offset = (page - 1) * limit
-        
-        total = queryset.count()
-        workorders = queryset[offset:offset + limit]
-        
+        workorders, page_info = paginate(request, queryset, max_page_size=100)
         serializer = SupervisionPushWorkOrderSerializer(workorders, many=True)
         
         return DetailResponse(
             data={
                 'list': serializer.data,
-                'total': total,
-                'page': page,
-                'limit': limit
+                **page_info
             },
             msg="获取成功"
         )
@@ -719,15 +709,16 @@ class MobileWorkOrderView(APIView):
                     pass
             
             # 如果没有找到任何工单和用户，返回404
-            if workorders.count() == 0 and not manager_name:
+            if first_workorder is None and not manager_name:
                 return Response({
                     "code": 404,
                     "data": [],
                     "msg": f"未找到手机号为 {phone} 的负责人工单"
                 }, status=404, content_type='application/json')
             
-            # 序列化工单数据
-            serializer = WorkOrderSerializer(workorders, many=True)
+            # 分页后序列化工单数据(page/limit, 每页最多100条)
+            page_workorders, page_info = paginate(request, workorders, page_size=20, max_page_size=100)
+            serializer = WorkOrderSerializer(page_workorders, many=True)
             
             return Response({
                 "code": 2000,
@@ -736,7 +727,7 @@ class MobileWorkOrderView(APIView):
                     'manager_name': manager_name,
                     'manager_id': manager_id,
                     'workorders': serializer.data,
-                    'total': workorders.count()
+                    **page_info
                 },
                 "msg": "查询成功"
             }, content_type='application/json')